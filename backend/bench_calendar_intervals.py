@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark da detecção de conflitos / sugestão de horário da agenda.
+
+Compara a busca antiga (48 tentativas de 30 min, reparseando o ISO de cada
+evento a cada tentativa) com utils/intervals.BusyTimeline (parse único +
+varredura). Antes de medir, confere em dias aleatórios que as duas
+implementações sugerem exatamente o mesmo horário.
+
+Uso:
+    python bench_calendar_intervals.py [eventos_por_dia] [repeticoes] [dias_conferidos]
+"""
+import random
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+
+from utils.intervals import BusyTimeline
+
+STEP = timedelta(minutes=30)
+HORIZON = timedelta(hours=24)
+
+
+def random_events(rng: random.Random, day: datetime, n: int) -> list:
+    """Eventos aleatórios (ISO) cobrindo o dia e o seguinte, com sobreposições."""
+    events = []
+    for _ in range(n):
+        start = day + timedelta(minutes=rng.randrange(0, 2 * 24 * 60, 5))
+        end = start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 120, 240]))
+        events.append({"start": start.isoformat(), "end": end.isoformat()})
+    return events
+
+
+def legacy_suggestion(events: list, start: datetime, end: datetime):
+    """Implementação anterior de check_time_conflicts (parte da sugestão)."""
+    duration = (end - start).total_seconds() / 60
+    attempt_start = start
+    for _ in range(48):
+        attempt_start += timedelta(minutes=30)
+        attempt_end = attempt_start + timedelta(minutes=duration)
+        is_free = True
+        for ev in events:
+            ev_start = datetime.fromisoformat(ev["start"])
+            ev_end = datetime.fromisoformat(ev["end"])
+            if not (attempt_end <= ev_start or attempt_start >= ev_end):
+                is_free = False
+                break
+        if is_free:
+            return attempt_start
+    return None
+
+
+def timeline_suggestion(events: list, start: datetime, end: datetime):
+    """Implementação nova (mesma chamada feita em routes/calendar.py)."""
+    timeline = BusyTimeline.from_events(events)
+    return timeline.first_free_slot(start + STEP, end - start, start + HORIZON, step=STEP)
+
+
+def check(n_days: int, n_events: int) -> int:
+    """Confere as duas implementações em dias aleatórios. Retorna divergências."""
+    rng = random.Random(42)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    divergences = 0
+    for d in range(n_days):
+        day = base + timedelta(days=d)
+        events = random_events(rng, day, rng.randint(0, n_events))
+        start = day + timedelta(minutes=rng.randrange(0, 24 * 60, 5))
+        end = start + timedelta(minutes=rng.choice([5, 25, 30, 50, 60, 120, 300]))
+        if legacy_suggestion(events, start, end) != timeline_suggestion(events, start, end):
+            divergences += 1
+    return divergences
+
+
+def bench(fn, events: list, start: datetime, end: datetime, repeat: int) -> float:
+    """Tempo médio (ms) de uma chamada."""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(events, start, end)
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def main():
+    n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    n_days = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+
+    divergences = check(n_days, min(n_events, 40))
+    print(f"conferência: {n_days} dias aleatórios, {divergences} divergências")
+    if divergences:
+        sys.exit(1)
+
+    # Pior caso da busca antiga: dia lotado, sem horário livre em 24h
+    day = datetime(2025, 3, 10, tzinfo=timezone.utc)
+    events = [
+        {
+            "start": (day + timedelta(minutes=i * 48 * 60 // n_events)).isoformat(),
+            "end": (day + timedelta(minutes=(i + 1) * 48 * 60 // n_events + 1)).isoformat(),
+        }
+        for i in range(n_events)
+    ]
+    start = day + timedelta(hours=9)
+    end = start + timedelta(hours=1)
+
+    legacy_ms = bench(legacy_suggestion, events, start, end, repeat)
+    timeline_ms = bench(timeline_suggestion, events, start, end, repeat)
+    print(f"{n_events} eventos: antigo {legacy_ms:.2f} ms | timeline {timeline_ms:.3f} ms "
+          f"({legacy_ms / timeline_ms:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark das estatísticas de perfil (período "all").
+
+Compara a implementação antiga (carrega até 100k sessões e agrega em Python)
+com o aggregation pipeline de services/profile_service.py, para um usuário
+com 20k sessões num banco temporário (<DB_NAME>_bench, apagado no final).
+
+Uso:
+    python bench_profile_stats.py [n_sessoes] [repeticoes]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).parent / ".env")
+
+import database  # noqa: E402
+from services import profile_service  # noqa: E402
+
+USER_ID = "bench-user"
+
+
+async def legacy_stats(db, user_id: str, start_iso: str) -> dict:
+    """Implementação anterior de get_profile_stats (parte das sessões)."""
+    sessions = await db.study_sessions.find(
+        {"user_id": user_id, "completed": True, "start_time": {"$gte": start_iso}},
+        {"_id": 0, "start_time": 1, "duration": 1, "skipped": 1, "subject_id": 1}
+    ).to_list(100000)
+
+    total_minutes = 0
+    blocks_completed = 0
+    active_dates = set()
+    subject_minutes = {}
+    for session in sessions:
+        duration = int(session.get("duration", 0))
+        subject_id = session.get("subject_id")
+        total_minutes += duration
+        if subject_id:
+            subject_minutes[subject_id] = subject_minutes.get(subject_id, 0) + duration
+        if not session.get("skipped", False):
+            blocks_completed += 1
+        try:
+            active_dates.add(datetime.fromisoformat(session["start_time"]).date().isoformat())
+        except Exception:
+            pass
+
+    most_studied = None
+    if subject_minutes:
+        top_id = max(subject_minutes, key=subject_minutes.get)
+        doc = await db.subjects.find_one({"id": top_id, "user_id": user_id}, {"_id": 0, "name": 1})
+        if doc:
+            most_studied = {"name": doc.get("name", "Desconhecida"), "minutes": subject_minutes[top_id]}
+
+    return {
+        "total_minutes": total_minutes,
+        "blocks_completed": blocks_completed,
+        "active_days": len(active_dates),
+        "most_studied_subject": most_studied,
+    }
+
+
+async def seed(db, n_sessions: int):
+    """Cria matérias e sessões sintéticas para o usuário de benchmark."""
+    rng = random.Random(42)
+    subjects = [{"id": f"bench-subj-{i}", "user_id": USER_ID, "name": f"Matéria {i}"} for i in range(12)]
+    await db.subjects.insert_many(subjects)
+
+    now = datetime.now(timezone.utc)
+    batch = []
+    for i in range(n_sessions):
+        st = now - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60))
+        batch.append({
+            "id": f"bench-sess-{i}",
+            "user_id": USER_ID,
+            "subject_id": rng.choice(subjects)["id"],
+            "start_time": st.isoformat(),
+            "duration": rng.randint(5, 120),
+            "completed": True,
+            "skipped": rng.random() < 0.1,
+        })
+        if len(batch) == 5000:
+            await db.study_sessions.insert_many(batch)
+            batch = []
+    if batch:
+        await db.study_sessions.insert_many(batch)
+    await db.study_sessions.create_index([("user_id", 1), ("start_time", -1)])
+
+
+async def timed(label: str, fn, repeats: int):
+    """Executa fn repetidas vezes e imprime a mediana."""
+    times = []
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = await fn()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    print(f"  {label:<12} mediana {times[len(times) // 2] * 1000:8.1f} ms  (min {times[0] * 1000:.1f} ms)")
+    return result
+
+
+async def main(n_sessions: int = 20000, repeats: int = 7):
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"] + "_bench"]
+    # O service usa database.db: aponta para o banco temporário
+    profile_service.db = db
+    database.db = db
+
+    try:
+        await client.drop_database(db.name)
+        print(f"🔧 Semeando {n_sessions} sessões em {db.name}...")
+        await seed(db, n_sessions)
+
+        start_iso = (datetime.now(timezone.utc) - timedelta(days=36500)).isoformat()
+        print(f"⏱️  Período 'all', {repeats} repetições:")
+        old = await timed("python", lambda: legacy_stats(db, USER_ID, start_iso), repeats)
+        new = await timed("aggregate", lambda: profile_service.compute_profile_session_stats(USER_ID, start_iso), repeats)
+
+        same = old == new
+        print(f"{'✅' if same else '❌'} resultados {'iguais' if same else 'diferentes'}")
+        if not same:
+            print(f"  python:    {old}\n  aggregate: {new}")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(main(*args))
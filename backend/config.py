@@ -16,6 +16,14 @@ IS_DEV = os.environ.get("DEV", "1") in ("1", "true", "True")  # Ambiente de dese
 DISABLE_RATELIMIT = os.getenv("DISABLE_RATELIMIT", "false").lower() == "true"  # Desabilitar rate limiting
 FREE_SHOP = os.getenv("FREE_SHOP", "false").lower() == "true"  # Loja grátis para testes
 
+# Exportação de dados
+EXPORT_DIR = os.getenv("EXPORT_DIR", "/tmp/pomociclo_exports")  # Pasta dos arquivos gerados por jobs de exportação
+
+# Jobs periódicos
+LEDGER_COMPACTION_INTERVAL = int(os.getenv("LEDGER_COMPACTION_INTERVAL", "21600"))  # Segundos entre compactações do ledger (0 = desligado)
+REVIEW_OVERDUE_SWEEP_INTERVAL = int(os.getenv("REVIEW_OVERDUE_SWEEP_INTERVAL", "300"))  # Segundos entre marcações de revisões atrasadas (0 = desligado)
+EXPORT_CLEANUP_INTERVAL = int(os.getenv("EXPORT_CLEANUP_INTERVAL", "3600"))  # Segundos entre limpezas de exportações expiradas (0 = desligado)
+
 # Configuração do Google OAuth
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")  # ID do cliente Google
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")  # Secret do cliente Google
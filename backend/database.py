@@ -4,6 +4,7 @@ Centraliza a conexão MongoDB e referências às coleções.
 """
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -35,3 +36,28 @@ settings_col = db["settings"]  # Configurações dos usuários
 calendar_events_col = db["calendar_events"]  # Eventos do calendário
 friends_col = db["friends"]  # Relações de amizade
 rankings_col = db["rankings"]  # Rankings
+
+
+# Códigos de erro de servidores sem suporte a transações (standalone)
+_NO_TRANSACTION_CODES = {20, 263}
+
+
+async def run_in_transaction(callback):
+    """
+    Executa callback(session) numa transação multi-documento.
+    Em servidores sem replica set (sem transações), executa sem sessão.
+    
+    Args:
+        callback: Função assíncrona que recebe a sessão (ou None)
+    
+    Returns:
+        Retorno do callback
+    """
+    try:
+        async with await db.client.start_session() as session:
+            async with session.start_transaction():
+                return await callback(session)
+    except OperationFailure as e:
+        if e.code not in _NO_TRANSACTION_CODES:
+            raise
+    return await callback(None)
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Simulador offline da economia (coins/XP/levels).
+
+Carrega todas as study_sessions em arrays NumPy e recalcula, de forma
+vetorizada, as recompensas de cada sessão sob conjuntos alternativos de
+parâmetros. Com os parâmetros padrão o resultado é bit a bit igual ao
+cálculo ao vivo de /study/end (mesma ordem de multiplicações em float64 e
+o mesmo arredondamento de _apply_mults).
+
+Uso:
+    python economy_simulator.py                    # só o cenário atual
+    python economy_simulator.py cenarios.json      # lista de overrides de EconomyParams
+    python economy_simulator.py --check            # confere com as funções ao vivo
+
+Exemplo de cenarios.json:
+    [{"name": "softcap_1200", "softcap_threshold": 1200},
+     {"name": "streak_5pct", "streak_step": 0.05}]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field, asdict, replace
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Estado de streak: minutos mínimos numa sessão para contar o dia
+STREAK_MIN_MINUTES = 25
+
+# Níveis pré-calculados na tabela de XP acumulado
+MAX_LEVELS = 400
+
+
+@dataclass(frozen=True)
+class EconomyParams:
+    """Parâmetros da fórmula de recompensas (padrões = fórmula ao vivo)."""
+    name: str = "live"
+    # _fatigue_multiplier: (limite superior em minutos, multiplicador)
+    fatigue_tiers: Tuple[Tuple[int, float], ...] = ((50, 1.00), (100, 0.90), (180, 0.80))
+    fatigue_floor: float = 0.70
+    # _completion_multiplier
+    completion_bonus: float = 1.20
+    # _streak_multiplier
+    streak_step: float = 0.03
+    streak_cap_days: int = 7
+    # _softcap_multiplier
+    softcap_threshold: int = 900
+    softcap_mult: float = 0.5
+    # _coins_raw
+    coins_divisor: float = 5.0
+    # _session_xp_raw
+    xp_factor: float = 8.0
+    xp_exponent: float = 0.9
+    xp_block_bonus: float = 12.0
+    # _xp_curve_per_level
+    level_base_xp: int = 100
+    level_growth: float = 1.25
+
+
+@dataclass
+class SessionArrays:
+    """Sessões concluídas/puladas em formato colunar."""
+    user_idx: np.ndarray  # int32, índice em user_ids
+    start: np.ndarray  # datetime64[s], UTC
+    duration: np.ndarray  # int64, minutos contados
+    completed: np.ndarray  # bool
+    block_minutes: np.ndarray  # int64, study_duration do usuário
+    coins_earned: np.ndarray  # int64, valor gravado ao vivo
+    xp_earned: np.ndarray  # int64, valor gravado ao vivo
+    user_ids: List[str] = field(default_factory=list)
+
+
+# ================== CARGA ==================
+
+async def load_sessions(db, batch_size: int = 50000) -> SessionArrays:
+    """
+    Carrega as sessões finalizadas de todos os usuários em arrays.
+
+    Args:
+        db: Database Motor
+        batch_size: Tamanho do lote do cursor
+
+    Returns:
+        SessionArrays: Sessões ordenadas por (usuário, início)
+    """
+    block_by_user: Dict[str, int] = {}
+    async for s in db.user_settings.find({}, {"_id": 0, "user_id": 1, "study_duration": 1}):
+        block_by_user[s["user_id"]] = int(s.get("study_duration", 50) or 50)
+
+    users: List[str] = []
+    starts: List[str] = []
+    durations: List[int] = []
+    completed: List[bool] = []
+    coins: List[int] = []
+    xps: List[int] = []
+
+    cursor = db.study_sessions.find(
+        {"end_time": {"$ne": None}},
+        {"_id": 0, "user_id": 1, "start_time": 1, "duration": 1,
+         "completed": 1, "coins_earned": 1, "xp_earned": 1}
+    ).batch_size(batch_size)
+
+    async for s in cursor:
+        st = s.get("start_time")
+        if not isinstance(st, str) or len(st) < 19:
+            continue
+        users.append(s["user_id"])
+        # Sessões são gravadas em UTC: "YYYY-MM-DDTHH:MM:SS..." basta
+        starts.append(st[:19])
+        durations.append(int(s.get("duration", 0) or 0))
+        completed.append(bool(s.get("completed")))
+        coins.append(int(s.get("coins_earned", 0) or 0))
+        xps.append(int(s.get("xp_earned", 0) or 0))
+
+    user_ids, user_idx = np.unique(np.array(users, dtype=object), return_inverse=True)
+    user_ids = [str(u) for u in user_ids]
+    start = np.array(starts, dtype="datetime64[s]")
+    block = np.array([block_by_user.get(u, 50) for u in user_ids], dtype=np.int64)
+
+    order = np.lexsort((start, user_idx))
+    user_idx = user_idx.astype(np.int32)[order]
+    return SessionArrays(
+        user_idx=user_idx,
+        start=start[order],
+        duration=np.array(durations, dtype=np.int64)[order],
+        completed=np.array(completed, dtype=bool)[order],
+        block_minutes=block[user_idx] if len(user_ids) else np.zeros(0, dtype=np.int64),
+        coins_earned=np.array(coins, dtype=np.int64)[order],
+        xp_earned=np.array(xps, dtype=np.int64)[order],
+        user_ids=user_ids,
+    )
+
+
+# ================== ESTADO DERIVADO (independe dos parâmetros) ==================
+
+def streak_days(s: SessionArrays) -> np.ndarray:
+    """
+    Reconstrói o streak visto por cada sessão (como _update_and_get_streak).
+
+    Um dia conta quando uma sessão concluída tem >= 25 min. A sessão recebe o
+    streak do último dia contado até ela (inclusive), ou 0 se não houver.
+
+    Args:
+        s: Sessões ordenadas por (usuário, início)
+
+    Returns:
+        np.ndarray: Streak (int64) por sessão
+    """
+    n = len(s.duration)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    day = s.start.astype("datetime64[D]").astype(np.int64)
+    qualifies = s.completed & (s.duration >= STREAK_MIN_MINUTES)
+
+    # Primeira sessão qualificada de cada (usuário, dia)
+    q_pos = np.flatnonzero(qualifies)
+    q_user = s.user_idx[q_pos].astype(np.int64)
+    q_day = day[q_pos]
+    first = np.ones(len(q_pos), dtype=bool)
+    first[1:] = (q_user[1:] != q_user[:-1]) | (q_day[1:] != q_day[:-1])
+    q_pos, q_user, q_day = q_pos[first], q_user[first], q_day[first]
+
+    # Sequências de dias consecutivos por usuário
+    new_run = np.ones(len(q_pos), dtype=bool)
+    new_run[1:] = (q_user[1:] != q_user[:-1]) | (q_day[1:] - q_day[:-1] != 1)
+    run_start = np.maximum.accumulate(np.where(new_run, np.arange(len(q_pos)), 0))
+    q_streak = np.arange(len(q_pos)) - run_start + 1
+
+    # Para cada sessão: último marco qualificado (mesmo usuário) com posição <= a dela
+    k = np.searchsorted(q_pos, np.arange(n), side="right") - 1
+    valid = k >= 0
+    valid[valid] = q_user[k[valid]] == s.user_idx[valid]
+    out = np.zeros(n, dtype=np.int64)
+    out[valid] = q_streak[k[valid]]
+    return out
+
+
+def week_minutes_before(s: SessionArrays) -> np.ndarray:
+    """
+    Minutos concluídos na mesma semana (segunda 00:00 UTC) antes de cada sessão,
+    como _week_minutes_accumulated.
+
+    Args:
+        s: Sessões ordenadas por (usuário, início)
+
+    Returns:
+        np.ndarray: Minutos (int64) por sessão
+    """
+    n = len(s.duration)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # 1970-01-01 foi quinta-feira: desloca 3 dias para semanas começarem na segunda
+    week = (s.start.astype("datetime64[D]").astype(np.int64) + 3) // 7
+    mins = np.where(s.completed, s.duration, 0)
+    total = np.cumsum(mins)
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = (s.user_idx[1:] != s.user_idx[:-1]) | (week[1:] != week[:-1])
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(n), 0))
+    offset = total[group_start] - mins[group_start]
+    return total - mins - offset
+
+
+# ================== FÓRMULA VETORIZADA ==================
+
+def _pow_exact(values: np.ndarray, exponent: float) -> np.ndarray:
+    """
+    values ** exponent com o pow() do Python para cada valor distinto.
+    np.power pode diferir no último bit; durações têm poucos valores únicos.
+    """
+    uniq, inv = np.unique(values, return_inverse=True)
+    table = np.array([int(v) ** exponent for v in uniq], dtype=np.float64)
+    return table[inv]
+
+
+def _apply_mults(value: np.ndarray, *mults: np.ndarray) -> np.ndarray:
+    """Equivalente vetorizado de reward_service._apply_mults (mesma ordem)."""
+    v = value.astype(np.float64)
+    for m in mults:
+        v = v * m
+    return np.maximum(0, np.floor(v)).astype(np.int64)
+
+
+def session_rewards(
+    s: SessionArrays,
+    p: EconomyParams,
+    streak: np.ndarray,
+    week_before: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Recalcula coins e XP de cada sessão.
+
+    Args:
+        s: Sessões
+        p: Parâmetros
+        streak: Streak por sessão (streak_days)
+        week_before: Minutos da semana antes da sessão (week_minutes_before)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (coins, xp) por sessão
+    """
+    d = s.duration
+    block = s.block_minutes
+
+    fatigue = np.full(len(d), p.fatigue_floor, dtype=np.float64)
+    for limit, mult in reversed(p.fatigue_tiers):
+        fatigue = np.where(d <= limit, mult, fatigue)
+
+    completion = np.where(s.completed & (d >= block), p.completion_bonus, 1.00)
+    streak_mult = 1.0 + np.minimum(np.maximum(streak, 0), p.streak_cap_days) * p.streak_step
+    softcap = np.where(week_before >= p.softcap_threshold, p.softcap_mult, 1.0)
+
+    coins_base = d / p.coins_divisor
+    blocks = np.where(block > 0, d // np.maximum(block, 1), 0)
+    xp_base = p.xp_factor * _pow_exact(d, p.xp_exponent) + p.xp_block_bonus * blocks
+
+    coins = _apply_mults(coins_base, completion, fatigue, streak_mult, softcap)
+    xp = _apply_mults(xp_base, completion, fatigue, streak_mult)
+    return coins, xp
+
+
+def level_thresholds(p: EconomyParams) -> np.ndarray:
+    """
+    XP acumulado necessário para chegar a cada level (índice 0 = level 2).
+    Mesma curva de _xp_curve_per_level.
+    """
+    per_level = [int(p.level_base_xp * (p.level_growth ** (lvl - 1)) + 0.999) for lvl in range(1, MAX_LEVELS + 1)]
+    return np.cumsum(np.array(per_level, dtype=np.float64))
+
+
+def user_totals(s: SessionArrays, coins: np.ndarray, xp: np.ndarray, p: EconomyParams):
+    """
+    Soma por usuário e converte XP total em level.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (coins, xp, level) por usuário
+    """
+    n_users = len(s.user_ids)
+    u_coins = np.bincount(s.user_idx, weights=coins, minlength=n_users).astype(np.int64)
+    u_xp = np.bincount(s.user_idx, weights=xp, minlength=n_users).astype(np.int64)
+    levels = np.searchsorted(level_thresholds(p), u_xp, side="right") + 1
+    return u_coins, u_xp, levels
+
+
+# ================== RELATÓRIO ==================
+
+def _dist(values: np.ndarray) -> dict:
+    """Resumo de distribuição."""
+    if len(values) == 0:
+        return {"total": 0, "mean": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0}
+    return {
+        "total": int(values.sum()),
+        "mean": round(float(values.mean()), 2),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": int(values.max()),
+    }
+
+
+def simulate(s: SessionArrays, scenarios: List[EconomyParams]) -> dict:
+    """
+    Roda o cenário ao vivo e os alternativos e compara as distribuições.
+
+    Args:
+        s: Sessões carregadas
+        scenarios: Parâmetros alternativos
+
+    Returns:
+        dict: Relatório com baseline, cenários e deltas por usuário
+    """
+    t0 = time.perf_counter()
+    streak = streak_days(s)
+    week_before = week_minutes_before(s)
+
+    live = EconomyParams()
+    b_coins, b_xp = session_rewards(s, live, streak, week_before)
+    bu_coins, bu_xp, bu_lvl = user_totals(s, b_coins, b_xp, live)
+
+    report = {
+        "sessions": int(len(s.duration)),
+        "users": len(s.user_ids),
+        "baseline": {
+            "coins_per_user": _dist(bu_coins),
+            "xp_per_user": _dist(bu_xp),
+            "level_per_user": _dist(bu_lvl),
+            # Sessões cujo valor gravado difere do recalculado (ex.: mudança de study_duration)
+            "mismatch_coins": int((b_coins != s.coins_earned).sum()),
+            "mismatch_xp": int((b_xp != s.xp_earned).sum()),
+        },
+        "scenarios": [],
+    }
+
+    for p in scenarios:
+        coins, xp = session_rewards(s, p, streak, week_before)
+        u_coins, u_xp, u_lvl = user_totals(s, coins, xp, p)
+        report["scenarios"].append({
+            "name": p.name,
+            "params": asdict(p),
+            "coins_per_user": _dist(u_coins),
+            "xp_per_user": _dist(u_xp),
+            "level_per_user": _dist(u_lvl),
+            "coins_delta_per_user": _dist(u_coins - bu_coins),
+            "level_delta_per_user": _dist(u_lvl - bu_lvl),
+            "users_level_changed": int((u_lvl != bu_lvl).sum()),
+        })
+
+    report["elapsed_seconds"] = round(time.perf_counter() - t0, 3)
+    return report
+
+
+def check_live_compat(max_minutes: int = 400) -> int:
+    """
+    Compara a fórmula vetorizada com as funções ao vivo de reward_service
+    numa grade de durações, blocos, streaks e minutos semanais.
+
+    Returns:
+        int: Número de divergências (0 = bit a bit igual)
+    """
+    from services.reward_service import (
+        _fatigue_multiplier, _completion_multiplier, _streak_multiplier,
+        _softcap_multiplier, _coins_raw, _session_xp_raw, _apply_mults as live_apply
+    )
+
+    d, b, st, wk, c = np.meshgrid(
+        np.arange(0, max_minutes + 1), np.array([25, 30, 45, 50, 60, 90]),
+        np.arange(0, 10), np.array([0, 899, 900, 2000]), np.array([False, True]),
+        indexing="ij"
+    )
+    d, b, st, wk, c = (a.ravel() for a in (d, b, st, wk, c))
+    s = SessionArrays(
+        user_idx=np.zeros(len(d), dtype=np.int32), start=np.zeros(len(d), dtype="datetime64[s]"),
+        duration=d.astype(np.int64), completed=c, block_minutes=b.astype(np.int64),
+        coins_earned=np.zeros(len(d), dtype=np.int64), xp_earned=np.zeros(len(d), dtype=np.int64),
+    )
+    coins, xp = session_rewards(s, EconomyParams(), st, wk)
+
+    bad = 0
+    for i in range(len(d)):
+        di, bi, si, wi, ci = int(d[i]), int(b[i]), int(st[i]), int(wk[i]), bool(c[i])
+        comp = _completion_multiplier(di, bi, not ci)
+        fat = _fatigue_multiplier(di)
+        sm = _streak_multiplier(si)
+        lc = live_apply(_coins_raw(di), comp, fat, sm, _softcap_multiplier(wi))
+        lx = live_apply(_session_xp_raw(di, bi), comp, fat, sm)
+        if lc != coins[i] or lx != xp[i]:
+            bad += 1
+    return bad
+
+
+async def _main(argv: List[str]):
+    """Ponto de entrada da linha de comando."""
+    if "--check" in argv:
+        bad = check_live_compat()
+        print(f"{'✅' if bad == 0 else '❌'} divergências com a fórmula ao vivo: {bad}")
+        return
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+
+    scenarios: List[EconomyParams] = []
+    if argv:
+        with open(argv[0]) as f:
+            for i, overrides in enumerate(json.load(f)):
+                if "fatigue_tiers" in overrides:
+                    overrides["fatigue_tiers"] = tuple(tuple(t) for t in overrides["fatigue_tiers"])
+                overrides.setdefault("name", f"scenario_{i + 1}")
+                scenarios.append(replace(EconomyParams(), **overrides))
+
+    try:
+        t0 = time.perf_counter()
+        sessions = await load_sessions(db)
+        load_secs = time.perf_counter() - t0
+        report = simulate(sessions, scenarios)
+        report["load_seconds"] = round(load_secs, 3)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
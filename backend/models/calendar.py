@@ -10,6 +10,7 @@ import uuid
 
 class EventChecklistItem(BaseModel):
     """Item de checklist dentro de um evento do calendário."""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))  # ID do item
     text: str  # Texto do item
     done: bool = False  # Se foi concluído
 
@@ -20,9 +21,15 @@ class CalendarEventCreate(BaseModel):
     start: datetime  # Data/hora de início
     end: datetime  # Data/hora de fim
     subject_id: Optional[str] = None  # ID da matéria relacionada
+    event_type: Optional[str] = "other"  # class, study, review, other
     description: Optional[str] = None  # Descrição do evento
     checklist: List[EventChecklistItem] = Field(default_factory=list)  # Lista de tarefas
     color: Optional[str] = None  # Cor do evento
+    # Recorrência (guardada como regra; ocorrências geradas sob demanda)
+    recurrence_type: Optional[str] = "once"  # once, daily, weekly, monthly, yearly, every_x_days
+    recurrence_interval: Optional[int] = 1  # Para every_x_days
+    recurrence_until: Optional[datetime] = None  # Data final para recorrência
+    recurrence_count: Optional[int] = None  # Número de ocorrências (alternativa a until)
 
 
 class CalendarEventUpdate(BaseModel):
@@ -31,6 +38,8 @@ class CalendarEventUpdate(BaseModel):
     start: Optional[datetime] = None  # Nova data/hora de início
     end: Optional[datetime] = None  # Nova data/hora de fim
     subject_id: Optional[str] = None  # Nova matéria
+    event_type: Optional[str] = None  # Novo tipo
+    completed: Optional[bool] = None  # Marcar/desmarcar como concluído
     description: Optional[str] = None  # Nova descrição
     checklist: Optional[List[EventChecklistItem]] = None  # Nova checklist
     color: Optional[str] = None  # Nova cor
@@ -46,6 +55,8 @@ class CalendarEvent(BaseModel):
     start: datetime  # Início
     end: datetime  # Fim
     subject_id: Optional[str] = None  # Matéria relacionada
+    event_type: Optional[str] = "other"  # class, study, review, other
+    completed: bool = False  # Concluído
     description: Optional[str] = None  # Descrição
     checklist: List[EventChecklistItem] = Field(default_factory=list)  # Checklist
     color: Optional[str] = None  # Cor
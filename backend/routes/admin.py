@@ -5,8 +5,12 @@ Rotas para funções administrativas do sistema.
 from fastapi import APIRouter, HTTPException
 from typing import List, Dict
 
-from database import db
 from shop_seed import build_items
+from services.shop_catalog import seed_shop_items
+from services.profile_service import profile_stats_cache
+from services.heatmap_service import heatmap_cache
+from services.calendar_service import month_summary_cache
+from services.habit_service import migrate_habit_bitsets
 
 router = APIRouter(prefix="/admin")
 
@@ -15,33 +19,24 @@ router = APIRouter(prefix="/admin")
 async def admin_seed_shop():
     """
     Popula o banco de dados com itens da loja.
-    Usado para inicializar ou resetar a loja.
+    Aplica só as diferenças em relação ao catálogo atual (sem esvaziar a loja).
     
     ATENÇÃO: Esta rota deve ser protegida em produção!
     
     Returns:
-        dict: {"success": True, "items_count": int}
+        dict: {"success": True, "items_count": int, "changes": dict}
     """
     try:
-        # Limpa itens existentes
-        await db.shop_items.delete_many({})
-        
-        # Gera novos itens usando o seed
+        # Gera itens usando o seed e sincroniza com o banco
         items = build_items()
-        
-        if items:
-            # Insere novos itens
-            items_to_insert = []
-            for item in items:
-                item_dict = item.model_dump() if hasattr(item, 'model_dump') else dict(item)
-                items_to_insert.append(item_dict)
-            
-            await db.shop_items.insert_many(items_to_insert)
+        changes = await seed_shop_items(items)
         
         return {
             "success": True,
             "message": "Loja populada com sucesso",
-            "items_count": len(items)
+            "items_count": len(items),
+            "changes": changes,
+            "catalog_version": changes["catalog_version"]
         }
     
     except Exception as e:
@@ -49,3 +44,39 @@ async def admin_seed_shop():
             status_code=500,
             detail=f"Erro ao popular loja: {str(e)}"
         )
+
+
+@router.post("/migrate-habit-bitsets")
+async def admin_migrate_habit_bitsets():
+    """
+    Monta os bitsets anuais e as sequências dos hábitos a partir de
+    habit_completions. Pode ser repetida sem efeito colateral.
+    
+    ATENÇÃO: Esta rota deve ser protegida em produção!
+    
+    Returns:
+        dict: {"success": True, "years": int, "habits": int}
+    """
+    try:
+        summary = await migrate_habit_bitsets()
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao migrar hábitos: {str(e)}"
+        )
+    return {"success": True, **summary}
+
+
+@router.get("/cache-stats")
+async def admin_cache_stats():
+    """
+    Métricas dos caches em memória deste processo (hits, misses, tamanho).
+    
+    Returns:
+        dict: {"profile_stats": dict, "heatmap": dict, "calendar_month": dict}
+    """
+    return {
+        "profile_stats": profile_stats_cache.stats(),
+        "heatmap": heatmap_cache.stats(),
+        "calendar_month": month_summary_cache.stats()
+    }
@@ -281,16 +281,13 @@ async def delete_account(
 async def admin_seed_shop():
     """
     Endpoint administrativo para popular a loja com itens.
-    CUIDADO: Reseta a coleção de itens da loja.
+    Sincroniza a coleção com o seed aplicando só as diferenças.
     """
     from shop_seed import build_items
-    
-    # Reseta a coleção
-    await db.shop_items.delete_many({})
+    from services.shop_catalog import seed_shop_items
     
     # Usa a função que já existe
     items = build_items()  # retorna lista de itens
-    if items:
-        await db.shop_items.insert_many(items)
+    changes = await seed_shop_items(items or [])
     
-    return {"ok": True, "count": len(items or [])}
+    return {"ok": True, "count": len(items or []), "changes": changes, "catalog_version": changes["catalog_version"]}
@@ -1,90 +1,39 @@
 """
 Rotas de calendário/agenda.
-Gerencia eventos do calendário com suporte a recorrência.
+Gerencia eventos do calendário com suporte a recorrência
+(séries guardadas como regra, ver services/calendar_recurrence.py).
 """
-from fastapi import APIRouter, Request, Cookie, HTTPException, Query
+from fastapi import APIRouter, Request, Cookie, HTTPException, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel
 import uuid
-import calendar as cal_module
 
 from database import db
 from dependencies import get_current_user
 from models.calendar import CalendarEvent, CalendarEventCreate, CalendarEventUpdate
+from utils.datetime_utils import to_aware
+from utils.intervals import BusyTimeline, event_interval
+from services.calendar_recurrence import (
+    build_rule, series_end, list_window_events, move_series_exceptions,
+    resolve_event_id, delete_calendar_event
+)
+from services.calendar_service import get_month_summary, invalidate_month_summaries
+from services.ics_service import iter_calendar_ics, import_ics, ics_range, MAX_IMPORT_BYTES
 
 router = APIRouter(prefix="/calendar")
 
+# Sugestão de horário livre: passo da grade e janela de busca
+SUGGESTION_STEP = timedelta(minutes=30)
+SUGGESTION_HORIZON = timedelta(hours=24)
+
 
 class ChecklistAdd(BaseModel):
     """Payload para adicionar item à checklist."""
     text: str
 
 
-def generate_recurring_dates(
-    start: datetime,
-    end: datetime,
-    recurrence_type: str,
-    recurrence_interval: int,
-    recurrence_until: Optional[datetime],
-    recurrence_count: Optional[int]
-) -> list:
-    """
-    Gera lista de (start, end) para eventos recorrentes.
-    
-    Args:
-        start: Data/hora de início
-        end: Data/hora de fim
-        recurrence_type: Tipo de recorrência (once, daily, weekly, monthly, yearly, every_x_days)
-        recurrence_interval: Intervalo de recorrência
-        recurrence_until: Data limite para recorrência
-        recurrence_count: Número máximo de ocorrências
-    
-    Returns:
-        List[Tuple[datetime, datetime]]: Lista de datas
-    """
-    dates = []
-    duration = end - start
-    current = start
-    count = 0
-    max_occurrences = recurrence_count if recurrence_count else 365
-    
-    while count < max_occurrences:
-        if recurrence_until and current > recurrence_until:
-            break
-        
-        dates.append((current, current + duration))
-        count += 1
-        
-        if recurrence_type == "once":
-            break
-        elif recurrence_type == "daily":
-            current += timedelta(days=1)
-        elif recurrence_type == "weekly":
-            current += timedelta(weeks=1)
-        elif recurrence_type == "monthly":
-            # Avança um mês
-            month = current.month + 1
-            year = current.year
-            if month > 12:
-                month = 1
-                year += 1
-            try:
-                current = current.replace(year=year, month=month)
-            except ValueError:
-                # Dia não existe no mês (ex: 31 em fevereiro)
-                last_day = cal_module.monthrange(year, month)[1]
-                current = current.replace(year=year, month=month, day=min(current.day, last_day))
-        elif recurrence_type == "yearly":
-            current = current.replace(year=current.year + 1)
-        elif recurrence_type == "every_x_days":
-            current += timedelta(days=recurrence_interval)
-        else:
-            break
-    
-    return dates
-
-
 async def check_time_conflicts(
     user_id: str,
     start: datetime,
@@ -104,57 +53,41 @@ async def check_time_conflicts(
     Returns:
         dict: Informações sobre conflitos e sugestão de horário
     """
-    # Busca eventos no mesmo dia
+    # Busca eventos do dia e da janela de sugestão (até 24h depois)
     day_start = start.replace(hour=0, minute=0, second=0, microsecond=0)
-    day_end = day_start + timedelta(days=1)
+    search_end = max(day_start + timedelta(days=1), end + SUGGESTION_HORIZON)
+    
+    existing = await list_window_events(user_id, to_aware(day_start), to_aware(search_end))
+    
+    # Revisões só conflitam com aulas
+    event_types = {"class"} if event_type == "review" else None
+    timeline = BusyTimeline.from_events(existing, event_types)
     
-    existing = await db.calendar_events.find({
-        "user_id": user_id,
-        "start": {"$lt": day_end.isoformat()},
-        "end": {"$gt": day_start.isoformat()}
-    }).to_list(1000)
+    start_utc = to_aware(start)
+    end_utc = to_aware(end)
     
     conflicting = []
     for ev in existing:
-        ev_start = datetime.fromisoformat(ev["start"])
-        ev_end = datetime.fromisoformat(ev["end"])
-        
-        # Verifica sobreposição
-        if not (end <= ev_start or start >= ev_end):
-            # Se estamos criando uma revisão, só importa se conflita com aula
-            if event_type == "review" and ev.get("event_type") == "class":
-                conflicting.append(ev)
-            elif event_type != "review":
-                conflicting.append(ev)
+        if event_types is not None and ev.get("event_type", "other") not in event_types:
+            continue
+        iv = event_interval(ev)
+        if iv and iv[0] < end_utc and start_utc < iv[1]:
+            conflicting.append(ev)
     
     has_conflict = len(conflicting) > 0
     
-    # Sugerir próximo horário livre
+    # Sugerir próximo horário livre (grade de 30 min, até 24 horas depois)
     suggested_time = None
     if has_conflict:
-        duration = (end - start).total_seconds() / 60
-        attempt_start = start
-        
-        for _ in range(48):  # Tenta até 24 horas depois
-            attempt_start += timedelta(minutes=30)
-            attempt_end = attempt_start + timedelta(minutes=duration)
-            
-            is_free = True
-            for ev in existing:
-                ev_start = datetime.fromisoformat(ev["start"])
-                ev_end = datetime.fromisoformat(ev["end"])
-                
-                if not (attempt_end <= ev_start or attempt_start >= ev_end):
-                    if event_type == "review" and ev.get("event_type") == "class":
-                        is_free = False
-                        break
-                    elif event_type != "review":
-                        is_free = False
-                        break
-            
-            if is_free:
-                suggested_time = attempt_start
-                break
+        slot = timeline.first_free_slot(
+            start_utc + SUGGESTION_STEP,
+            end_utc - start_utc,
+            start_utc + SUGGESTION_HORIZON,
+            step=SUGGESTION_STEP
+        )
+        if slot:
+            # Mantém o fuso do horário pedido
+            suggested_time = start + (slot - start_utc)
     
     return {
         "has_conflict": has_conflict,
@@ -231,37 +164,43 @@ async def calendar_create(
             raise HTTPException(status_code=400, detail="subject_id inválido")
     
     try:
-        # Gera datas recorrentes
-        recurring_dates = generate_recurring_dates(
-            ev.start, ev.end,
+        # Recorrência vira uma regra numa única série (ocorrências geradas sob demanda)
+        rule = build_rule(
             ev.recurrence_type or "once",
             ev.recurrence_interval or 1,
             ev.recurrence_until,
             ev.recurrence_count
         )
+        start_dt = to_aware(ev.start).replace(microsecond=0)
+        end_dt = to_aware(ev.end).replace(microsecond=0)
+        
+        doc = CalendarEvent(
+            user_id=user.id,
+            title=ev.title,
+            start=start_dt,
+            end=end_dt,
+            subject_id=ev.subject_id,
+            event_type=ev.event_type or "other",
+            description=ev.description,
+            color=ev.color,
+            checklist=ev.checklist or []
+        ).model_dump()
         
-        created_events = []
-        for start_dt, end_dt in recurring_dates:
-            doc = CalendarEvent(
-                user_id=user.id,
-                title=ev.title,
-                start=start_dt,
-                end=end_dt,
-                subject_id=ev.subject_id,
-                event_type=ev.event_type or "other",
-                checklist=ev.checklist or []
-            ).model_dump()
-            
-            # Normaliza ISO
-            doc["start"] = doc["start"].isoformat() if hasattr(doc["start"], 'isoformat') else doc["start"]
-            doc["end"] = doc["end"].isoformat() if hasattr(doc["end"], 'isoformat') else doc["end"]
-            doc["created_at"] = doc["created_at"].isoformat() if hasattr(doc["created_at"], 'isoformat') else doc["created_at"]
-            
-            clean_doc = dict(doc)
-            await db.calendar_events.insert_one(doc)
-            created_events.append(clean_doc)
+        # Normaliza ISO
+        doc["start"] = start_dt.isoformat()
+        doc["end"] = end_dt.isoformat()
+        doc["created_at"] = doc["created_at"].isoformat() if hasattr(doc["created_at"], 'isoformat') else doc["created_at"]
         
-        return {"ok": True, "created_count": len(created_events), "events": created_events[:5]}
+        if rule:
+            doc["recurrence"] = rule
+            doc["series_end"] = series_end(start_dt, end_dt, rule)
+            doc["exdates"] = []
+        
+        clean_doc = dict(doc)
+        await db.calendar_events.insert_one(doc)
+        await invalidate_month_summaries(user.id)
+        
+        return {"ok": True, "created_count": 1, "recurring": bool(rule), "events": [clean_doc]}
     except Exception as e:
         import traceback
         error_detail = f"Erro ao criar evento: {str(e)}"
@@ -294,15 +233,8 @@ async def calendar_day(
     day_start = datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
     day_end = day_start + timedelta(days=1)
     
-    # Eventos que tocam o dia
-    items = await db.calendar_events.find(
-        {
-            "user_id": user.id,
-            "start": {"$lt": day_end.isoformat()},
-            "end": {"$gt": day_start.isoformat()}
-        },
-        {"_id": 0}
-    ).sort("start", 1).to_list(500)
+    # Eventos que tocam o dia (inclui ocorrências de séries)
+    items = await list_window_events(user.id, day_start, day_end, limit=500)
     
     return items
 
@@ -328,32 +260,79 @@ async def calendar_month(
     """
     user = await get_current_user(request, session_token)
     
-    # Janela do mês (UTC)
-    start = datetime(year, month, 1, tzinfo=timezone.utc)
-    end = datetime(
-        year + (1 if month == 12 else 0),
-        1 if month == 12 else month + 1,
-        1,
-        tzinfo=timezone.utc
-    )
+    return await get_month_summary(user.id, year, month)
+
+
+@router.get("/export.ics")
+async def calendar_export_ics(
+    request: Request,
+    start: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    end: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    session_token: Optional[str] = Cookie(None)
+):
+    """
+    Exporta a agenda em iCalendar (.ics), em streaming.
+    
+    Args:
+        request: Request do FastAPI
+        start: Data inicial YYYY-MM-DD (opcional)
+        end: Data final YYYY-MM-DD, inclusiva (opcional)
+        session_token: Token de sessão do cookie
+    
+    Returns:
+        StreamingResponse: Arquivo .ics
+    """
+    user = await get_current_user(request, session_token)
     
-    cur = db.calendar_events.find(
-        {
-            "user_id": user.id,
-            "start": {"$gte": start.isoformat(), "$lt": end.isoformat()}
-        },
-        {"_id": 0}
+    lo, hi = ics_range(start, end)
+    if hi <= lo:
+        raise HTTPException(status_code=400, detail="Período inválido")
+    
+    return StreamingResponse(
+        iter_calendar_ics(user.id, lo, hi),
+        media_type="text/calendar; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="pomociclo.ics"'}
     )
+
+
+@router.post("/import.ics")
+async def calendar_import_ics(
+    request: Request,
+    file: UploadFile = File(...),
+    tz: str = Query("UTC", max_length=64),
+    event_type: str = Query("other", pattern="^(class|study|review|other)$"),
+    session_token: Optional[str] = Cookie(None)
+):
+    """
+    Importa eventos de um arquivo .ics (deduplicados por UID).
+    
+    Args:
+        request: Request do FastAPI
+        file: Arquivo .ics enviado
+        tz: Fuso IANA para horários sem fuso (ex.: America/Sao_Paulo)
+        event_type: Tipo dos eventos importados
+        session_token: Token de sessão do cookie
+    
+    Returns:
+        dict: {"created", "duplicates", "skipped", "events": [relatório por evento]}
+    
+    Raises:
+        HTTPException: 400 se o arquivo for inválido, 413 se for grande demais
+    """
+    user = await get_current_user(request, session_token)
     
-    # Agrega por dia
-    agg = {}
-    async for ev in cur:
-        di = ev["start"][:10]  # YYYY-MM-DD
-        d = agg.setdefault(di, {"date_iso": di, "count": 0, "hasCompleted": False})
-        d["count"] += 1
-        d["hasCompleted"] = d["hasCompleted"] or bool(ev.get("completed"))
+    data = await file.read(MAX_IMPORT_BYTES + 1)
+    if len(data) > MAX_IMPORT_BYTES:
+        raise HTTPException(status_code=413, detail="Arquivo .ics grande demais")
     
-    return list(agg.values())
+    try:
+        report = await import_ics(user.id, data.decode("utf-8-sig", errors="replace"), tz, event_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if report["created"]:
+        await invalidate_month_summaries(user.id)
+    return report
 
 
 @router.patch("/event/{event_id}")
@@ -395,10 +374,29 @@ async def calendar_update(
     if "end" in upd and isinstance(upd["end"], datetime):
         upd["end"] = upd["end"].isoformat()
     
+    # Ocorrência de série: materializa antes de editar
+    doc_id = await resolve_event_id(user.id, event_id)
+    if not doc_id:
+        return {"success": True}
+    
+    # Editar o horário da série recalcula o seu fim e leva junto as
+    # exceções e as ocorrências materializadas
+    if "start" in upd or "end" in upd:
+        current = await db.calendar_events.find_one(
+            {"id": doc_id, "user_id": user.id},
+            {"_id": 0, "id": 1, "start": 1, "end": 1, "recurrence": 1, "exdates": 1}
+        )
+        if current and current.get("recurrence"):
+            new_start = to_aware(upd.get("start", current["start"]))
+            new_end = to_aware(upd.get("end", current["end"]))
+            upd["series_end"] = series_end(new_start, new_end, current["recurrence"])
+            upd["exdates"] = await move_series_exceptions(user.id, current, new_start, new_end)
+    
     await db.calendar_events.update_one(
-        {"id": event_id, "user_id": user.id},
+        {"id": doc_id, "user_id": user.id},
         {"$set": upd}
     )
+    await invalidate_month_summaries(user.id)
     
     return {"success": True}
 
@@ -407,14 +405,17 @@ async def calendar_update(
 async def calendar_delete(
     event_id: str,
     request: Request,
+    scope: str = Query("occurrence", pattern="^(occurrence|series)$"),
     session_token: Optional[str] = Cookie(None)
 ):
     """
     Deleta um evento do calendário.
+    Em séries, remove só a ocorrência (scope=occurrence) ou a série toda (scope=series).
     
     Args:
         event_id: ID do evento
         request: Request do FastAPI
+        scope: occurrence ou series
         session_token: Token de sessão do cookie
     
     Returns:
@@ -422,7 +423,8 @@ async def calendar_delete(
     """
     user = await get_current_user(request, session_token)
     
-    await db.calendar_events.delete_one({"id": event_id, "user_id": user.id})
+    await delete_calendar_event(user.id, event_id, whole_series=(scope == "series"))
+    await invalidate_month_summaries(user.id)
     
     return {"success": True}
 
@@ -450,8 +452,9 @@ async def checklist_add(
     
     new_item = {"id": str(uuid.uuid4()), "text": item.text, "done": False}
     
+    doc_id = await resolve_event_id(user.id, event_id) or event_id
     await db.calendar_events.update_one(
-        {"id": event_id, "user_id": user.id},
+        {"id": doc_id, "user_id": user.id},
         {"$push": {"checklist": new_item}}
     )
     
@@ -482,6 +485,7 @@ async def checklist_toggle(
     """
     user = await get_current_user(request, session_token)
     
+    event_id = await resolve_event_id(user.id, event_id) or event_id
     ev = await db.calendar_events.find_one(
         {"id": event_id, "user_id": user.id},
         {"_id": 0, "checklist": 1}
@@ -2,15 +2,28 @@
 Rotas de Devocional.
 Gerencia plano e progresso devocional do usuário.
 """
-from fastapi import APIRouter, Request, Cookie
+from fastapi import APIRouter, Request, Cookie, HTTPException, Response
 from typing import Optional
-from datetime import datetime, timezone
+from datetime import datetime, timezone, date
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from database import db
 from dependencies import get_current_user
+from services.devocional_service import (
+    build_update_pipeline, decode_progress, migrate_legacy_progress,
+    DEVOCIONAL_DAYS, DEVOCIONAL_FIELDS
+)
+from services.bible_plan_service import bible_plan_index
+from utils.datetime_utils import today_utc_date
+from utils.helpers import etag_matches
 
 router = APIRouter(prefix="/devocional")
 
+# O plano padrão só muda com deploy: cache longo, revalidado pelo ETag
+PLAN_CACHE_CONTROL = "public, max-age=604800"
+
 
 @router.get("/progress")
 async def get_devocional_progress(
@@ -21,7 +34,8 @@ async def get_devocional_progress(
     Retorna progresso do plano devocional do usuário.
     
     Returns:
-        dict: Dados de progresso (dias completados, streak, etc)
+        dict: Dados de progresso ({dia: {read_bible, did_devotional, did_prayer, date}},
+              streak, total de dias completos)
     """
     user = await get_current_user(request, session_token)
     
@@ -38,9 +52,13 @@ async def get_devocional_progress(
             "total_completed": 0
         }
     
+    # Formato antigo (progress = {dia: data}) é convertido na primeira leitura
+    if "progress" in doc:
+        doc = await migrate_legacy_progress(user.id, doc)
+    
     return {
         "plan_id": doc.get("plan_id"),
-        "progress": doc.get("progress", {}),
+        "progress": decode_progress(doc),
         "streak": doc.get("streak", 0),
         "total_completed": doc.get("total_completed", 0),
         "last_completed": doc.get("last_completed")
@@ -53,78 +71,59 @@ async def update_devocional_progress(
     session_token: Optional[str] = Cookie(None)
 ):
     """
-    Atualiza progresso devocional.
+    Atualiza progresso devocional (um update atômico, sem leitura prévia).
     
     Body JSON:
-        - day: Dia completado
+        - day_of_year (ou day): Dia do plano (1-366)
+        - read_bible / did_devotional / did_prayer: Itens marcados ou desmarcados
+          (sem nenhum, marca o dia inteiro como completo)
         - plan_id: ID do plano (opcional)
     
     Returns:
-        dict: {"success": True, "streak": int}
+        dict: {"success": True, "streak": int, "total_completed": int}
     """
     user = await get_current_user(request, session_token)
     body = await request.json()
     
-    day = body.get("day")
-    plan_id = body.get("plan_id")
-    
-    now = datetime.now(timezone.utc)
-    today_str = now.date().isoformat()
+    day = body.get("day_of_year", body.get("day"))
+    try:
+        day = int(day)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Dia inválido")
+    if not 1 <= day <= DEVOCIONAL_DAYS:
+        raise HTTPException(status_code=400, detail="Dia inválido")
     
-    # Busca documento existente
-    doc = await db.devocional.find_one({"user_id": user.id})
+    marks = {field: bool(body[field]) for field in DEVOCIONAL_FIELDS if field in body}
+    if not marks:
+        marks = {field: True for field in DEVOCIONAL_FIELDS}
     
-    if not doc:
-        # Cria novo documento
-        await db.devocional.insert_one({
-            "user_id": user.id,
-            "plan_id": plan_id,
-            "progress": {str(day): today_str},
-            "streak": 1,
-            "total_completed": 1,
-            "last_completed": today_str,
-            "created_at": now.isoformat()
-        })
-        return {"success": True, "streak": 1}
-    
-    # Atualiza documento existente
-    progress = doc.get("progress", {})
-    progress[str(day)] = today_str
-    
-    # Calcula streak
-    last_completed = doc.get("last_completed")
-    streak = doc.get("streak", 0)
-    
-    if last_completed:
-        from datetime import date, timedelta
-        last_date = date.fromisoformat(last_completed)
-        today_date = now.date()
-        days_diff = (today_date - last_date).days
-        
-        if days_diff == 1:
-            streak += 1
-        elif days_diff == 0:
-            # Mesmo dia, mantém streak
-            pass
-        else:
-            streak = 1
+    now = datetime.now(timezone.utc)
+    pipeline = build_update_pipeline(day, marks, now, body.get("plan_id"))
+    for _ in range(3):
+        try:
+            # Só atualiza documentos já no formato de bitmaps; o antigo
+            # (com "progress") faz o upsert bater no índice único de user_id
+            doc = await db.devocional.find_one_and_update(
+                {"user_id": user.id, "progress": {"$exists": False}},
+                pipeline,
+                projection={"_id": 0, "streak": 1, "total_completed": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            break
+        except DuplicateKeyError:
+            # Converte o formato antigo (ou outro request criou o documento) e repete
+            legacy = await db.devocional.find_one({"user_id": user.id}, {"_id": 0})
+            if legacy and "progress" in legacy:
+                await migrate_legacy_progress(user.id, legacy)
     else:
-        streak = 1
+        raise HTTPException(status_code=409, detail="Não foi possível salvar o progresso, tente novamente")
     
-    total_completed = len(progress)
-    
-    await db.devocional.update_one(
-        {"user_id": user.id},
-        {"$set": {
-            "progress": progress,
-            "streak": streak,
-            "total_completed": total_completed,
-            "last_completed": today_str,
-            "updated_at": now.isoformat()
-        }}
-    )
-    
-    return {"success": True, "streak": streak}
+    return {
+        "success": True,
+        "streak": doc.get("streak", 0),
+        "total_completed": doc.get("total_completed", 0)
+    }
 
 
 @router.get("/plan")
@@ -135,6 +134,8 @@ async def get_devocional_plan(
 ):
     """
     Retorna detalhes de um plano devocional.
+    O plano padrão (Bíblia em um ano) sai pré-serializado, com ETag forte e
+    cache longo (304 se não mudou); outros planos vêm do banco.
     
     Args:
         plan_id: ID do plano (default: "default")
@@ -142,6 +143,12 @@ async def get_devocional_plan(
     Returns:
         dict: Informações do plano (título, descrição, dias, etc)
     """
+    if plan_id == "default":
+        headers = {"ETag": bible_plan_index.etag, "Cache-Control": PLAN_CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), bible_plan_index.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=bible_plan_index.body, media_type="application/json", headers=headers)
+    
     user = await get_current_user(request, session_token)
     
     # Busca plano no banco
@@ -151,12 +158,40 @@ async def get_devocional_plan(
     )
     
     if not plan:
-        return {
-            "id": "default",
-            "title": "Plano Padrão",
-            "description": "Plano devocional básico",
-            "total_days": 30,
-            "days": []
-        }
+        raise HTTPException(status_code=404, detail="Plano não encontrado")
     
     return plan
+
+
+@router.get("/plan/day")
+async def get_devocional_plan_day(day: Optional[date] = None):
+    """
+    Leitura do plano para uma data do calendário.
+    
+    Args:
+        day: Data (YYYY-MM-DD; default: hoje, UTC)
+    
+    Returns:
+        dict: {"day", "date", "ref", "readings"}
+    """
+    entry = bible_plan_index.for_date(day or today_utc_date())
+    if not entry:
+        raise HTTPException(status_code=404, detail="Dia fora do plano")
+    return entry
+
+
+@router.get("/plan/book/{book}")
+async def get_devocional_plan_book(book: str):
+    """
+    Dias do plano em que um livro é lido.
+    
+    Args:
+        book: Abreviação ou nome do livro ("Mt", "1 Sm", "Mateus")
+    
+    Returns:
+        dict: {"book": str, "days": List[dict]}
+    """
+    entries = bible_plan_index.for_book(book)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="Livro não encontrado")
+    return {"book": book, "days": entries}
@@ -2,29 +2,61 @@
 Rotas de Financeiro.
 Gerencia dados financeiros do usuário.
 """
-from fastapi import APIRouter, Request, Cookie
+from fastapi import APIRouter, Request, Cookie, HTTPException, Query
 from typing import Optional
 
-from database import db
 from dependencies import get_current_user
+from services.financeiro_service import get_months, save_value, year_summary
 
 router = APIRouter(prefix="/financeiro")
 
 
+def _valid_name(name) -> bool:
+    """Categoria/item viram caminho de campo: sem ponto e sem $ no início."""
+    return isinstance(name, str) and bool(name) and "." not in name and not name.startswith("$")
+
+
 @router.get("/data")
 async def get_financeiro_data(
     request: Request,
-    session_token: Optional[str] = Cookie(None)
+    session_token: Optional[str] = Cookie(None),
+    year: Optional[int] = None,
+    month_from: int = Query(0, ge=0, le=11),
+    month_to: int = Query(11, ge=0, le=11)
 ):
     """
     Retorna dados financeiros do usuário.
+    Com `year`, só os meses pedidos desse ano (consulta indexada).
+    
+    Args:
+        year: Ano (default: todos)
+        month_from: Primeiro mês (0-11)
+        month_to: Último mês (0-11)
     
     Returns:
         dict: Dados financeiros organizados por ano/mês
     """
     user = await get_current_user(request, session_token)
-    doc = await db.financeiro.find_one({"user_id": user.id})
-    return doc.get("data", {}) if doc else {}
+    return await get_months(user.id, year, month_from, month_to)
+
+
+@router.get("/summary")
+async def get_financeiro_summary(
+    request: Request,
+    year: int,
+    session_token: Optional[str] = Cookie(None)
+):
+    """
+    Totais do ano por mês/categoria e por categoria (calculados no servidor).
+    
+    Args:
+        year: Ano
+    
+    Returns:
+        dict: {"year", "months": {mês: {categoria: total}}, "categories": {categoria: total}}
+    """
+    user = await get_current_user(request, session_token)
+    return await year_summary(user.id, year)
 
 
 @router.post("/save")
@@ -37,7 +69,7 @@ async def save_financeiro_value(
     
     Body JSON:
         - year: Ano
-        - month: Mês
+        - month: Mês (0-11)
         - category: Categoria (receitas, despesas, etc)
         - item: Item específico
         - value: Valor numérico
@@ -48,20 +80,17 @@ async def save_financeiro_value(
     user = await get_current_user(request, session_token)
     body = await request.json()
     
-    year = body.get("year")
-    month = body.get("month")
     category = body.get("category")
     item = body.get("item")
-    value = body.get("value", 0)
-    
-    # Monta o caminho do campo para atualização
-    key = f"{year}-{month}"
-    update_path = f"data.{key}.{category}.{item}"
+    try:
+        year = int(body.get("year"))
+        month = int(body.get("month"))
+        value = float(body.get("value") or 0)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Valores inválidos")
+    if not 0 <= month <= 11 or not _valid_name(category) or not _valid_name(item):
+        raise HTTPException(status_code=400, detail="Valores inválidos")
     
-    await db.financeiro.update_one(
-        {"user_id": user.id},
-        {"$set": {update_path: value}},
-        upsert=True
-    )
+    await save_value(user.id, year, month, category, item, value)
     
     return {"success": True}
@@ -5,11 +5,17 @@ Gerencia hábitos diários do usuário.
 from fastapi import APIRouter, Request, Cookie, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import datetime, timezone, date
+from datetime import datetime, timezone, date, timedelta
 import uuid
 
+from pymongo.errors import DuplicateKeyError
+
 from database import db
 from dependencies import get_current_user
+from services.habit_service import (
+    mark_completed, unmark_completed, get_year_bits, year_summary
+)
+from utils.datetime_utils import today_utc_date
 
 router = APIRouter(prefix="/habits")
 
@@ -49,6 +55,16 @@ class HabitUpdate(BaseModel):
     icon: Optional[str] = None
 
 
+# ================== FUNÇÕES AUXILIARES ==================
+
+def _displayed_streak(habit: dict, today: date) -> int:
+    """Sequência gravada, zerada se a última conclusão foi antes de ontem."""
+    last = habit.get("last_completed_date")
+    if not last or date.fromisoformat(last) < today - timedelta(days=1):
+        return 0
+    return habit.get("current_streak", 0)
+
+
 # ================== ROTAS ==================
 
 @router.get("")
@@ -69,16 +85,24 @@ async def list_habits(
         {"_id": 0}
     ).to_list(1000)
     
-    # Enriquece com dados de progresso de hoje
-    today = date.today().isoformat()
+    # Conclusões de hoje (UTC) de todos os hábitos numa consulta
+    today = today_utc_date()
+    done_today = set()
+    if habits:
+        async for comp in db.habit_completions.find(
+            {
+                "user_id": user.id,
+                "habit_id": {"$in": [h["id"] for h in habits]},
+                "date": today.isoformat()
+            },
+            {"_id": 0, "habit_id": 1}
+        ):
+            done_today.add(comp["habit_id"])
     
     for habit in habits:
-        completion = await db.habit_completions.find_one({
-            "user_id": user.id,
-            "habit_id": habit["id"],
-            "date": today
-        })
-        habit["completed_today"] = completion is not None
+        habit["completed_today"] = habit["id"] in done_today
+        habit["current_streak"] = _displayed_streak(habit, today)
+        habit.setdefault("longest_streak", 0)
     
     return habits
 
@@ -170,6 +194,10 @@ async def delete_habit(
         "user_id": user.id,
         "habit_id": habit_id
     })
+    await db.habit_years.delete_many({
+        "user_id": user.id,
+        "habit_id": habit_id
+    })
     
     return {"success": True}
 
@@ -193,48 +221,22 @@ async def complete_habit(
     if not habit:
         raise HTTPException(status_code=404, detail="Hábito não encontrado")
     
-    today = date.today().isoformat()
-    
-    # Verifica se já foi completado hoje
-    existing = await db.habit_completions.find_one({
-        "user_id": user.id,
-        "habit_id": habit_id,
-        "date": today
-    })
+    today = today_utc_date()
     
-    if existing:
-        return {"success": True, "message": "Já completado hoje", "streak": 0}
-    
-    # Registra conclusão
+    # Registra conclusão (índice único barra a duplicada)
     now = datetime.now(timezone.utc)
-    await db.habit_completions.insert_one({
-        "id": str(uuid.uuid4()),
-        "user_id": user.id,
-        "habit_id": habit_id,
-        "date": today,
-        "completed_at": now.isoformat()
-    })
-    
-    # Calcula streak
-    from datetime import timedelta
-    completions = await db.habit_completions.find({
-        "user_id": user.id,
-        "habit_id": habit_id
-    }).sort("date", -1).to_list(365)
-    
-    streak = 1
-    current_date = date.today()
-    
-    for comp in completions[1:]:
-        comp_date = date.fromisoformat(comp["date"])
-        expected_date = current_date - timedelta(days=1)
-        
-        if comp_date == expected_date:
-            streak += 1
-            current_date = comp_date
-        else:
-            break
+    try:
+        await db.habit_completions.insert_one({
+            "id": str(uuid.uuid4()),
+            "user_id": user.id,
+            "habit_id": habit_id,
+            "date": today.isoformat(),
+            "completed_at": now.isoformat()
+        })
+    except DuplicateKeyError:
+        return {"success": True, "message": "Já completado hoje", "streak": _displayed_streak(habit, today)}
     
+    streak = await mark_completed(user.id, habit_id, today)
     return {"success": True, "streak": streak}
 
 
@@ -252,12 +254,42 @@ async def uncomplete_habit(
     """
     user = await get_current_user(request, session_token)
     
-    today = date.today().isoformat()
+    today = today_utc_date()
     
     result = await db.habit_completions.delete_one({
         "user_id": user.id,
         "habit_id": habit_id,
-        "date": today
+        "date": today.isoformat()
     })
+    if result.deleted_count > 0:
+        await unmark_completed(user.id, habit_id, today)
     
     return {"success": True, "was_completed": result.deleted_count > 0}
+
+
+@router.get("/{habit_id}/history")
+async def habit_history(
+    habit_id: str,
+    request: Request,
+    year: Optional[int] = None,
+    session_token: Optional[str] = Cookie(None)
+):
+    """
+    Histórico anual do hábito a partir do bitset do ano (uma leitura).
+    
+    Args:
+        year: Ano (default: ano atual, UTC)
+    
+    Returns:
+        dict: {"year", "bits" (hex, 46 bytes; bit i = dia i do ano),
+               "completed_days", "longest_streak"}
+    """
+    user = await get_current_user(request, session_token)
+    
+    habit = await db.habits.find_one({"id": habit_id, "user_id": user.id}, {"_id": 0, "id": 1})
+    if not habit:
+        raise HTTPException(status_code=404, detail="Hábito não encontrado")
+    
+    year = year or today_utc_date().year
+    bits = await get_year_bits(user.id, habit_id, year)
+    return year_summary(bits, year)
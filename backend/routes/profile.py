@@ -3,6 +3,7 @@ Rotas de perfil do usuário.
 Gerencia estatísticas, calendário de consistência, nickname, e aparência.
 """
 from fastapi import APIRouter, Request, Cookie, HTTPException, Query
+from fastapi.responses import StreamingResponse, FileResponse
 from typing import Optional
 from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel
@@ -11,6 +12,16 @@ import uuid
 from database import db
 from dependencies import get_current_user
 from services.reward_service import _xp_curve_per_level
+from services.profile_service import get_cached_profile_stats
+from services.heatmap_service import get_year_heatmap
+from services.export_service import (
+    iter_export_zip,
+    iter_export_json,
+    export_filename,
+    start_export_job,
+    get_export_job,
+    export_job_file
+)
 
 router = APIRouter(prefix="/profile")
 
@@ -76,87 +87,21 @@ async def get_profile_stats(
     start_date = now - timedelta(days=days)
     start_iso = start_date.isoformat()
     
-    # Busca todas as sessões completas no período
-    sessions = await db.study_sessions.find(
-        {
-            "user_id": user_id,
-            "completed": True,
-            "start_time": {"$gte": start_iso}
-        },
-        {"_id": 0, "start_time": 1, "duration": 1, "skipped": 1, "subject_id": 1}
-    ).to_list(100000)
-    
-    # Calcula estatísticas
-    total_minutes = 0
-    blocks_completed = 0
-    active_dates = set()
-    subject_minutes = {}  # Para calcular matéria mais estudada
-    
-    for session in sessions:
-        duration = int(session.get("duration", 0))
-        skipped = session.get("skipped", False)
-        subject_id = session.get("subject_id")
-        
-        total_minutes += duration
-        
-        # Acumula minutos por matéria
-        if subject_id:
-            subject_minutes[subject_id] = subject_minutes.get(subject_id, 0) + duration
-        
-        # Bloco completo = sessão completa e não pulada
-        if not skipped:
-            blocks_completed += 1
-        
-        # Extrai data (sem hora) para contar dias únicos
-        try:
-            start_time = datetime.fromisoformat(session["start_time"])
-            date_only = start_time.date().isoformat()
-            active_dates.add(date_only)
-        except:
-            pass
-    
-    active_days = len(active_dates)
+    # Estatísticas do período: cache por (usuário, período) até a próxima
+    # sessão finalizada (stats_generation) ou a virada do dia
+    period_stats = await get_cached_profile_stats(
+        user_id, period, int(target_user.get("stats_generation", 0)), start_iso
+    )
+    total_minutes = period_stats["total_minutes"]
+    blocks_completed = period_stats["blocks_completed"]
+    active_days = period_stats["active_days"]
+    most_studied = period_stats["most_studied_subject"]
+    cycles_completed = period_stats["cycles_completed"]
     average_per_day = (total_minutes / active_days) if active_days > 0 else 0
     
-    # Encontra a matéria mais estudada
-    most_studied = None
-    if subject_minutes:
-        most_studied_id = max(subject_minutes, key=subject_minutes.get)
-        most_studied_minutes = subject_minutes[most_studied_id]
-        
-        # Busca informações da matéria
-        subject_doc = await db.subjects.find_one(
-            {"id": most_studied_id, "user_id": user_id},
-            {"_id": 0, "name": 1}
-        )
-        
-        if subject_doc:
-            most_studied = {
-                "name": subject_doc.get("name", "Desconhecida"),
-                "minutes": most_studied_minutes
-            }
-    
     # Busca streak atual do usuário
     streak_days = int(target_user.get("streak_days", 0))
     
-    # Busca ciclos completos no período
-    cycles = await db.cycles.find(
-        {
-            "user_id": user_id,
-            "status": "completed",
-            "week_start": {"$gte": start_iso}
-        },
-        {"_id": 0}
-    ).to_list(10000)
-    
-    # Conta apenas ciclos que atingiram 100% da meta
-    cycles_completed = 0
-    for cycle in cycles:
-        goal = cycle.get("total_time_goal", 0)
-        studied = cycle.get("total_time_studied", 0)
-        if goal > 0 and studied >= goal:
-            cycles_completed += 1
-    
     # Calcula XP necessário para próximo nível
     current_level = target_user.get("level", 1)
     current_xp = target_user.get("xp", 0)
@@ -206,7 +151,7 @@ async def get_profile_calendar(
         session_token: Token de sessão do cookie
     
     Returns:
-        dict: Dados do calendário por dia
+        dict: {"year", "start", "minutes": List[int] (um valor por dia do ano), "total_days_active"}
     
     Raises:
         HTTPException: 404 se usuário não encontrado
@@ -223,88 +168,102 @@ async def get_profile_calendar(
     if year is None:
         year = datetime.now(timezone.utc).year
     
-    # Datas de início e fim do ano
-    start_of_year = datetime(year, 1, 1, tzinfo=timezone.utc)
-    end_of_year = datetime(year, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
-    
-    start_iso = start_of_year.isoformat()
-    end_iso = end_of_year.isoformat()
-    
-    # Busca todas as sessões do ano
-    sessions = await db.study_sessions.find(
-        {
-            "user_id": user_id,
-            "completed": True,
-            "start_time": {"$gte": start_iso, "$lte": end_iso}
-        },
-        {"_id": 0, "start_time": 1, "duration": 1}
-    ).to_list(100000)
-    
-    # Agrupa por data
-    days_data = {}
-    for session in sessions:
-        try:
-            start_time = datetime.fromisoformat(session["start_time"])
-            date_only = start_time.date().isoformat()
-            duration = int(session.get("duration", 0))
-            
-            if date_only not in days_data:
-                days_data[date_only] = 0
-            days_data[date_only] += duration
-        except:
-            pass
-    
-    # Converte para lista
-    days_list = [
-        {"date": date, "minutes": minutes}
-        for date, minutes in sorted(days_data.items())
-    ]
-    
-    return {
-        "year": year,
-        "days": days_list,
-        "total_days_active": len(days_list)
-    }
+    # Heatmap a partir do rollup diário (cacheado por usuário/ano)
+    return await get_year_heatmap(user_id, year)
 
 
 @router.get("/export")
 async def export_profile_data(
-    format: str = Query(default="json", pattern="^(json|csv)$"),
+    format: str = Query(default="json", pattern="^(json|zip)$"),
     request: Request = None,
     session_token: Optional[str] = Cookie(None)
 ):
     """
-    Exporta todos os dados do perfil do usuário logado.
+    Exporta todos os dados do perfil do usuário logado, em streaming.
+    Sem limite de registros e com memória constante.
     
     Args:
-        format: Formato de exportação (json ou csv)
+        format: "json" (objeto único) ou "zip" (um NDJSON por coleção)
         request: Request do FastAPI
         session_token: Token de sessão do cookie
     
     Returns:
-        dict: Todos os dados do usuário
+        StreamingResponse: Arquivo de exportação
     """
     user = await get_current_user(request, session_token)
     
-    # Busca todos os dados do usuário
-    user_data = await db.users.find_one({"id": user.id}, {"_id": 0})
-    subjects = await db.subjects.find({"user_id": user.id}, {"_id": 0}).to_list(1000)
-    sessions = await db.study_sessions.find({"user_id": user.id}, {"_id": 0}).to_list(10000)
-    tasks = await db.tasks.find({"user_id": user.id}, {"_id": 0}).to_list(1000)
-    settings = await db.user_settings.find_one({"user_id": user.id}, {"_id": 0})
-    calendar_events = await db.calendar_events.find({"user_id": user.id}, {"_id": 0}).to_list(10000)
-    
-    export_data = {
-        "user": user_data,
-        "subjects": subjects,
-        "study_sessions": sessions,
-        "tasks": tasks,
-        "settings": settings,
-        "calendar_events": calendar_events,
-        "exported_at": datetime.now(timezone.utc).isoformat()
-    }
+    if format == "zip":
+        body = iter_export_zip(user.id)
+        media_type = "application/zip"
+    else:
+        body = iter_export_json(user.id)
+        media_type = "application/json"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format)}"'}
+    )
+
+
+@router.post("/export/jobs")
+async def create_export_job(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """
+    Inicia uma exportação ZIP em background.
+    O arquivo fica disponível para download quando o job termina.
+    
+    Returns:
+        dict: Job criado (id, status, expires_at)
+    """
+    user = await get_current_user(request, session_token)
+    job = await start_export_job(user.id)
+    return {"id": job["id"], "status": job["status"], "expires_at": job["expires_at"]}
+
+
+@router.get("/export/jobs/{job_id}")
+async def get_export_job_status(
+    job_id: str,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """
+    Retorna o status de um job de exportação.
+    
+    Raises:
+        HTTPException: 404 se job não encontrado
+    """
+    user = await get_current_user(request, session_token)
+    job = await get_export_job(user.id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.get("/export/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """
+    Baixa o arquivo gerado por um job de exportação.
+    
+    Raises:
+        HTTPException: 404 se job não encontrado, 409 se ainda não disponível
+    """
+    user = await get_current_user(request, session_token)
+    job = await get_export_job(user.id, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    
+    path = export_job_file(job)
+    if not path:
+        raise HTTPException(status_code=409, detail=f"Export not available (status: {job.get('status')})")
     
-    return export_data
+    return FileResponse(path, media_type="application/zip", filename=export_filename("zip"))
 
 
 @router.post("/nickname")
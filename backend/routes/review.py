@@ -2,14 +2,21 @@
 Rotas de Revisão (Sistema de Revisão Espaçada).
 Gerencia matérias de revisão e sessões programadas.
 """
-from fastapi import APIRouter, Request, Cookie, HTTPException
+from fastapi import APIRouter, Request, Cookie, HTTPException, Query
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
 from datetime import datetime, timezone, timedelta
 import uuid
 
-from database import db
+from database import db, run_in_transaction
 from dependencies import get_current_user
+from models.calendar import CalendarEvent
+from services.calendar_service import invalidate_month_summaries
+from services.review_service import (
+    list_reviews, review_dashboard, pick_review_slot, load_class_timeline,
+    REVIEW_PAGE_SIZE, REVIEW_PAGE_MAX
+)
+from services.review_scheduler import grade_review, reschedule_reviews
 
 router = APIRouter(prefix="/review")
 
@@ -62,6 +69,11 @@ class ReviewSession(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
+class ReviewCompletion(BaseModel):
+    """Modelo para concluir revisão (nota de recordação opcional, 0-5)."""
+    grade: Optional[int] = Field(None, ge=0, le=5)
+
+
 # Intervalos de revisão (em dias) - Modo Normal
 REVIEW_INTERVALS_NORMAL = [1, 3, 7, 14, 30, 60, 120, 365]
 
@@ -108,43 +120,8 @@ async def find_available_time_slot(
     Evita conflitos com eventos já agendados.
     """
     day_start = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    day_end = day_start + timedelta(days=1)
-    
-    # Busca eventos existentes no dia
-    existing_events = await db.calendar_events.find({
-        "user_id": user_id,
-        "start": {"$lt": day_end.isoformat()},
-        "end": {"$gt": day_start.isoformat()},
-    }).to_list(100)
-    
-    # Extrai horários ocupados
-    busy_slots = []
-    for ev in existing_events:
-        if ev.get("event_type") == "class":
-            start = datetime.fromisoformat(ev["start"]) if isinstance(ev["start"], str) else ev["start"]
-            end = datetime.fromisoformat(ev["end"]) if isinstance(ev["end"], str) else ev["end"]
-            busy_slots.append((start, end))
-    
-    # Tenta horários preferenciais
-    preferred_hours = [14, 16, 18, 10, 20, 8, 12]
-    
-    for hour in preferred_hours:
-        candidate_start = target_date.replace(hour=hour, minute=0, second=0, microsecond=0)
-        candidate_end = candidate_start + timedelta(hours=duration_hours)
-        
-        # Verifica conflitos
-        has_conflict = False
-        for busy_start, busy_end in busy_slots:
-            if candidate_start < busy_end and candidate_end > busy_start:
-                has_conflict = True
-                break
-        
-        if not has_conflict:
-            return candidate_start, candidate_end
-    
-    # Fallback: 14h
-    fallback_start = target_date.replace(hour=14, minute=0, second=0, microsecond=0)
-    return fallback_start, fallback_start + timedelta(hours=duration_hours)
+    timeline = await load_class_timeline(user_id, day_start, day_start + timedelta(days=1))
+    return pick_review_slot(timeline, target_date, timedelta(hours=duration_hours))
 
 
 # ================== ROTAS ==================
@@ -261,6 +238,7 @@ async def delete_review_subject(
             "id": {"$in": event_ids},
             "user_id": user.id
         })
+        await invalidate_month_summaries(user.id)
     
     # Deleta sessões de revisão
     await db.review_sessions.delete_many({"review_subject_id": subject_id, "user_id": user.id})
@@ -292,12 +270,6 @@ async def start_review_subject(
     
     now = datetime.now(timezone.utc)
     
-    # Marca data do primeiro estudo
-    await db.review_subjects.update_one(
-        {"id": subject_id},
-        {"$set": {"first_study_date": now.isoformat()}}
-    )
-    
     # Calcula intervalos
     if subject["mode"] == "exam" and subject.get("exam_date"):
         exam_dt = datetime.fromisoformat(subject["exam_date"]) if isinstance(subject["exam_date"], str) else subject["exam_date"]
@@ -305,79 +277,68 @@ async def start_review_subject(
     else:
         intervals = REVIEW_INTERVALS_NORMAL
     
-    # Cria sessões
+    # Aulas de todo o horizonte do cronograma (uma consulta)
+    scheduled_dates = [now + timedelta(days=d) for d in intervals]
+    horizon_start = min(scheduled_dates).replace(hour=0, minute=0, second=0, microsecond=0)
+    horizon_end = max(scheduled_dates).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    timeline = await load_class_timeline(user.id, horizon_start, horizon_end)
+    
+    # Monta sessões e eventos em memória
+    session_docs = []
+    event_docs = []
     sessions_created = []
-    for i, interval_days in enumerate(intervals, start=1):
-        scheduled = now + timedelta(days=interval_days)
+    for i, scheduled in enumerate(scheduled_dates, start=1):
+        event_start, event_end = pick_review_slot(timeline, scheduled, timedelta(hours=2))
         
-        session = ReviewSession(
+        event_dict = CalendarEvent(
+            user_id=user.id,
+            title=f"📚 Revisão {i}: {subject['name']}",
+            start=event_start,
+            end=event_end,
+            subject_id=subject.get("cycle_subject_id"),
+            event_type="review",
+            checklist=[]
+        ).model_dump()
+        event_dict["created_at"] = event_dict["created_at"].isoformat()
+        event_dict["start"] = event_dict["start"].isoformat()
+        event_dict["end"] = event_dict["end"].isoformat()
+        
+        session_dict = ReviewSession(
             user_id=user.id,
             review_subject_id=subject_id,
             review_number=i,
             scheduled_date=scheduled,
-            status="pending"
-        )
-        
-        session_dict = session.model_dump()
+            status="pending",
+            calendar_event_id=event_dict["id"]
+        ).model_dump()
         session_dict["created_at"] = session_dict["created_at"].isoformat()
         session_dict["scheduled_date"] = session_dict["scheduled_date"].isoformat()
         
-        await db.review_sessions.insert_one(session_dict)
-        
-        # Cria evento na agenda
-        event_start, event_end = await find_available_time_slot(user.id, scheduled, duration_hours=2)
-        
-        event_title = f"📚 Revisão {i}: {subject['name']}"
-        
-        # Import CalendarEvent model if exists
-        try:
-            from models.calendar import CalendarEvent
-            event = CalendarEvent(
-                user_id=user.id,
-                title=event_title,
-                start=event_start,
-                end=event_end,
-                subject_id=subject.get("cycle_subject_id"),
-                event_type="review",
-                checklist=[]
-            )
-            event_dict = event.model_dump()
-        except ImportError:
-            # Fallback: criar dict manualmente
-            event_dict = {
-                "id": str(uuid.uuid4()),
-                "user_id": user.id,
-                "title": event_title,
-                "start": event_start.isoformat(),
-                "end": event_end.isoformat(),
-                "subject_id": subject.get("cycle_subject_id"),
-                "event_type": "review",
-                "checklist": [],
-                "created_at": now.isoformat()
-            }
-        
-        # Converte datetime para string se necessário
-        if isinstance(event_dict.get("created_at"), datetime):
-            event_dict["created_at"] = event_dict["created_at"].isoformat()
-        if isinstance(event_dict.get("start"), datetime):
-            event_dict["start"] = event_dict["start"].isoformat()
-        if isinstance(event_dict.get("end"), datetime):
-            event_dict["end"] = event_dict["end"].isoformat()
-        
-        await db.calendar_events.insert_one(event_dict)
-        
-        # Atualiza sessão com ID do evento
-        await db.review_sessions.update_one(
-            {"id": session_dict["id"]},
-            {"$set": {"calendar_event_id": event_dict["id"]}}
-        )
-        
+        session_docs.append(session_dict)
+        event_docs.append(event_dict)
         sessions_created.append({
             "review_number": i,
             "scheduled_date": scheduled.isoformat(),
             "calendar_event_id": event_dict["id"]
         })
     
+    async def write_schedule(session):
+        # Marca data do primeiro estudo (só se ainda não iniciada)
+        res = await db.review_subjects.update_one(
+            {"id": subject_id, "user_id": user.id, "first_study_date": None},
+            {"$set": {"first_study_date": now.isoformat()}},
+            session=session
+        )
+        if res.modified_count == 0:
+            return False
+        await db.review_sessions.insert_many(session_docs, session=session)
+        await db.calendar_events.insert_many(event_docs, session=session)
+        return True
+    
+    if not await run_in_transaction(write_schedule):
+        raise HTTPException(status_code=400, detail="Matéria já foi iniciada")
+    await invalidate_month_summaries(user.id)
+    
     return {
         "success": True,
         "sessions_created": len(sessions_created),
@@ -389,14 +350,17 @@ async def start_review_subject(
 async def complete_review_session(
     session_id: str,
     request: Request,
+    completion: Optional[ReviewCompletion] = None,
     session_token: Optional[str] = Cookie(None)
 ):
     """
     Marca uma sessão de revisão como completa.
-    Aplica penalidade se houve atraso.
+    Com nota de recordação, atualiza o estado SM-2 da matéria e reprojeta as
+    sessões pendentes a partir de hoje (o atraso entra no novo cronograma).
     
     Returns:
-        dict: {"success": True, "days_late": int, "penalty_applied": bool}
+        dict: {"success": True, "days_late": int, "penalty_applied": bool,
+               "srs": Optional[dict], "rescheduled": int}
     """
     user = await get_current_user(request, session_token)
     
@@ -426,103 +390,117 @@ async def complete_review_session(
             {"id": session["calendar_event_id"], "user_id": user.id},
             {"$set": {"completed": True}}
         )
+        await invalidate_month_summaries(user.id)
+    
+    # Agendamento adaptativo
+    srs = None
+    rescheduled = 0
+    if completion and completion.grade is not None:
+        subject = await db.review_subjects.find_one(
+            {"id": session["review_subject_id"], "user_id": user.id}, {"_id": 0}
+        )
+        if subject:
+            result = await grade_review(user.id, subject, session, completion.grade, now)
+            srs = result["srs"]
+            rescheduled = result["sessions_moved"]
     
     return {
         "success": True,
         "days_late": days_late,
-        "penalty_applied": days_late > 0
+        "penalty_applied": days_late > 0,
+        "srs": srs,
+        "rescheduled": rescheduled
     }
 
 
+@router.post("/reschedule")
+async def reschedule_all_reviews(
+    request: Request,
+    session_token: Optional[str] = Cookie(None)
+):
+    """
+    Reprojeta de uma vez as sessões em aberto de todas as matérias com
+    agendamento adaptativo e move os eventos da agenda.
+    
+    Returns:
+        dict: {"subjects": int, "sessions_moved": int, "events_moved": int}
+    """
+    user = await get_current_user(request, session_token)
+    return await reschedule_reviews(user.id)
+
+
 @router.get("/upcoming")
 async def get_upcoming_reviews(
     request: Request,
     session_token: Optional[str] = Cookie(None),
-    days_ahead: int = 30
+    days_ahead: int = Query(30, ge=1, le=3650),
+    limit: int = Query(REVIEW_PAGE_SIZE, ge=1, le=REVIEW_PAGE_MAX),
+    cursor: Optional[str] = None
 ):
     """
-    Retorna próximas revisões programadas.
+    Retorna próximas revisões programadas (paginadas por cursor).
     
     Args:
         days_ahead: Número de dias para buscar à frente (default: 30)
+        limit: Itens por página
+        cursor: next_cursor da página anterior
     
     Returns:
-        List[dict]: Lista de sessões futuras com dados da matéria
+        dict: {"items": List[dict], "next_cursor": Optional[str]} com dados da matéria
     """
     user = await get_current_user(request, session_token)
     
-    now = datetime.now(timezone.utc)
-    future_date = now + timedelta(days=days_ahead)
-    
-    sessions = await db.review_sessions.find({
-        "user_id": user.id,
-        "status": "pending",
-        "scheduled_date": {
-            "$gte": now.isoformat(),
-            "$lte": future_date.isoformat()
-        }
-    }, {"_id": 0}).sort("scheduled_date", 1).to_list(1000)
-    
-    # Enriquece com dados da matéria
-    result = []
-    for session in sessions:
-        subject = await db.review_subjects.find_one(
-            {"id": session["review_subject_id"]},
-            {"_id": 0, "name": 1, "area": 1, "mode": 1}
-        )
-        
-        if subject:
-            result.append({
-                **session,
-                "subject_name": subject["name"],
-                "subject_area": subject.get("area"),
-                "subject_mode": subject.get("mode")
-            })
-    
-    return result
+    try:
+        return await list_reviews(user.id, "upcoming", limit, cursor, days_ahead)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/overdue")
 async def get_overdue_reviews(
     request: Request,
-    session_token: Optional[str] = Cookie(None)
+    session_token: Optional[str] = Cookie(None),
+    limit: int = Query(REVIEW_PAGE_SIZE, ge=1, le=REVIEW_PAGE_MAX),
+    cursor: Optional[str] = None
 ):
     """
-    Retorna revisões atrasadas.
+    Retorna revisões atrasadas (paginadas por cursor).
+    O status "overdue" é marcado pelo job periódico (sweep_overdue_reviews).
+    
+    Args:
+        limit: Itens por página
+        cursor: next_cursor da página anterior
     
     Returns:
-        List[dict]: Lista de sessões atrasadas com dias de atraso
+        dict: {"items": List[dict], "next_cursor": Optional[str]} com dias de atraso
     """
     user = await get_current_user(request, session_token)
     
-    now = datetime.now(timezone.utc)
+    try:
+        return await list_reviews(user.id, "overdue", limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/dashboard")
+async def get_review_dashboard(
+    request: Request,
+    session_token: Optional[str] = Cookie(None),
+    days_ahead: int = Query(30, ge=1, le=3650),
+    limit: int = Query(REVIEW_PAGE_SIZE, ge=1, le=REVIEW_PAGE_MAX)
+):
+    """
+    Contagens e primeira página de próximas e atrasadas numa única consulta.
     
-    sessions = await db.review_sessions.find({
-        "user_id": user.id,
-        "status": "pending",
-        "scheduled_date": {"$lt": now.isoformat()}
-    }, {"_id": 0}).sort("scheduled_date", 1).to_list(1000)
-    
-    # Enriquece com dados da matéria e calcula atraso
-    result = []
-    for session in sessions:
-        subject = await db.review_subjects.find_one(
-            {"id": session["review_subject_id"]},
-            {"_id": 0, "name": 1, "area": 1}
-        )
-        
-        if subject:
-            scheduled = datetime.fromisoformat(session["scheduled_date"])
-            days_late = (now.date() - scheduled.date()).days
-            
-            result.append({
-                **session,
-                "subject_name": subject["name"],
-                "subject_area": subject.get("area"),
-                "days_late": days_late
-            })
-    
-    return result
+    Args:
+        days_ahead: Número de dias para buscar à frente (default: 30)
+        limit: Itens por página
+    
+    Returns:
+        dict: {"counts": {"upcoming", "overdue"}, "upcoming": página, "overdue": página}
+    """
+    user = await get_current_user(request, session_token)
+    return await review_dashboard(user.id, days_ahead, limit)
 
 
 @router.get("/subjects/{subject_id}/sessions")
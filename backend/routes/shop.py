@@ -2,13 +2,18 @@
 Rotas da loja (shop).
 Gerencia itens da loja, compra, equipar/desequipar items.
 """
-from fastapi import APIRouter, Request, Cookie, HTTPException
-from typing import Optional, List
+from fastapi import APIRouter, Request, Cookie, HTTPException, Response
+from typing import Optional
+from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel
+from pymongo import ReturnDocument
 
 from database import db
 from dependencies import get_current_user
 from config import FREE_SHOP
+from services.ledger_service import record_ledger_entry, revert_ledger_entry, LEDGER_GRACE_SECONDS
+from services.shop_catalog import get_catalog, get_shop_item
+from utils.helpers import etag_matches
 
 router = APIRouter(prefix="/shop")
 
@@ -28,30 +33,25 @@ class PurchaseBody(BaseModel):
     item_id: str
 
 
-async def _load_shop_items() -> List[dict]:
-    """
-    Carrega todos os itens da loja do banco de dados.
-    
-    Returns:
-        List[dict]: Lista de itens da loja
-    """
-    items = await db.shop_items.find({}, {"_id": 0}).to_list(1000)
-    return items
-
-
 @router.get("/list")
 @router.get("/items")
 @router.get("")
 @router.get("/all")
-async def shop_list():
+async def shop_list(request: Request):
     """
     Lista todos os itens disponíveis na loja.
+    Resposta pré-serializada por versão do catálogo, com ETag (304 se não mudou).
     
     Returns:
-        dict: Itens da loja e se a loja está grátis (modo teste)
+        Response: Itens da loja e se a loja está grátis (modo teste)
     """
-    items = await _load_shop_items()
-    return {"items": items, "free_shop": FREE_SHOP}
+    catalog = await get_catalog()
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+    
+    if etag_matches(request.headers.get("if-none-match"), catalog.etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
 
 
 @router.post("/purchase")
@@ -76,40 +76,65 @@ async def shop_purchase(
     Raises:
         HTTPException: 404 se item não encontrado
         HTTPException: 400 se já possui o item ou coins insuficientes
+        HTTPException: 409 se a mesma compra está em andamento
     """
     user = await get_current_user(request, session_token)
     
-    # Busca o item
-    items = await _load_shop_items()
-    item = next((x for x in items if x["id"] == body.item_id), None)
+    # Preço vem do catálogo em memória
+    item = await get_shop_item(body.item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item não encontrado")
     
-    # Verifica se já possui
-    items_owned = user.items_owned or []
-    if body.item_id in items_owned:
-        raise HTTPException(status_code=400, detail="Você já possui este item")
-    
-    # Verifica coins (a menos que FREE_SHOP esteja ativo)
-    price = item.get("price", 0)
-    if not FREE_SHOP:
-        if user.coins < price:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Coins insuficientes. Você tem {user.coins}, precisa de {price}"
-            )
-    
-    # Adiciona item ao inventário
-    await db.users.update_one(
-        {"id": user.id},
+    price = int(item.get("price", 0))
+    cost = price if not FREE_SHOP else 0
+    
+    # Débito registrado no ledger antes do saldo (o ledger é a fonte da
+    # verdade); a chave já existir significa compra anterior ou tentativa
+    # interrompida, que o update abaixo conclui ou desfaz
+    key = f"shop:{user.id}:{body.item_id}"
+    recorded = await record_ledger_entry(user.id, -cost, 0, "shop_purchase", key=key)
+    if not recorded:
+        # Lançamento recente é de outro request ainda concluindo a compra
+        existing = await db.reward_ledger.find_one({"key": key}, {"_id": 0, "created_at": 1})
+        recent = (datetime.now(timezone.utc) - timedelta(seconds=LEDGER_GRACE_SECONDS)).isoformat()
+        if existing and existing.get("created_at", "") >= recent:
+            if await db.users.find_one({"id": user.id, "items_owned": body.item_id}, {"_id": 1}):
+                raise HTTPException(status_code=400, detail="Você já possui este item")
+            raise HTTPException(status_code=409, detail="Compra em andamento")
+    
+    # Compra atômica: só debita se ainda não possui e tem coins suficientes
+    updated = await db.users.find_one_and_update(
+        {
+            "id": user.id,
+            "items_owned": {"$ne": body.item_id},
+            "coins": {"$gte": cost},
+        },
         {
             "$push": {"items_owned": body.item_id},
-            "$inc": {"coins": -price if not FREE_SHOP else 0}
-        }
+            "$inc": {"coins": -cost}
+        },
+        projection={"_id": 0, "coins": 1},
+        return_document=ReturnDocument.AFTER
     )
     
-    new_balance = user.coins - (price if not FREE_SHOP else 0)
-    return {"ok": True, "new_balance": new_balance}
+    if not updated:
+        owned = await db.users.find_one(
+            {"id": user.id, "items_owned": body.item_id},
+            {"_id": 1}
+        )
+        if owned:
+            # Lançamento pertence à compra que já existia
+            if recorded:
+                await revert_ledger_entry(user.id, key)
+            raise HTTPException(status_code=400, detail="Você já possui este item")
+        # Compra recusada: o débito não foi aplicado, sai do ledger
+        await revert_ledger_entry(user.id, key)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Coins insuficientes. Você tem {user.coins}, precisa de {price}"
+        )
+    
+    return {"ok": True, "new_balance": int(updated.get("coins", 0))}
 
 
 @router.post("/equip")
@@ -137,8 +162,7 @@ async def shop_equip(
     user = await get_current_user(request, session_token)
     
     # Busca o item
-    items = await _load_shop_items()
-    item = next((x for x in items if x["id"] == body.item_id), None)
+    item = await get_shop_item(body.item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item não encontrado")
     
@@ -21,9 +21,11 @@ from services.reward_service import (
     _softcap_multiplier,
     _coins_raw,
     _session_xp_raw,
-    _apply_mults,
-    _xp_curve_per_level
+    _apply_mults
 )
+from services.ledger_service import apply_reward
+from services.heatmap_service import record_study_minutes
+from services.stats_service import record_session_stats
 from services.calendar_service import _try_autocomplete_events
 from services.quest_service import update_weekly_quests_after_study
 
@@ -214,10 +216,11 @@ async def end_study_session(
     coins = _apply_mults(coins_base, completion_mult, fatigue_mult, streak_mult, softcap_mult)
     xp = _apply_mults(xp_base, completion_mult, fatigue_mult, streak_mult)
 
+    end_iso = datetime.now(timezone.utc).isoformat()
     await db.study_sessions.update_one(
         {"id": input.session_id},
         {"$set": {
-            "end_time": datetime.now(timezone.utc).isoformat(),
+            "end_time": end_iso,
             "duration": int(counted_duration),
             "completed": bool(completed_flag),
             "skipped": bool(input.skipped),
@@ -226,10 +229,25 @@ async def end_study_session(
         }}
     )
 
+    # Agregados só na primeira finalização da sessão
+    first_end = not session.get("end_time") and bool(session.get("start_time"))
+
+    # Rollup diário do heatmap de consistência (só sessões concluídas)
+    if first_end and completed_flag:
+        await record_study_minutes(user.id, session["start_time"], end_iso, counted_duration)
+
+    # Contadores vitalícios de /stats
+    if first_end:
+        await record_session_stats(user.id, session["start_time"], end_iso, counted_duration, completed_flag)
+
     # Limpar estado de sessão ativa do usuário
+    # (e invalida o cache de estatísticas do perfil)
     await db.users.update_one(
         {"id": user.id},
-        {"$unset": {"active_session": ""}}
+        {
+            "$unset": {"active_session": ""},
+            "$inc": {"stats_generation": 1}
+        }
     )
     # --- FIM NOVA FÓRMULA ---
 
@@ -257,27 +275,12 @@ async def end_study_session(
             upsert=True
         )
 
-    # Atualiza usuário (coins/xp/level)
+    # Atualiza usuário (coins/xp/level) via ledger: uma vez por sessão
     if coins or xp:
-        udoc = await db.users.find_one({"id": user.id}, {"_id": 0}) or {
-            "id": user.id, "coins": 0, "xp": 0, "level": 1
-        }
-        new_xp = int(udoc.get("xp", 0)) + int(xp)
-        new_lvl = int(udoc.get("level", 1))
-        need_xp = _xp_curve_per_level(new_lvl)
-        
-        while new_xp >= need_xp:
-            new_xp -= need_xp
-            new_lvl += 1
-            need_xp = _xp_curve_per_level(new_lvl)
-
-        await db.users.update_one(
-            {"id": user.id},
-            {
-                "$inc": {"coins": int(coins)},
-                "$set": {"xp": int(new_xp), "level": int(new_lvl)}
-            },
-            upsert=True
+        await apply_reward(
+            user.id, int(coins), int(xp),
+            reason="study_session",
+            key=f"study:{input.session_id}"
         )
 
     # Atualiza quests semanais
@@ -6,6 +6,8 @@ from fastapi import APIRouter, Request, Cookie, HTTPException
 from typing import Optional, List
 import random
 
+from pymongo import UpdateOne
+
 from database import db
 from dependencies import get_current_user
 from models.subject import Subject, SubjectCreate, SubjectUpdate
@@ -189,20 +191,20 @@ async def reorder_subjects(
         session_token: Token de sessão do cookie
     
     Returns:
-        dict: {"success": True}
+        dict: {"success": True, "updated": matérias regravadas}
     
     Raises:
         HTTPException: 400 se IDs inválidos
     """
     user = await get_current_user(request, session_token)
 
-    # Valida IDs pertencentes ao usuário
+    # Valida IDs pertencentes ao usuário (e lê a ordem atual)
     user_subjects = await db.subjects.find(
         {"user_id": user.id},
-        {"_id": 0, "id": 1}
+        {"_id": 0, "id": 1, "order": 1}
     ).to_list(1000)
     
-    owned = {s["id"] for s in user_subjects}
+    owned = {s["id"]: s.get("order") for s in user_subjects}
     invalid = [sid for sid in payload.order if sid not in owned]
     
     if invalid:
@@ -211,11 +213,13 @@ async def reorder_subjects(
             detail=f"IDs inválidos: {invalid}"
         )
 
-    # Atualiza 1 a 1 (simples e compatível com Motor)
-    for idx, sid in enumerate(payload.order):
-        await db.subjects.update_one(
-            {"id": sid, "user_id": user.id},
-            {"$set": {"order": idx}}
-        )
+    # Um único bulk_write, só com as matérias que mudaram de posição
+    ops = [
+        UpdateOne({"id": sid, "user_id": user.id}, {"$set": {"order": idx}})
+        for idx, sid in enumerate(payload.order)
+        if owned[sid] != idx
+    ]
+    if ops:
+        await db.subjects.bulk_write(ops, ordered=True)
 
-    return {"success": True}
+    return {"success": True, "updated": len(ops)}
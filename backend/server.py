@@ -17,12 +17,21 @@ Estrutura:
 from fastapi import FastAPI, Request, HTTPException, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import asyncio
 import os
 import secrets
 
 # Importa configurações centralizadas
-from config import logger, IS_DEV
+from config import (
+    logger, IS_DEV, LEDGER_COMPACTION_INTERVAL, REVIEW_OVERDUE_SWEEP_INTERVAL,
+    EXPORT_CLEANUP_INTERVAL
+)
 from database import db
+from services.ledger_service import ensure_ledger_indexes, compact_reward_ledger
+from services.review_service import sweep_overdue_reviews
+from services.export_service import ensure_export_indexes, cleanup_export_jobs
+from services.financeiro_service import migrate_all_legacy
+from utils.helpers import run_periodic, ensure_unique_index
 
 # ================== CRIAÇÃO DA APLICAÇÃO ==================
 
@@ -143,6 +152,9 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 # ================== EVENTOS DE STARTUP/SHUTDOWN ==================
 
+# Tarefas em background (jobs periódicos) canceladas no shutdown
+background_tasks: list = []
+
 @app.on_event("startup")
 async def startup_indexes():
     """
@@ -155,14 +167,53 @@ async def startup_indexes():
     try:
         await db.groups.create_index("invite_code")
         await db.group_members.create_index([("group_id", 1), ("user_id", 1)])
-        await db.users.create_index("email", unique=True)
         await db.subjects.create_index([("user_id", 1), ("order", 1)])
         await db.tasks.create_index([("subject_id", 1), ("completed", 1)])
         await db.study_sessions.create_index([("user_id", 1), ("start_time", -1)])
-        await db.calendar_events.create_index([("user_id", 1), ("start_time", 1)])
+        await db.calendar_events.create_index([("user_id", 1), ("start", 1)])
+        await db.review_sessions.create_index([("user_id", 1), ("status", 1), ("scheduled_date", 1)])
+        await db.review_sessions.create_index([("status", 1), ("scheduled_date", 1)])
+        await db.review_subjects.create_index("id")
+        await ensure_ledger_indexes()
+        await db.financeiro.create_index("user_id")
+        await ensure_export_indexes()
         logger.info("✓ Índices do MongoDB criados/verificados")
     except Exception as e:
         logger.error(f"⚠️ Erro ao criar índices: {e}")
+
+    # Índices únicos, cada um isolado (os upserts/DuplicateKeyError dependem deles).
+    # Coleções que antes gravavam com ler-e-inserir podem ter duplicatas: limpa antes.
+    await ensure_unique_index(db.users, "email")
+    await ensure_unique_index(
+        db.calendar_events,
+        [("user_id", 1), ("ics_uid", 1)],
+        partialFilterExpression={"ics_uid": {"$type": "string"}}
+    )
+    await ensure_unique_index(db.study_daily, [("user_id", 1), ("date", 1)])
+    await ensure_unique_index(db.user_stats, "user_id")
+    await ensure_unique_index(
+        db.habit_completions, [("user_id", 1), ("habit_id", 1), ("date", 1)], dedupe=True
+    )
+    await ensure_unique_index(db.habit_years, [("user_id", 1), ("habit_id", 1), ("year", 1)])
+    await ensure_unique_index(db.devocional, "user_id", dedupe=True)
+    await ensure_unique_index(db.financeiro_months, [("user_id", 1), ("year", 1), ("month", 1)])
+    
+    # Migração do financeiro antigo em background (leituras migram sob demanda até terminar)
+    background_tasks.append(asyncio.create_task(migrate_all_legacy()))
+    
+    # Jobs periódicos
+    if LEDGER_COMPACTION_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodic(compact_reward_ledger, LEDGER_COMPACTION_INTERVAL, "ledger-compaction")
+        ))
+    if REVIEW_OVERDUE_SWEEP_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodic(sweep_overdue_reviews, REVIEW_OVERDUE_SWEEP_INTERVAL, "review-overdue-sweep")
+        ))
+    if EXPORT_CLEANUP_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(
+            run_periodic(cleanup_export_jobs, EXPORT_CLEANUP_INTERVAL, "export-cleanup")
+        ))
     
     logger.info("✓ Pomociclo API iniciada com sucesso!")
 
@@ -174,6 +225,8 @@ async def shutdown_event():
     Limpa recursos e fecha conexões.
     """
     logger.info("👋 Desligando Pomociclo API...")
+    for task in background_tasks:
+        task.cancel()
 
 # ================== ROUTER PRINCIPAL DA API ==================
 
@@ -0,0 +1,174 @@
+"""
+Índice do plano de leitura bíblica anual (bible_plan.BIBLE_PLAN).
+As referências são interpretadas uma vez, na importação, em leituras
+estruturadas (livro, capítulos, versículos), com buscas por data do
+calendário e por livro. A resposta do plano completo fica serializada,
+com ETag forte, para as rotas responderem 304 sem montar nada.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+import hashlib
+import json
+import re
+import logging
+
+from bible_plan import BIBLE_PLAN
+
+logger = logging.getLogger("pomociclo")
+
+# Ano sem 29/02 usado para associar dia do plano a mês/dia
+_PLAN_YEAR = 2025
+
+# Abreviações do plano -> nome do livro
+BOOK_NAMES = {
+    "Gn": "Gênesis", "Ex": "Êxodo", "Lv": "Levítico", "Nm": "Números",
+    "Dt": "Deuteronômio", "Js": "Josué", "Jz": "Juízes", "Rt": "Rute",
+    "1 Sm": "1 Samuel", "2 Sm": "2 Samuel", "1 Rs": "1 Reis", "2 Rs": "2 Reis",
+    "1 Cr": "1 Crônicas", "2 Cr": "2 Crônicas", "Ed": "Esdras", "Ne": "Neemias",
+    "Et": "Ester", "Jó": "Jó", "Sl": "Salmos", "Pv": "Provérbios",
+    "Ec": "Eclesiastes", "Ct": "Cânticos", "Is": "Isaías", "Jr": "Jeremias",
+    "Lm": "Lamentações", "Ez": "Ezequiel", "Dn": "Daniel", "Os": "Oseias",
+    "Jl": "Joel", "Am": "Amós", "Ob": "Obadias", "Jn": "Jonas",
+    "Mq": "Miqueias", "Na": "Naum", "Hc": "Habacuque", "Sf": "Sofonias",
+    "Ag": "Ageu", "Zc": "Zacarias", "Ml": "Malaquias",
+    "Mt": "Mateus", "Mc": "Marcos", "Lc": "Lucas", "Jo": "João", "At": "Atos",
+    "Rm": "Romanos", "1 Co": "1 Coríntios", "2 Co": "2 Coríntios",
+    "Gl": "Gálatas", "Ef": "Efésios", "Fp": "Filipenses", "Cl": "Colossenses",
+    "1 Ts": "1 Tessalonicenses", "2 Ts": "2 Tessalonicenses",
+    "1 Tm": "1 Timóteo", "2 Tm": "2 Timóteo", "Tt": "Tito", "Fm": "Filemom",
+    "Hb": "Hebreus", "Tg": "Tiago", "1 Pe": "1 Pedro", "2 Pe": "2 Pedro",
+    "1 Jo": "1 João", "2 Jo": "2 João", "3 Jo": "3 João", "Jd": "Judas",
+    "Ap": "Apocalipse",
+}
+
+# "1 Sm. 15–16", "Mt. 5:1–26", "Sl 23", "Ob"
+_READING_RE = re.compile(
+    r"^\s*(?P<book>(?:\d\s)?[^\W\d_]+)\.?"
+    r"(?:\s+(?P<c1>\d+)(?::(?P<v1>\d+))?(?:[–-](?P<n2>\d+)(?::(?P<v2>\d+))?)?)?\s*$"
+)
+
+
+def _book_key(text: str) -> str:
+    """Chave de busca de livro: minúsculas, sem ponto nem espaços (mantém acentos: Jó ≠ Jo)."""
+    return re.sub(r"[\s.]", "", text).lower()
+
+
+def parse_reading(text: str) -> dict:
+    """
+    Interpreta uma referência ("Mt. 5:1–26").
+
+    Args:
+        text: Referência de um livro
+
+    Returns:
+        dict: {"book", "name", "chapter_start", "chapter_end",
+               "verse_start", "verse_end"} (versículos None = capítulo inteiro)
+
+    Raises:
+        ValueError: Referência fora do formato do plano
+    """
+    m = _READING_RE.match(text)
+    if not m or m.group("book") not in BOOK_NAMES:
+        raise ValueError(f"Referência inválida: {text!r}")
+
+    book = m.group("book")
+    c1 = int(m.group("c1") or 1)  # Livros de um capítulo vêm sem número
+    v1 = int(m.group("v1")) if m.group("v1") else None
+    n2 = int(m.group("n2")) if m.group("n2") else None
+    v2 = int(m.group("v2")) if m.group("v2") else None
+
+    if v1 is None:
+        # "15–16": capítulos
+        chapter_end, verse_end = (n2 or c1), None
+    elif v2 is None:
+        # "5:1–26": versículos do mesmo capítulo
+        chapter_end, verse_end = c1, (n2 or v1)
+    else:
+        # "1:1–2:3": atravessa capítulos
+        chapter_end, verse_end = n2, v2
+
+    return {
+        "book": book,
+        "name": BOOK_NAMES[book],
+        "chapter_start": c1,
+        "chapter_end": chapter_end,
+        "verse_start": v1,
+        "verse_end": verse_end,
+    }
+
+
+class BiblePlanIndex:
+    """Plano anual interpretado, com índices por dia, data e livro."""
+    def __init__(self, plan: Dict[int, dict]):
+        self.days: List[dict] = []
+        self.by_day: Dict[int, dict] = {}
+        self.by_month_day: Dict[str, dict] = {}
+        self.by_book: Dict[str, List[dict]] = {}
+
+        for day in sorted(plan):
+            ref = plan[day]["ref"]
+            month_day = (date(_PLAN_YEAR, 1, 1) + timedelta(days=day - 1)).strftime("%m-%d")
+            entry = {
+                "day": day,
+                "date": month_day,
+                "ref": ref,
+                "readings": [parse_reading(part) for part in ref.split(";")],
+            }
+            self.days.append(entry)
+            self.by_day[day] = entry
+            self.by_month_day[month_day] = entry
+            for reading in entry["readings"]:
+                self.by_book.setdefault(reading["book"], []).append(entry)
+
+        self._book_keys = {}
+        for abbr, name in BOOK_NAMES.items():
+            self._book_keys[_book_key(abbr)] = abbr
+            self._book_keys[_book_key(name)] = abbr
+
+        # Resposta de /devocional/plan já serializada (dia como chave, como o front usa)
+        self.body: bytes = json.dumps(
+            {
+                "id": "default",
+                "title": "A Bíblia em um ano",
+                "description": "Plano de leitura bíblica anual",
+                "total_days": len(self.days),
+                "plan": {str(e["day"]): e for e in self.days},
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        self.etag: str = f'"{hashlib.sha1(self.body).hexdigest()[:20]}"'
+
+    def for_date(self, d: date) -> Optional[dict]:
+        """
+        Leitura do dia do calendário (29/02 repete a leitura de 28/02).
+
+        Args:
+            d: Data
+
+        Returns:
+            Optional[dict]: Entrada do plano
+        """
+        if d.month == 2 and d.day == 29:
+            d = d - timedelta(days=1)
+        return self.by_month_day.get(d.strftime("%m-%d"))
+
+    def for_book(self, book: str) -> Optional[List[dict]]:
+        """
+        Dias em que o livro é lido (busca por abreviação ou nome).
+
+        Args:
+            book: "Mt", "mt.", "1 Sm", "1sm", "Mateus"...
+
+        Returns:
+            Optional[List[dict]]: Entradas do plano, ou None se o livro não existe
+        """
+        abbr = self._book_keys.get(_book_key(book))
+        if abbr is None:
+            return None
+        return self.by_book.get(abbr, [])
+
+
+# Montado uma única vez, na importação
+bible_plan_index = BiblePlanIndex(BIBLE_PLAN)
+logger.debug(f"bible plan indexed: {len(bible_plan_index.days)} dias")
@@ -0,0 +1,505 @@
+"""
+Serviço de recorrência da agenda.
+Eventos recorrentes são guardados como um único documento "série" (regra +
+exceções) em calendar_events; as ocorrências são geradas sob demanda, só para
+a janela consultada, e mescladas com os eventos materializados.
+
+Ocorrências virtuais têm id "<id_da_série>@<início UTC YYYYMMDDTHHMMSS>".
+Ao editar/concluir uma ocorrência ela é materializada (documento próprio com
+series_id) e seu início entra nas exceções (exdates) da série.
+"""
+from datetime import datetime, timezone, timedelta
+from typing import Iterator, List, Optional, Tuple
+import calendar as cal_module
+import logging
+
+from pymongo import UpdateOne
+
+from database import db
+from utils.datetime_utils import to_aware
+
+logger = logging.getLogger("pomociclo")
+
+# Tipos de recorrência aceitos ("once" = evento simples)
+RECURRENCE_TYPES = {"daily", "weekly", "monthly", "yearly", "every_x_days"}
+
+# Ocorrências de uma série sem until/count (mesmo limite da expansão antiga)
+DEFAULT_SERIES_OCCURRENCES = 365
+
+# Campos da série que não vão para as ocorrências
+_SERIES_ONLY_FIELDS = {"_id", "id", "start", "end", "recurrence", "series_end", "exdates"}
+
+_OCCURRENCE_FMT = "%Y%m%dT%H%M%S"
+
+
+def build_rule(
+    recurrence_type: Optional[str],
+    recurrence_interval: Optional[int],
+    recurrence_until: Optional[datetime],
+    recurrence_count: Optional[int]
+) -> Optional[dict]:
+    """
+    Monta a regra de recorrência guardada na série.
+
+    Args:
+        recurrence_type: daily, weekly, monthly, yearly, every_x_days (ou once)
+        recurrence_interval: Intervalo em dias (every_x_days)
+        recurrence_until: Último início permitido
+        recurrence_count: Número máximo de ocorrências
+
+    Returns:
+        Optional[dict]: Regra ou None para evento simples
+    """
+    if recurrence_type not in RECURRENCE_TYPES:
+        return None
+    if recurrence_count is not None and recurrence_count <= 1:
+        return None
+    until = to_aware(recurrence_until)
+    if not until and not recurrence_count:
+        recurrence_count = DEFAULT_SERIES_OCCURRENCES
+    return {
+        "type": recurrence_type,
+        "interval": max(1, int(recurrence_interval or 1)),
+        "until": until.isoformat() if until else None,
+        "count": int(recurrence_count) if recurrence_count else None,
+    }
+
+
+def _rule_count(rule: dict) -> Optional[int]:
+    """Limite de ocorrências da regra (séries antigas sem until/count usam o padrão)."""
+    if rule.get("count"):
+        return int(rule["count"])
+    return None if rule.get("until") else DEFAULT_SERIES_OCCURRENCES
+
+
+def _add_months(anchor: datetime, months: int) -> datetime:
+    """Soma meses mantendo o dia da âncora (limitado ao último dia do mês)."""
+    total = anchor.month - 1 + months
+    year, month = anchor.year + total // 12, total % 12 + 1
+    last_day = cal_module.monthrange(year, month)[1]
+    return anchor.replace(year=year, month=month, day=min(anchor.day, last_day))
+
+
+def _fixed_step(rule: dict) -> Optional[timedelta]:
+    """Passo fixo da regra (None para mensal/anual)."""
+    if rule["type"] == "daily":
+        return timedelta(days=1)
+    if rule["type"] == "weekly":
+        return timedelta(weeks=1)
+    if rule["type"] == "every_x_days":
+        return timedelta(days=rule.get("interval") or 1)
+    return None
+
+
+def _nth_start(first_start: datetime, rule: dict, k: int) -> datetime:
+    """Início da k-ésima ocorrência (k = 0 é a primeira)."""
+    step = _fixed_step(rule)
+    if step:
+        return first_start + k * step
+    if rule["type"] == "monthly":
+        return _add_months(first_start, k)
+    return _add_months(first_start, 12 * k)
+
+
+def iter_occurrences(
+    first_start: datetime,
+    first_end: datetime,
+    rule: dict,
+    window_start: datetime,
+    window_end: datetime
+) -> Iterator[Tuple[datetime, datetime]]:
+    """
+    Gera (lazy) as ocorrências da regra que tocam [window_start, window_end).
+    Começa direto no primeiro índice relevante em vez de percorrer a série.
+
+    Args:
+        first_start: Início da primeira ocorrência (timezone-aware)
+        first_end: Fim da primeira ocorrência
+        rule: Regra (build_rule)
+        window_start: Início da janela
+        window_end: Fim da janela
+
+    Yields:
+        Tuple[datetime, datetime]: (início, fim) de cada ocorrência
+    """
+    duration = first_end - first_start
+    until = to_aware(rule.get("until"))
+    count = _rule_count(rule)
+
+    # Primeiro índice cuja ocorrência pode terminar depois de window_start
+    lower = window_start - duration
+    step = _fixed_step(rule)
+    if lower <= first_start:
+        k = 0
+    elif step:
+        k = (lower - first_start) // step
+    else:
+        months = (lower.year - first_start.year) * 12 + lower.month - first_start.month
+        k = max(0, (months if rule["type"] == "monthly" else months // 12) - 1)
+
+    while True:
+        if count is not None and k >= count:
+            return
+        start = _nth_start(first_start, rule, k)
+        if (until and start > until) or start >= window_end:
+            return
+        end = start + duration
+        if end > window_start:
+            yield start, end
+        k += 1
+
+
+def series_end(first_start: datetime, first_end: datetime, rule: dict) -> str:
+    """
+    Fim da última ocorrência (ISO), usado para filtrar séries por janela.
+
+    Args:
+        first_start: Início da primeira ocorrência
+        first_end: Fim da primeira ocorrência
+        rule: Regra
+
+    Returns:
+        str: ISO do fim da série
+    """
+    duration = first_end - first_start
+    count = _rule_count(rule)
+    if count:
+        return (_nth_start(first_start, rule, count - 1) + duration).isoformat()
+    return (to_aware(rule["until"]) + duration).isoformat()
+
+
+def occurrence_index(first_start: datetime, rule: dict, start: datetime) -> Optional[int]:
+    """
+    Posição (k) de uma ocorrência na série a partir do seu início.
+
+    Args:
+        first_start: Início da primeira ocorrência
+        rule: Regra
+        start: Início da ocorrência
+
+    Returns:
+        Optional[int]: k ou None se `start` não é uma ocorrência da regra
+    """
+    step = _fixed_step(rule)
+    if step:
+        k, rest = divmod(start - first_start, step)
+        if rest:
+            return None
+    else:
+        months = (start.year - first_start.year) * 12 + start.month - first_start.month
+        k = months if rule["type"] == "monthly" else months // 12
+    if k < 0 or _nth_start(first_start, rule, k) != start:
+        return None
+    return k
+
+
+def occurrence_id(series_id: str, start: datetime) -> str:
+    """Id da ocorrência de uma série."""
+    return f"{series_id}@{start.astimezone(timezone.utc).strftime(_OCCURRENCE_FMT)}"
+
+
+def parse_occurrence_id(event_id: str) -> Optional[Tuple[str, datetime]]:
+    """
+    Separa o id de uma ocorrência virtual.
+
+    Args:
+        event_id: Id recebido na rota
+
+    Returns:
+        Optional[Tuple[str, datetime]]: (id da série, início) ou None se não for ocorrência
+    """
+    series_id, sep, stamp = event_id.rpartition("@")
+    if not sep or not series_id:
+        return None
+    try:
+        start = datetime.strptime(stamp, _OCCURRENCE_FMT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return series_id, start
+
+
+def expand_series(
+    series: dict,
+    window_start: datetime,
+    window_end: datetime
+) -> Iterator[dict]:
+    """
+    Ocorrências virtuais de uma série na janela (sem as exceções).
+
+    Args:
+        series: Documento da série
+        window_start: Início da janela
+        window_end: Fim da janela
+
+    Yields:
+        dict: Evento no mesmo formato dos documentos de calendar_events
+    """
+    first_start = to_aware(series["start"])
+    first_end = to_aware(series["end"])
+    if not first_start or not first_end:
+        return
+    exdates = set(series.get("exdates") or [])
+    template = {k: v for k, v in series.items() if k not in _SERIES_ONLY_FIELDS}
+
+    for start, end in iter_occurrences(first_start, first_end, series["recurrence"], window_start, window_end):
+        if start.isoformat() in exdates:
+            continue
+        yield {
+            **template,
+            "id": occurrence_id(series["id"], start),
+            "series_id": series["id"],
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "completed": False,
+        }
+
+
+async def find_window_series(
+    user_id: str,
+    window_start: datetime,
+    window_end: datetime,
+    extra_query: Optional[dict] = None,
+    projection: Optional[dict] = None,
+    limit: int = 1000
+) -> List[dict]:
+    """
+    Séries do usuário com alguma ocorrência possível na janela.
+
+    Args:
+        user_id: ID do usuário
+        window_start: Início da janela (timezone-aware)
+        window_end: Fim da janela
+        extra_query: Filtro adicional
+        projection: Projeção (padrão: documento inteiro)
+        limit: Máximo de séries
+
+    Returns:
+        List[dict]: Documentos das séries
+    """
+    return await db.calendar_events.find(
+        {
+            "user_id": user_id,
+            "recurrence": {"$exists": True},
+            "start": {"$lt": window_end.isoformat()},
+            "series_end": {"$gt": window_start.isoformat()},
+            **(extra_query or {})
+        },
+        projection or {"_id": 0}
+    ).to_list(limit)
+
+
+async def list_window_events(
+    user_id: str,
+    window_start: datetime,
+    window_end: datetime,
+    extra_query: Optional[dict] = None,
+    limit: int = 1000
+) -> List[dict]:
+    """
+    Eventos que tocam [window_start, window_end): materializados + ocorrências
+    virtuais das séries, ordenados por início.
+
+    Args:
+        user_id: ID do usuário
+        window_start: Início da janela (timezone-aware)
+        window_end: Fim da janela
+        extra_query: Filtro adicional (ex.: {"event_type": "class"})
+        limit: Máximo de documentos lidos por consulta
+
+    Returns:
+        List[dict]: Eventos
+    """
+    ws, we = window_start.isoformat(), window_end.isoformat()
+    extra_query = extra_query or {}
+
+    items = await db.calendar_events.find(
+        {
+            "user_id": user_id,
+            "recurrence": {"$exists": False},
+            "start": {"$lt": we},
+            "end": {"$gt": ws},
+            **extra_query
+        },
+        {"_id": 0}
+    ).to_list(limit)
+
+    series_docs = await find_window_series(user_id, window_start, window_end, extra_query, limit=limit)
+
+    seen = {ev["id"] for ev in items}
+    for series in series_docs:
+        for occ in expand_series(series, window_start, window_end):
+            if occ["id"] not in seen:
+                items.append(occ)
+
+    items.sort(key=lambda ev: ev["start"])
+    return items
+
+
+def occurrence_write_ops(user_id: str, occ: dict, fields: Optional[dict] = None) -> list:
+    """
+    Operações que materializam uma ocorrência virtual (upsert do documento +
+    exceção na série), opcionalmente já gravando campos nela.
+
+    Args:
+        user_id: ID do usuário
+        occ: Ocorrência virtual (expand_series)
+        fields: Campos a gravar ($set) na ocorrência
+
+    Returns:
+        list: UpdateOne para calendar_events.bulk_write
+    """
+    fields = fields or {}
+    doc = {k: v for k, v in occ.items() if k not in ("id", "user_id") and k not in fields}
+    doc["occurrence_start"] = occ["start"]
+    update = {"$setOnInsert": doc}
+    if fields:
+        update["$set"] = fields
+    return [
+        UpdateOne({"id": occ["id"], "user_id": user_id}, update, upsert=True),
+        UpdateOne(
+            {"id": occ["series_id"], "user_id": user_id},
+            {"$addToSet": {"exdates": occ["start"]}}
+        ),
+    ]
+
+
+async def move_series_exceptions(
+    user_id: str,
+    series: dict,
+    new_start: datetime,
+    new_end: datetime
+) -> list:
+    """
+    Acompanha uma mudança de horário da série: exceções (exdates) e
+    ocorrências materializadas passam para a ocorrência de mesma posição
+    na nova grade. Ocorrências com horário próprio (editadas) mantêm o
+    horário, só mudam de id; as demais seguem a série.
+
+    Args:
+        user_id: ID do usuário
+        series: Série atual (start, end, recurrence, exdates, id)
+        new_start: Novo início da primeira ocorrência
+        new_end: Novo fim da primeira ocorrência
+
+    Returns:
+        list: Novas exdates da série (as que não mapeiam são descartadas)
+    """
+    rule = series["recurrence"]
+    old_start = to_aware(series["start"])
+    duration = new_end - new_start
+
+    def moved(iso: str) -> Optional[datetime]:
+        when = to_aware(iso)
+        k = occurrence_index(old_start, rule, when) if when else None
+        return None if k is None else _nth_start(new_start, rule, k)
+
+    exdates = []
+    for ex in series.get("exdates") or []:
+        target = moved(ex)
+        if target:
+            exdates.append(target.isoformat())
+
+    ops = []
+    async for occ in db.calendar_events.find(
+        {"user_id": user_id, "series_id": series["id"]},
+        {"_id": 1, "occurrence_start": 1, "start": 1}
+    ):
+        if not occ.get("occurrence_start"):
+            continue
+        target = moved(occ["occurrence_start"])
+        if not target:
+            continue
+        fields = {
+            "id": occurrence_id(series["id"], target),
+            "occurrence_start": target.isoformat(),
+        }
+        if occ.get("start") == occ["occurrence_start"]:
+            fields["start"] = target.isoformat()
+            fields["end"] = (target + duration).isoformat()
+        # Por _id: o novo id pode ser o antigo de outra ocorrência
+        ops.append(UpdateOne({"_id": occ["_id"]}, {"$set": fields}))
+    if ops:
+        await db.calendar_events.bulk_write(ops, ordered=False)
+    return exdates
+
+
+async def resolve_event_id(user_id: str, event_id: str) -> Optional[str]:
+    """
+    Garante que o evento exista como documento, materializando a ocorrência
+    virtual se for o caso (a série ganha a exceção correspondente).
+
+    Args:
+        user_id: ID do usuário
+        event_id: Id do evento ou da ocorrência
+
+    Returns:
+        Optional[str]: Id do documento ou None se não existir
+    """
+    if await db.calendar_events.find_one({"id": event_id, "user_id": user_id}, {"_id": 0, "id": 1}):
+        return event_id
+
+    parsed = parse_occurrence_id(event_id)
+    if not parsed:
+        return None
+    series_id, start = parsed
+    series = await db.calendar_events.find_one(
+        {"id": series_id, "user_id": user_id, "recurrence": {"$exists": True}},
+        {"_id": 0}
+    )
+    if not series:
+        return None
+
+    occ = next(
+        (o for o in expand_series(series, start, start + timedelta(microseconds=1))
+         if o["id"] == event_id),
+        None
+    )
+    if not occ:
+        return None
+
+    await db.calendar_events.bulk_write(occurrence_write_ops(user_id, occ), ordered=True)
+    return event_id
+
+
+async def delete_calendar_event(user_id: str, event_id: str, whole_series: bool = False) -> int:
+    """
+    Remove um evento, uma ocorrência (vira exceção da série) ou a série inteira.
+
+    Args:
+        user_id: ID do usuário
+        event_id: Id do evento, da ocorrência ou da série
+        whole_series: Remove a série da ocorrência informada
+
+    Returns:
+        int: Documentos removidos/alterados
+    """
+    parsed = parse_occurrence_id(event_id)
+    doc = await db.calendar_events.find_one(
+        {"id": event_id, "user_id": user_id},
+        {"_id": 0, "id": 1, "recurrence": 1, "series_id": 1}
+    )
+
+    series_id = None
+    if doc and "recurrence" in doc:
+        series_id = doc["id"]
+    elif whole_series:
+        series_id = (doc or {}).get("series_id") or (parsed[0] if parsed else None)
+
+    if series_id:
+        res = await db.calendar_events.delete_many({
+            "user_id": user_id,
+            "$or": [{"id": series_id}, {"series_id": series_id}]
+        })
+        return res.deleted_count
+
+    if doc:
+        res = await db.calendar_events.delete_one({"id": event_id, "user_id": user_id})
+        return res.deleted_count
+
+    if not parsed:
+        return 0
+    res = await db.calendar_events.update_one(
+        {"id": parsed[0], "user_id": user_id, "recurrence": {"$exists": True}},
+        {"$addToSet": {"exdates": parsed[1].isoformat()}}
+    )
+    return res.modified_count
@@ -1,16 +1,34 @@
 """
 Serviço de calendário.
-Contém lógica para autocompletar eventos baseado em sessões de estudo.
+Contém lógica para autocompletar eventos baseado em sessões de estudo
+e o resumo mensal da agenda (com cache dos meses passados).
 """
+from bisect import bisect_left
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 import logging
 
+from pymongo import UpdateOne
+
 from database import db
 from services.reward_service import _week_bounds_utc
+from services.calendar_recurrence import (
+    list_window_events, find_window_series, expand_series, occurrence_write_ops
+)
+from utils.datetime_utils import to_aware
+from utils.lru_cache import LRUCache
 
 logger = logging.getLogger("pomociclo")
 
+# Limite de usuários no cache de resumos mensais
+MONTH_SUMMARY_CACHE_SIZE = 5000
+
+# user_id -> (users.calendar_generation, {(ano, mês): resumo}) (só meses já encerrados)
+month_summary_cache = LRUCache(MONTH_SUMMARY_CACHE_SIZE)
+
+# Margem antes do período buscado para sessões que começaram antes e o cruzam
+SESSION_LOOKBACK = timedelta(hours=12)
+
 
 def _expand_tolerance(
     start: datetime,
@@ -59,93 +77,67 @@ def _overlap_minutes(
     return int((e - s).total_seconds() // 60)
 
 
-async def _subject_week_minutes(
-    user_id: str,
-    subject_id: str,
-    until: Optional[datetime] = None
-) -> int:
-    """
-    Minutos estudados da matéria nesta semana (segunda 00:00) até 'until' (ou agora).
-    
-    Args:
-        user_id: ID do usuário
-        subject_id: ID da matéria
-        until: Data limite (padrão: agora)
-    
-    Returns:
-        int: Total de minutos estudados
-    """
-    now = until or datetime.now(timezone.utc)
-    week_start, week_end = _week_bounds_utc(now)
-    # Limita janela até 'until'
-    hi = min(week_end, now)
-    
-    sessions = await db.study_sessions.find(
-        {"user_id": user_id, "completed": True, "subject_id": subject_id},
-        {"_id": 0, "start_time": 1, "duration": 1}
-    ).to_list(10000)
-    
-    total = 0
-    for s in sessions:
-        try:
-            st = datetime.fromisoformat(s["start_time"])
-            dur = int(s.get("duration", 0))
-            # Sessão considerada no intervalo [week_start, hi)
-            endt = st + timedelta(minutes=dur)
-            total += _overlap_minutes(week_start, hi, st, endt)
-        except Exception:
-            pass
-    
-    return total
+class _SessionIndex:
+    """Sessões concluídas ordenadas por início, para somar sobreposições por janela."""
+    def __init__(self, sessions: list):
+        sessions.sort()
+        self._starts = [st for st, _ in sessions]
+        self._ends = [en for _, en in sessions]
+        self._max_len = max((en - st for st, en in sessions), default=timedelta(0))
+
+    def overlap_minutes(self, window_start: datetime, window_end: datetime) -> int:
+        """
+        Soma dos minutos (inteiros, por sessão) sobrepostos a [window_start, window_end).
+        Só percorre as sessões que começam entre window_start - maior sessão e window_end.
+        """
+        lo = bisect_left(self._starts, window_start - self._max_len)
+        hi = bisect_left(self._starts, window_end)
+        return sum(
+            _overlap_minutes(window_start, window_end, self._starts[i], self._ends[i])
+            for i in range(lo, hi)
+        )
 
 
-async def _effective_minutes_in_window(
+async def _load_session_indexes(
     user_id: str,
-    window_start: datetime,
-    window_end: datetime,
-    subject_id: Optional[str]
-) -> int:
+    since: datetime,
+    until: datetime
+) -> dict:
     """
-    Soma dos minutos 'efetivos' na janela.
-    Pausas contam: ajusta estudo com fator (study+break)/study.
-    Se subject_id for None, considera todas as matérias.
-    
+    Busca (uma única consulta) as sessões concluídas do período e indexa
+    todas juntas (chave None) e por matéria.
+
     Args:
         user_id: ID do usuário
-        window_start: Início da janela
-        window_end: Fim da janela
-        subject_id: ID da matéria (None = todas)
-    
+        since: Início do período consultado
+        until: Fim do período consultado
+
     Returns:
-        int: Minutos efetivos
+        dict: {None | subject_id: _SessionIndex}
     """
-    # Fator de pausa
-    cfg = await db.user_settings.find_one({"user_id": user_id}, {"_id": 0})
-    study_len = int(cfg.get("study_duration", 50)) if cfg else 50
-    break_len = int(cfg.get("break_duration", 10)) if cfg else 10
-    factor = (study_len + break_len) / max(1, study_len)
+    cursor = db.study_sessions.find(
+        {
+            "user_id": user_id,
+            "completed": True,
+            "start_time": {
+                "$gte": (since - SESSION_LOOKBACK).isoformat(),
+                "$lt": until.isoformat()
+            }
+        },
+        {"_id": 0, "start_time": 1, "duration": 1, "subject_id": 1}
+    )
 
-    q = {"user_id": user_id, "completed": True}
-    if subject_id:
-        q["subject_id"] = subject_id
+    grouped = {None: []}
+    async for s in cursor:
+        st = to_aware(s.get("start_time"))
+        if not st:
+            continue
+        endt = st + timedelta(minutes=int(s.get("duration", 0) or 0))
+        grouped[None].append((st, endt))
+        if s.get("subject_id"):
+            grouped.setdefault(s["subject_id"], []).append((st, endt))
 
-    sessions = await db.study_sessions.find(
-        q,
-        {"_id": 0, "start_time": 1, "duration": 1}
-    ).to_list(10000)
-    
-    total = 0
-    for s in sessions:
-        try:
-            st = datetime.fromisoformat(s["start_time"])
-            dur = int(s.get("duration", 0))
-            endt = st + timedelta(minutes=dur)
-            ov = _overlap_minutes(window_start, window_end, st, endt)
-            total += ov
-        except Exception:
-            pass
-    
-    return int(total * factor)
+    return {k: _SessionIndex(v) for k, v in grouped.items()}
 
 
 async def _try_autocomplete_events(
@@ -160,6 +152,10 @@ async def _try_autocomplete_events(
       Regra 1: minutos_efetivos >= 75% da duração do evento; OU
       Regra 2: (se tem subject_id) a meta semanal daquela matéria foi alcançada dentro da janela ±1h.
     
+    Todas as regras usam uma única busca de sessões (da segunda-feira da semana
+    mais antiga envolvida até o fim da última janela), uma busca de matérias e
+    um único bulk_write com os eventos concluídos.
+    
     Args:
         user_id: ID do usuário
         subject_id: ID da matéria (pode ser None)
@@ -167,53 +163,197 @@ async def _try_autocomplete_events(
         session_end: Fim da sessão de estudo
     """
     # Janela "grande" para filtrar eventos candidatos
-    ws, we = _expand_tolerance(session_start, session_end, 60)
+    ws, we = _expand_tolerance(to_aware(session_start), to_aware(session_end), 60)
 
     # Pega eventos que tocam essa janela
-    candidates = await db.calendar_events.find(
-        {
-            "user_id": user_id,
-            "$or": [
-                {"start": {"$lte": we.isoformat()}, "end": {"$gte": ws.isoformat()}},
-                {"start": {"$gte": ws.isoformat(), "$lte": we.isoformat()}},
-            ],
-        },
-        {"_id": 0}
-    ).to_list(1000)
-
-    for ev in candidates:
+    candidates = []
+    for ev in await list_window_events(user_id, ws, we):
         if ev.get("completed"):
             continue
-
-        ev_start = datetime.fromisoformat(ev["start"])
-        ev_end = datetime.fromisoformat(ev["end"])
+        ev_start, ev_end = to_aware(ev["start"]), to_aware(ev["end"])
+        if not ev_start or not ev_end:
+            continue
         # Janela de tolerância do próprio evento
         ev_ws, ev_we = _expand_tolerance(ev_start, ev_end, 60)
+        candidates.append((ev, ev_start, ev_end, ev_ws, ev_we))
+    if not candidates:
+        return
+
+    # Fator de pausa (uma leitura)
+    cfg = await db.user_settings.find_one({"user_id": user_id}, {"_id": 0})
+    study_len = int(cfg.get("study_duration", 50)) if cfg else 50
+    break_len = int(cfg.get("break_duration", 10)) if cfg else 10
+    factor = (study_len + break_len) / max(1, study_len)
+
+    # Metas das matérias envolvidas (uma leitura)
+    subject_ids = list({c[0]["subject_id"] for c in candidates if c[0].get("subject_id")})
+    goals = {}
+    if subject_ids:
+        async for subj in db.subjects.find(
+            {"id": {"$in": subject_ids}, "user_id": user_id},
+            {"_id": 0, "id": 1, "time_goal": 1}
+        ):
+            goals[subj["id"]] = int(subj.get("time_goal", 0) or 0)
+
+    # Sessões do período (uma leitura): cobre as janelas e as semanas da regra 2
+    since = min(_week_bounds_utc(c[3])[0] for c in candidates)
+    until = max(c[4] for c in candidates)
+    indexes = await _load_session_indexes(user_id, since, until)
+    empty = _SessionIndex([])
+
+    ops = []
+    for ev, ev_start, ev_end, ev_ws, ev_we in candidates:
+        ev_subject = ev.get("subject_id")
 
         # Minutos efetivos na janela (respeita subject_id se houver)
-        eff = await _effective_minutes_in_window(
-            user_id, ev_ws, ev_we, ev.get("subject_id")
-        )
+        index = indexes.get(ev_subject or None, empty)
+        eff = int(index.overlap_minutes(ev_ws, ev_we) * factor)
         ev_duration = max(0, int((ev_end - ev_start).total_seconds() // 60))
 
         rule1_ok = (eff >= int(0.75 * ev_duration))
 
         rule2_ok = False
-        if ev.get("subject_id"):
+        goal = goals.get(ev_subject, 0) if ev_subject else 0
+        if goal > 0:
             # Minutos semanais ANTES e DEPOIS, recortando por 'limites' da janela do evento
-            before = await _subject_week_minutes(user_id, ev["subject_id"], until=ev_ws)
-            after = await _subject_week_minutes(user_id, ev["subject_id"], until=ev_we)
-
-            subj = await db.subjects.find_one(
-                {"id": ev["subject_id"], "user_id": user_id},
-                {"_id": 0, "time_goal": 1}
-            )
-            goal = int(subj.get("time_goal", 0)) if subj else 0
+            before = _week_minutes_until(index, ev_ws)
+            after = _week_minutes_until(index, ev_we)
             # Atingiu a meta dentro da janela (antes < goal <= depois)
-            rule2_ok = (goal > 0 and before < goal <= after)
+            rule2_ok = (before < goal <= after)
 
         if rule1_ok or rule2_ok:
-            await db.calendar_events.update_one(
-                {"id": ev["id"], "user_id": user_id},
-                {"$set": {"completed": True}}
-            )
+            if ev.get("series_id") and "occurrence_start" not in ev:
+                # Ocorrência virtual: materializa já concluída
+                ops.extend(occurrence_write_ops(user_id, ev, {"completed": True}))
+            else:
+                ops.append(UpdateOne(
+                    {"id": ev["id"], "user_id": user_id},
+                    {"$set": {"completed": True}}
+                ))
+
+    if ops:
+        await db.calendar_events.bulk_write(ops, ordered=False)
+        await invalidate_month_summaries(user_id)
+
+
+def _week_minutes_until(index: _SessionIndex, until: datetime) -> int:
+    """
+    Minutos estudados na semana de 'until' (segunda 00:00) até 'until'.
+    
+    Args:
+        index: Sessões da matéria
+        until: Data limite
+    
+    Returns:
+        int: Total de minutos estudados
+    """
+    week_start, week_end = _week_bounds_utc(until)
+    return index.overlap_minutes(week_start, min(week_end, until))
+
+
+async def invalidate_month_summaries(user_id: str):
+    """
+    Descarta os resumos mensais em cache de um usuário.
+    Chamado pelas rotas que criam, editam, concluem ou removem eventos.
+    Incrementa users.calendar_generation para que os caches dos outros
+    processos também descartem a entrada na próxima leitura.
+
+    Args:
+        user_id: ID do usuário
+    """
+    month_summary_cache.pop(user_id)
+    await db.users.update_one({"id": user_id}, {"$inc": {"calendar_generation": 1}})
+
+
+async def _compute_month_summary(user_id: str, start: datetime, end: datetime) -> list:
+    """
+    Conta eventos por dia de início no mês: $group no servidor para os
+    eventos materializados + ocorrências virtuais das séries.
+
+    Args:
+        user_id: ID do usuário
+        start: Início do mês (UTC)
+        end: Início do mês seguinte (UTC)
+
+    Returns:
+        list: [{date_iso, count, hasCompleted}] ordenado por dia
+    """
+    ms, me = start.isoformat(), end.isoformat()
+    rows = await db.calendar_events.aggregate([
+        {"$match": {
+            "user_id": user_id,
+            "start": {"$gte": ms, "$lt": me},
+            "recurrence": {"$exists": False}
+        }},
+        {"$project": {"_id": 0, "start": 1, "completed": 1}},
+        {"$group": {
+            "_id": {"$substrBytes": ["$start", 0, 10]},
+            "count": {"$sum": 1},
+            "hasCompleted": {"$max": {"$eq": ["$completed", True]}}
+        }},
+    ]).to_list(None)
+
+    agg = {
+        r["_id"]: {"date_iso": r["_id"], "count": int(r["count"]), "hasCompleted": bool(r["hasCompleted"])}
+        for r in rows
+    }
+
+    series_docs = await find_window_series(
+        user_id, start, end,
+        projection={"_id": 0, "id": 1, "start": 1, "end": 1, "recurrence": 1, "exdates": 1},
+        limit=10000
+    )
+    for series in series_docs:
+        for occ in expand_series(series, start, end):
+            if occ["start"] < ms:
+                continue
+            di = occ["start"][:10]
+            agg.setdefault(di, {"date_iso": di, "count": 0, "hasCompleted": False})["count"] += 1
+
+    return [agg[k] for k in sorted(agg)]
+
+
+async def get_month_summary(user_id: str, year: int, month: int) -> list:
+    """
+    Resumo de eventos do mês por dia.
+    Meses já encerrados ficam em cache enquanto a geração da agenda do
+    usuário (users.calendar_generation) não mudar.
+
+    Args:
+        user_id: ID do usuário
+        year: Ano
+        month: Mês (1-12)
+
+    Returns:
+        list: [{date_iso, count, hasCompleted}]
+    """
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(
+        year + (1 if month == 12 else 0),
+        1 if month == 12 else month + 1,
+        1,
+        tzinfo=timezone.utc
+    )
+    is_past = end <= datetime.now(timezone.utc)
+
+    generation = None
+    months = None
+    if is_past:
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "calendar_generation": 1})
+        generation = int((user or {}).get("calendar_generation", 0))
+        cached = month_summary_cache.get(user_id)
+        if cached is not None:
+            if cached[0] == generation and (year, month) in cached[1]:
+                return cached[1][(year, month)]
+            month_summary_cache.miss()
+            if cached[0] == generation:
+                months = cached[1]
+
+    summary = await _compute_month_summary(user_id, start, end)
+
+    if is_past:
+        months = months if months is not None else {}
+        months[(year, month)] = summary
+        month_summary_cache.set(user_id, (generation, months))
+
+    return summary
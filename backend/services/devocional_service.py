@@ -0,0 +1,168 @@
+"""
+Serviço do devocional.
+O progresso do plano fica em bitmaps fixos de 366 dias (um por item do dia:
+leitura, devocional, oração, e um de dias completos) mais uma tabela
+dia -> data de conclusão. Cada marcação é um único update com pipeline
+(upsert): liga/desliga o bit, ajusta total, sequência e tabela de datas,
+sem ler o documento antes.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+import logging
+
+from database import db
+from utils.bitset import (
+    PIPELINE_WORD_BITS, pipeline_bit, pipeline_set_bit,
+    words_to_int, int_to_words, popcount
+)
+
+logger = logging.getLogger("pomociclo")
+
+# Dias do plano (dia 1 = bit 0)
+DEVOCIONAL_DAYS = 366
+
+# Itens de cada dia; o dia está completo com os três marcados
+DEVOCIONAL_FIELDS = ("read_bible", "did_devotional", "did_prayer")
+
+
+def _prefix(field: str) -> str:
+    return f"bits.{field}."
+
+
+def build_update_pipeline(
+    day: int,
+    marks: dict,
+    now: datetime,
+    plan_id: Optional[str] = None
+) -> list:
+    """
+    Pipeline de update que aplica as marcações de um dia.
+
+    Args:
+        day: Dia do plano (1-366)
+        marks: {campo: bool} com os itens alterados
+        now: Agora (UTC)
+        plan_id: Plano (mantém o atual se None)
+
+    Returns:
+        list: Estágios do update
+    """
+    index = day - 1
+    today_iso = now.date().isoformat()
+    yesterday_iso = (now.date() - timedelta(days=1)).isoformat()
+
+    done_field, done_expr = pipeline_set_bit(_prefix("done"), index, True)
+    _, undone_expr = pipeline_set_bit(_prefix("done"), index, False)
+    changed = {"$subtract": ["$_now_done", "$_was_done"]}
+
+    final = {
+        done_field: {"$cond": [{"$eq": ["$_now_done", 1]}, done_expr, undone_expr]},
+        "total_completed": {"$toInt": {"$add": [{"$ifNull": ["$total_completed", 0]}, changed]}},
+        f"dates.{day}": {"$cond": [
+            {"$eq": ["$_now_done", 1]},
+            {"$ifNull": [f"$dates.{day}", today_iso]},
+            "$$REMOVE"
+        ]},
+        "plan_id": {"$literal": plan_id} if plan_id is not None else {"$ifNull": ["$plan_id", None]},
+        "updated_at": now.isoformat(),
+        "created_at": {"$ifNull": ["$created_at", now.isoformat()]},
+    }
+
+    # Sequência: conta dias (de calendário) com alguma marcação
+    if any(marks.values()):
+        streak = {"$ifNull": ["$streak", 0]}
+        final["streak"] = {"$switch": {
+            "branches": [
+                {"case": {"$eq": ["$last_completed", today_iso]}, "then": streak},
+                {"case": {"$eq": ["$last_completed", yesterday_iso]}, "then": {"$add": [streak, 1]}},
+            ],
+            "default": 1
+        }}
+        final["last_completed"] = today_iso
+
+    return [
+        {"$set": {"_was_done": pipeline_bit(_prefix("done"), index)}},
+        {"$set": dict(pipeline_set_bit(_prefix(field), index, value) for field, value in marks.items())},
+        {"$set": {"_now_done": {"$multiply": [pipeline_bit(_prefix(f), index) for f in DEVOCIONAL_FIELDS]}}},
+        {"$set": final},
+        {"$unset": ["_was_done", "_now_done"]},
+    ]
+
+
+def decode_progress(doc: dict) -> dict:
+    """
+    Progresso por dia a partir dos bitmaps ({dia: {itens..., "date"}}).
+
+    Args:
+        doc: Documento do devocional
+
+    Returns:
+        dict: Dias com alguma marcação
+    """
+    bits = doc.get("bits") or {}
+    values = {
+        field: words_to_int(bits.get(field) or {}, DEVOCIONAL_DAYS, PIPELINE_WORD_BITS)
+        for field in DEVOCIONAL_FIELDS
+    }
+    dates = doc.get("dates") or {}
+
+    marked = 0
+    for value in values.values():
+        marked |= value
+
+    progress = {}
+    while marked:
+        low = marked & -marked
+        index = low.bit_length() - 1
+        marked ^= low
+        day = index + 1
+        entry = {field: bool(values[field] >> index & 1) for field in DEVOCIONAL_FIELDS}
+        if str(day) in dates:
+            entry["date"] = dates[str(day)]
+        progress[str(day)] = entry
+    return progress
+
+
+async def migrate_legacy_progress(user_id: str, doc: dict) -> dict:
+    """
+    Converte o formato antigo (progress = {dia: data}, dia completo) para os
+    bitmaps, uma vez por usuário, somando às marcações já feitas no novo.
+
+    Args:
+        user_id: ID do usuário
+        doc: Documento no formato antigo
+
+    Returns:
+        dict: Documento convertido
+    """
+    done = 0
+    dates = {}
+    for day, completed_on in (doc.get("progress") or {}).items():
+        try:
+            day_num = int(day)
+        except (TypeError, ValueError):
+            continue
+        if 1 <= day_num <= DEVOCIONAL_DAYS:
+            done |= 1 << (day_num - 1)
+            dates[str(day_num)] = completed_on
+
+    # Junta com marcações já gravadas no formato novo
+    current = doc.get("bits") or {}
+    bits = {}
+    for field in (*DEVOCIONAL_FIELDS, "done"):
+        value = words_to_int(current.get(field) or {}, DEVOCIONAL_DAYS, PIPELINE_WORD_BITS) | done
+        bits[field] = int_to_words(value, DEVOCIONAL_DAYS, PIPELINE_WORD_BITS)
+    done = words_to_int(bits["done"], DEVOCIONAL_DAYS, PIPELINE_WORD_BITS)
+    dates.update(doc.get("dates") or {})
+
+    await db.devocional.update_one(
+        {"user_id": user_id, "progress": {"$exists": True}},
+        {
+            "$set": {"bits": bits, "dates": dates, "total_completed": popcount(done)},
+            "$unset": {"progress": ""}
+        }
+    )
+    logger.info(f"devocional: progresso de {user_id} convertido para bitmap ({popcount(done)} dias)")
+    converted = {k: v for k, v in doc.items() if k != "progress"}
+    converted.update({"bits": bits, "dates": dates, "total_completed": popcount(done)})
+    return converted
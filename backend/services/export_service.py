@@ -0,0 +1,315 @@
+"""
+Serviço de exportação de dados do perfil.
+Gera a exportação em streaming (cursores Motor em lotes), sem limite de
+registros e com memória constante: JSON único ou ZIP com um NDJSON por coleção.
+Também executa a exportação como job em background, gravando um arquivo.
+"""
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Optional
+import asyncio
+import json
+import uuid
+import zipfile
+import logging
+
+from database import db
+from config import EXPORT_DIR
+from utils.datetime_utils import to_aware
+
+logger = logging.getLogger("pomociclo")
+
+# Coleções exportadas (uma linha NDJSON por documento)
+EXPORT_COLLECTIONS = ["subjects", "study_sessions", "tasks", "calendar_events"]
+
+# Documentos por lote do cursor
+EXPORT_BATCH_SIZE = 500
+
+# Validade do arquivo gerado por um job
+EXPORT_JOB_TTL_HOURS = 24
+
+# Folga do índice TTL de export_jobs após expires_at: a limpeza periódica
+# apaga o arquivo antes de o MongoDB remover o documento
+EXPORT_JOB_PURGE_GRACE_SECONDS = 6 * 3600
+
+# Jobs em execução neste processo (mantém referência às tasks)
+_running_jobs: dict = {}
+
+
+def _dumps(doc) -> str:
+    """Serializa um documento (datetimes e afins viram string)."""
+    return json.dumps(doc, ensure_ascii=False, default=str)
+
+
+async def _iter_collection(name: str, user_id: str) -> AsyncIterator[list]:
+    """
+    Itera os documentos do usuário numa coleção, em lotes.
+
+    Args:
+        name: Nome da coleção
+        user_id: ID do usuário
+
+    Yields:
+        list: Lote de documentos
+    """
+    cursor = db[name].find({"user_id": user_id}, {"_id": 0}).batch_size(EXPORT_BATCH_SIZE)
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _ZipSink:
+    """Destino não-seekable do ZipFile: acumula bytes até serem drenados."""
+    def __init__(self):
+        self._buf = bytearray()
+
+    def write(self, data) -> int:
+        self._buf += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+async def iter_export_zip(user_id: str) -> AsyncIterator[bytes]:
+    """
+    Gera a exportação como ZIP em streaming.
+    Conteúdo: user.json (usuário + configurações) e <coleção>.ndjson.
+
+    Args:
+        user_id: ID do usuário
+
+    Yields:
+        bytes: Pedaços do arquivo ZIP
+    """
+    sink = _ZipSink()
+    zf = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED)
+
+    user_data = await db.users.find_one({"id": user_id}, {"_id": 0})
+    settings = await db.user_settings.find_one({"user_id": user_id}, {"_id": 0})
+    meta = {"user": user_data, "settings": settings, "exported_at": datetime.now(timezone.utc).isoformat()}
+    zf.writestr("user.json", _dumps(meta))
+    yield sink.drain()
+
+    for name in EXPORT_COLLECTIONS:
+        with zf.open(f"{name}.ndjson", mode="w", force_zip64=True) as entry:
+            async for batch in _iter_collection(name, user_id):
+                entry.write("".join(_dumps(d) + "\n" for d in batch).encode("utf-8"))
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        yield sink.drain()
+
+    zf.close()
+    yield sink.drain()
+
+
+async def iter_export_json(user_id: str) -> AsyncIterator[bytes]:
+    """
+    Gera a exportação como um único objeto JSON em streaming
+    (mesmo formato da exportação antiga, sem limites de registros).
+
+    Args:
+        user_id: ID do usuário
+
+    Yields:
+        bytes: Pedaços do JSON
+    """
+    user_data = await db.users.find_one({"id": user_id}, {"_id": 0})
+    settings = await db.user_settings.find_one({"user_id": user_id}, {"_id": 0})
+
+    yield f'{{"user":{_dumps(user_data)},"settings":{_dumps(settings)}'.encode("utf-8")
+    for name in EXPORT_COLLECTIONS:
+        yield f',"{name}":['.encode("utf-8")
+        first = True
+        async for batch in _iter_collection(name, user_id):
+            body = ",".join(_dumps(d) for d in batch)
+            yield (body if first else "," + body).encode("utf-8")
+            first = False
+        yield b"]"
+    yield f',"exported_at":"{datetime.now(timezone.utc).isoformat()}"}}'.encode("utf-8")
+
+
+def export_filename(fmt: str) -> str:
+    """Nome do arquivo de download para o formato."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    return f"pomociclo_export_{stamp}.{fmt}"
+
+
+# ================== JOBS EM BACKGROUND ==================
+
+def _job_path(job_id: str) -> Path:
+    """Caminho do arquivo de um job."""
+    return Path(EXPORT_DIR) / f"{job_id}.zip"
+
+
+async def _run_export_job(job_id: str, user_id: str):
+    """
+    Executa a exportação ZIP gravando no disco e atualiza o status do job.
+
+    Args:
+        job_id: ID do job
+        user_id: ID do usuário
+    """
+    path = _job_path(job_id)
+    try:
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        size = 0
+        f = await asyncio.to_thread(open, path, "wb")
+        try:
+            async for chunk in iter_export_zip(user_id):
+                await asyncio.to_thread(f.write, chunk)
+                size += len(chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+        await db.export_jobs.update_one(
+            {"id": job_id},
+            {"$set": {
+                "status": "done",
+                "size_bytes": size,
+                "finished_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+    except Exception as e:
+        logger.error(f"export job {job_id} failed: {e}")
+        await asyncio.to_thread(path.unlink, missing_ok=True)
+        await db.export_jobs.update_one(
+            {"id": job_id},
+            {"$set": {"status": "failed", "error": str(e)}}
+        )
+    finally:
+        _running_jobs.pop(job_id, None)
+
+
+async def start_export_job(user_id: str) -> dict:
+    """
+    Cria um job de exportação e inicia a geração em background.
+
+    Args:
+        user_id: ID do usuário
+
+    Returns:
+        dict: Documento do job
+    """
+    now = datetime.now(timezone.utc)
+    job = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "status": "running",
+        "format": "zip",
+        "created_at": now.isoformat(),
+        # Date (não string) para o índice TTL
+        "expires_at": now + timedelta(hours=EXPORT_JOB_TTL_HOURS),
+    }
+    await db.export_jobs.insert_one(dict(job))
+    _running_jobs[job["id"]] = asyncio.create_task(_run_export_job(job["id"], user_id))
+    return {**job, "expires_at": job["expires_at"].isoformat()}
+
+
+async def get_export_job(user_id: str, job_id: str) -> Optional[dict]:
+    """
+    Busca um job de exportação do usuário.
+
+    Args:
+        user_id: ID do usuário
+        job_id: ID do job
+
+    Returns:
+        Optional[dict]: Job ou None
+    """
+    job = await db.export_jobs.find_one({"id": job_id, "user_id": user_id}, {"_id": 0})
+    if job and job.get("expires_at"):
+        job["expires_at"] = to_aware(job["expires_at"]).isoformat()
+    return job
+
+
+def export_job_file(job: dict) -> Optional[Path]:
+    """
+    Arquivo gerado por um job, se ainda válido.
+
+    Args:
+        job: Documento do job
+
+    Returns:
+        Optional[Path]: Caminho do arquivo ou None se indisponível/expirado
+    """
+    if job.get("status") != "done":
+        return None
+    expires_at = to_aware(job.get("expires_at"))
+    if not expires_at or expires_at < datetime.now(timezone.utc):
+        return None
+    path = _job_path(job["id"])
+    return path if path.exists() else None
+
+
+async def ensure_export_indexes():
+    """
+    Cria os índices de export_jobs (TTL em expires_at).
+    Chamado no startup do servidor.
+    """
+    await db.export_jobs.create_index([("id", 1), ("user_id", 1)])
+    await db.export_jobs.create_index(
+        "expires_at", expireAfterSeconds=EXPORT_JOB_PURGE_GRACE_SECONDS
+    )
+
+
+def _remove_stale_files(names: set, older_than: float) -> int:
+    """
+    Remove da pasta de exportação os arquivos de jobs expirados e os órfãos
+    (sem job, mais antigos que a validade).
+
+    Args:
+        names: Nomes de arquivo dos jobs expirados
+        older_than: Timestamp (mtime) limite para órfãos
+
+    Returns:
+        int: Arquivos removidos
+    """
+    folder = Path(EXPORT_DIR)
+    if not folder.is_dir():
+        return 0
+    removed = 0
+    for path in folder.glob("*.zip"):
+        try:
+            if path.name in names or path.stat().st_mtime < older_than:
+                path.unlink(missing_ok=True)
+                removed += 1
+        except OSError as e:
+            logger.warning(f"export cleanup: could not remove {path}: {e}")
+    return removed
+
+
+async def cleanup_export_jobs() -> dict:
+    """
+    Job periódico: apaga arquivos e documentos de jobs de exportação expirados.
+
+    Returns:
+        dict: {"jobs": int, "files": int}
+    """
+    now = datetime.now(timezone.utc)
+    expired = await db.export_jobs.find(
+        # Jobs antigos guardavam expires_at como string ISO
+        {"$or": [{"expires_at": {"$lt": now}}, {"expires_at": {"$lt": now.isoformat()}}]},
+        {"_id": 0, "id": 1}
+    ).to_list(None)
+    names = {f"{job['id']}.zip" for job in expired if job["id"] not in _running_jobs}
+
+    older_than = (now - timedelta(hours=EXPORT_JOB_TTL_HOURS)).timestamp()
+    files = await asyncio.to_thread(_remove_stale_files, names, older_than)
+
+    res = await db.export_jobs.delete_many({
+        "id": {"$in": [name[:-len(".zip")] for name in names]}
+    }) if names else None
+    summary = {"jobs": res.deleted_count if res else 0, "files": files}
+    logger.info(f"export cleanup: {summary}")
+    return summary
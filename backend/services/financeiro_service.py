@@ -0,0 +1,202 @@
+"""
+Serviço do financeiro.
+Os valores ficam em um documento por (usuário, mês) em financeiro_months,
+consultado por ano pelo índice (user_id, year, month). Totais por mês e por
+categoria saem de um aggregate no servidor. O documento único antigo
+(financeiro.data."ano-mês".categoria.item) é migrado em lote no startup;
+até o lote terminar, cada leitura migra o próprio usuário.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+import logging
+
+from pymongo import UpdateOne
+
+from database import db
+
+logger = logging.getLogger("pomociclo")
+
+# Meses como o front usa (0 = janeiro)
+MONTHS = range(12)
+
+# Vira True quando a coleção antiga está vazia: leituras deixam de consultá-la
+_legacy_done = False
+
+
+def month_key(year: int, month: int) -> str:
+    """Chave "ano-mês" do formato antigo (mês 0-11), usada nas respostas."""
+    return f"{year}-{month}"
+
+
+def _parse_key(key: str) -> Optional[tuple[int, int]]:
+    """Interpreta "ano-mês" do formato antigo."""
+    try:
+        year, month = (int(x) for x in str(key).split("-"))
+    except (TypeError, ValueError):
+        return None
+    return (year, month) if month in MONTHS else None
+
+
+async def migrate_legacy(user_id: str) -> int:
+    """
+    Move o documento único antigo para documentos mensais.
+    Valores já gravados no formato novo têm precedência.
+
+    Args:
+        user_id: ID do usuário
+
+    Returns:
+        int: Meses migrados (0 se não havia documento antigo)
+    """
+    legacy = await db.financeiro.find_one({"user_id": user_id}, {"_id": 0, "data": 1})
+    if not legacy:
+        return 0
+
+    now = datetime.now(timezone.utc).isoformat()
+    ops = []
+    for key, categories in (legacy.get("data") or {}).items():
+        parsed = _parse_key(key)
+        if not parsed or not isinstance(categories, dict):
+            continue
+        year, month = parsed
+        merged = {
+            f"categories.{category}": {"$mergeObjects": [{"$literal": items}, f"$categories.{category}"]}
+            for category, items in categories.items()
+            if isinstance(items, dict) and "." not in category and not category.startswith("$")
+        }
+        ops.append(UpdateOne(
+            {"user_id": user_id, "year": year, "month": month},
+            [{"$set": {**merged, "updated_at": {"$ifNull": ["$updated_at", now]}}}],
+            upsert=True
+        ))
+    if ops:
+        await db.financeiro_months.bulk_write(ops, ordered=False)
+    await db.financeiro.delete_one({"user_id": user_id})
+    logger.info(f"financeiro: {len(ops)} meses de {user_id} migrados para financeiro_months")
+    return len(ops)
+
+
+async def migrate_all_legacy() -> int:
+    """
+    Migração de startup: converte os documentos antigos de todos os usuários
+    e libera as leituras da consulta à coleção antiga.
+
+    Returns:
+        int: Usuários migrados
+    """
+    global _legacy_done
+    users = 0
+    try:
+        for user_id in await db.financeiro.distinct("user_id"):
+            await migrate_legacy(user_id)
+            users += 1
+        if await db.financeiro.count_documents({}, limit=1) == 0:
+            _legacy_done = True
+        logger.info(f"financeiro: migração de startup concluída ({users} usuários)")
+    except Exception as e:
+        logger.error(f"financeiro: migração de startup falhou: {e}")
+    return users
+
+
+async def _ensure_migrated(user_id: str) -> None:
+    """Migra o usuário na leitura só enquanto a migração de startup não terminou."""
+    if not _legacy_done:
+        await migrate_legacy(user_id)
+
+
+def _range_filter(user_id: str, year: Optional[int], month_from: int, month_to: int) -> dict:
+    query = {"user_id": user_id}
+    if year is not None:
+        query["year"] = year
+        if month_from > 0 or month_to < 11:
+            query["month"] = {"$gte": month_from, "$lte": month_to}
+    return query
+
+
+async def get_months(
+    user_id: str,
+    year: Optional[int] = None,
+    month_from: int = 0,
+    month_to: int = 11
+) -> dict:
+    """
+    Valores dos meses pedidos, no formato {"ano-mês": {categoria: {item: valor}}}.
+
+    Args:
+        user_id: ID do usuário
+        year: Ano (None = todos)
+        month_from: Primeiro mês (0-11)
+        month_to: Último mês (0-11)
+
+    Returns:
+        dict: Árvore de valores por mês
+    """
+    await _ensure_migrated(user_id)
+    data = {}
+    async for doc in db.financeiro_months.find(
+        _range_filter(user_id, year, month_from, month_to),
+        {"_id": 0, "year": 1, "month": 1, "categories": 1}
+    ).sort([("year", 1), ("month", 1)]):
+        data[month_key(doc["year"], doc["month"])] = doc.get("categories") or {}
+    return data
+
+
+async def save_value(user_id: str, year: int, month: int, category: str, item: str, value: float) -> None:
+    """
+    Grava um valor no documento do mês (upsert de um campo).
+
+    Args:
+        user_id: ID do usuário
+        year: Ano
+        month: Mês (0-11)
+        category: Categoria
+        item: Item da categoria
+        value: Valor
+    """
+    await db.financeiro_months.update_one(
+        {"user_id": user_id, "year": year, "month": month},
+        {"$set": {
+            f"categories.{category}.{item}": value,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+
+
+async def year_summary(user_id: str, year: int) -> dict:
+    """
+    Totais do ano calculados no servidor: por mês e categoria e por
+    categoria no ano.
+
+    Args:
+        user_id: ID do usuário
+        year: Ano
+
+    Returns:
+        dict: {"year", "months": {mês: {categoria: total}}, "categories": {categoria: total}}
+    """
+    await _ensure_migrated(user_id)
+    rows = await db.financeiro_months.aggregate([
+        {"$match": {"user_id": user_id, "year": year}},
+        {"$project": {"_id": 0, "month": 1, "cats": {"$objectToArray": {"$ifNull": ["$categories", {}]}}}},
+        {"$unwind": "$cats"},
+        {"$project": {"month": 1, "category": "$cats.k", "items": {"$objectToArray": "$cats.v"}}},
+        {"$unwind": "$items"},
+        # $sum ignora valores não numéricos
+        {"$group": {"_id": {"month": "$month", "category": "$category"}, "total": {"$sum": "$items.v"}}},
+    ]).to_list(None)
+
+    months = {}
+    categories = {}
+    for row in rows:
+        month = str(row["_id"]["month"])
+        category = row["_id"]["category"]
+        total = row["total"]
+        months.setdefault(month, {})[category] = total
+        categories[category] = categories.get(category, 0) + total
+
+    return {
+        "year": year,
+        "months": months,
+        "categories": categories
+    }
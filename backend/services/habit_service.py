@@ -0,0 +1,241 @@
+"""
+Serviço de hábitos.
+Mantém no próprio hábito a sequência atual, a melhor sequência e a data da
+última conclusão (atualizadas atomicamente ao marcar/desmarcar) e, por ano,
+um bitset de 366 dias (46 bytes) em habit_years para histórico e heatmap
+sem varrer habit_completions.
+"""
+from datetime import date, timedelta
+import logging
+
+from pymongo import UpdateOne, ReturnDocument
+
+from database import db
+from utils.bitset import (
+    set_bit_op, words_to_int, int_to_words, to_bytes,
+    popcount, longest_run, run_ending_at
+)
+
+logger = logging.getLogger("pomociclo")
+
+# Bits por ano (dia 0 = 1º de janeiro) -> 46 bytes
+HABIT_YEAR_BITS = 366
+
+
+def day_index(d: date) -> int:
+    """Posição do dia no bitset do ano."""
+    return d.timetuple().tm_yday - 1
+
+
+def _year_filter(user_id: str, habit_id: str, year: int) -> dict:
+    return {"user_id": user_id, "habit_id": habit_id, "year": year}
+
+
+async def set_completion_bit(user_id: str, habit_id: str, d: date, done: bool) -> None:
+    """
+    Liga/desliga o dia no bitset do ano (upsert + $bit, sem leitura).
+
+    Args:
+        user_id: ID do usuário
+        habit_id: ID do hábito
+        d: Dia
+        done: True se concluído
+    """
+    await db.habit_years.update_one(
+        _year_filter(user_id, habit_id, d.year),
+        {"$bit": set_bit_op(day_index(d), done)},
+        upsert=True
+    )
+
+
+async def get_year_bits(user_id: str, habit_id: str, year: int) -> int:
+    """
+    Bitset de conclusões do hábito no ano (0 se não houver registro).
+
+    Returns:
+        int: Bit i = dia i do ano
+    """
+    doc = await db.habit_years.find_one(_year_filter(user_id, habit_id, year), {"_id": 0})
+    return words_to_int(doc, HABIT_YEAR_BITS) if doc else 0
+
+
+def join_years(years: list) -> tuple[date, int]:
+    """
+    Junta bitsets anuais (ordenados por ano) numa única linha do tempo.
+
+    Args:
+        years: [(ano, bitset), ...] em ordem crescente
+
+    Returns:
+        tuple[date, int]: (dia do bit 0, bitset contínuo)
+    """
+    origin = date(years[0][0], 1, 1)
+    timeline = 0
+    for year, bits in years:
+        timeline |= bits << (date(year, 1, 1) - origin).days
+    return origin, timeline
+
+
+async def longest_streak_from_bits(user_id: str, habit_id: str) -> int:
+    """
+    Maior sequência do hábito em todo o histórico (atravessando anos).
+
+    Returns:
+        int: Maior sequência em dias
+    """
+    years = [
+        (doc["year"], words_to_int(doc, HABIT_YEAR_BITS))
+        async for doc in db.habit_years.find(
+            {"user_id": user_id, "habit_id": habit_id}, {"_id": 0}
+        ).sort("year", 1)
+    ]
+    if not years:
+        return 0
+    return longest_run(join_years(years)[1])
+
+
+async def mark_completed(user_id: str, habit_id: str, today: date) -> int:
+    """
+    Registra a conclusão de hoje: bitset do ano e sequências do hábito
+    (um update com pipeline, sem leitura prévia).
+
+    Args:
+        user_id: ID do usuário
+        habit_id: ID do hábito
+        today: Hoje (UTC)
+
+    Returns:
+        int: Sequência atual
+    """
+    await set_completion_bit(user_id, habit_id, today, True)
+
+    today_iso = today.isoformat()
+    yesterday_iso = (today - timedelta(days=1)).isoformat()
+    current = {"$ifNull": ["$current_streak", 0]}
+    habit = await db.habits.find_one_and_update(
+        {"id": habit_id, "user_id": user_id},
+        [
+            {"$set": {
+                "current_streak": {"$switch": {
+                    "branches": [
+                        {"case": {"$eq": ["$last_completed_date", today_iso]}, "then": current},
+                        {"case": {"$eq": ["$last_completed_date", yesterday_iso]},
+                         "then": {"$add": [current, 1]}},
+                    ],
+                    "default": 1
+                }},
+                "last_completed_date": today_iso
+            }},
+            {"$set": {"longest_streak": {"$max": [{"$ifNull": ["$longest_streak", 0]}, "$current_streak"]}}},
+        ],
+        projection={"_id": 0, "current_streak": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return habit["current_streak"] if habit else 0
+
+
+async def unmark_completed(user_id: str, habit_id: str, today: date) -> None:
+    """
+    Desfaz a conclusão de hoje: apaga o bit e volta a sequência um dia.
+    A melhor sequência só é recalculada (pelos bitsets) quando podia ser a
+    de hoje.
+
+    Args:
+        user_id: ID do usuário
+        habit_id: ID do hábito
+        today: Hoje (UTC)
+    """
+    await set_completion_bit(user_id, habit_id, today, False)
+
+    yesterday_iso = (today - timedelta(days=1)).isoformat()
+    before = await db.habits.find_one_and_update(
+        {"id": habit_id, "user_id": user_id, "last_completed_date": today.isoformat()},
+        [{"$set": {
+            "current_streak": {"$max": [{"$subtract": [{"$ifNull": ["$current_streak", 0]}, 1]}, 0]},
+            "last_completed_date": {"$cond": [{"$gt": ["$current_streak", 1]}, yesterday_iso, None]}
+        }}],
+        projection={"_id": 0, "current_streak": 1, "longest_streak": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before and before.get("longest_streak", 0) == before.get("current_streak", 0):
+        await db.habits.update_one(
+            {"id": habit_id, "user_id": user_id},
+            {"$set": {"longest_streak": await longest_streak_from_bits(user_id, habit_id)}}
+        )
+
+
+def year_summary(bits: int, year: int) -> dict:
+    """
+    Resumo do ano a partir do bitset (heatmap e totais).
+
+    Args:
+        bits: Bitset do ano
+        year: Ano
+
+    Returns:
+        dict: {"year", "bits" (hex, 46 bytes), "completed_days", "longest_streak"}
+    """
+    return {
+        "year": year,
+        "bits": to_bytes(bits, HABIT_YEAR_BITS).hex(),
+        "completed_days": popcount(bits),
+        "longest_streak": longest_run(bits)
+    }
+
+
+async def migrate_habit_bitsets() -> dict:
+    """
+    Migração: monta os bitsets anuais e as sequências de cada hábito a partir
+    de habit_completions. Idempotente (regrava os anos inteiros).
+
+    Returns:
+        dict: {"years": int, "habits": int}
+    """
+    # Dias concluídos por (usuário, hábito, ano)
+    years = {}
+    async for comp in db.habit_completions.find(
+        {}, {"_id": 0, "user_id": 1, "habit_id": 1, "date": 1}
+    ):
+        try:
+            d = date.fromisoformat(comp["date"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        key = (comp["user_id"], comp["habit_id"], d.year)
+        years[key] = years.get(key, 0) | (1 << day_index(d))
+
+    year_ops = [
+        UpdateOne(
+            _year_filter(user_id, habit_id, year),
+            {"$set": int_to_words(bits, HABIT_YEAR_BITS)},
+            upsert=True
+        )
+        for (user_id, habit_id, year), bits in years.items()
+    ]
+    if year_ops:
+        await db.habit_years.bulk_write(year_ops, ordered=False)
+
+    # Sequências por hábito (anos em ordem)
+    per_habit = {}
+    for (user_id, habit_id, year), bits in sorted(years.items()):
+        per_habit.setdefault((user_id, habit_id), []).append((year, bits))
+
+    habit_ops = []
+    for (user_id, habit_id), habit_years in per_habit.items():
+        origin, timeline = join_years(habit_years)
+        last_index = timeline.bit_length() - 1
+        last_date = origin + timedelta(days=last_index)
+        current = run_ending_at(timeline, last_index)
+        habit_ops.append(UpdateOne(
+            {"id": habit_id, "user_id": user_id},
+            {"$set": {
+                "current_streak": current,
+                "longest_streak": longest_run(timeline),
+                "last_completed_date": last_date.isoformat()
+            }}
+        ))
+    if habit_ops:
+        await db.habits.bulk_write(habit_ops, ordered=False)
+
+    summary = {"years": len(year_ops), "habits": len(habit_ops)}
+    logger.info(f"habit bitset migration: {summary}")
+    return summary
@@ -0,0 +1,179 @@
+"""
+Serviço do heatmap de consistência.
+Mantém um rollup de minutos estudados por usuário e dia (study_daily) e
+um cache em memória do heatmap anual por (usuário, ano).
+"""
+from datetime import date, datetime, timezone
+from typing import Optional
+import time
+import logging
+
+from pymongo import UpdateOne, ReturnDocument
+
+from database import db
+from utils.lru_cache import LRUCache
+
+logger = logging.getLogger("pomociclo")
+
+# Flag no usuário indicando que o rollup já foi preenchido a partir das sessões
+ROLLUP_FLAG = "daily_rollup_ready"
+
+# Início do backfill no usuário: sessões finalizadas antes entram pelo
+# aggregate, as finalizadas depois pelo $inc de record_study_minutes
+ROLLUP_SINCE = "daily_rollup_since"
+
+# Limite de entradas do cache (LRU)
+HEATMAP_CACHE_SIZE = 4096
+
+# Ano corrente expira mesmo sem invalidação (outros workers podem ter gravado)
+CURRENT_YEAR_TTL_SECONDS = 300
+
+# (user_id, year) -> (payload, expira_em | None para anos passados)
+heatmap_cache = LRUCache(HEATMAP_CACHE_SIZE)
+
+
+def invalidate_heatmap(user_id: str, year: Optional[int] = None):
+    """
+    Remove do cache o heatmap de um usuário.
+
+    Args:
+        user_id: ID do usuário
+        year: Ano (padrão: ano corrente)
+    """
+    heatmap_cache.pop((user_id, year or datetime.now(timezone.utc).year))
+
+
+async def record_study_minutes(user_id: str, start_iso: str, end_iso: str, minutes: int):
+    """
+    Soma minutos de uma sessão concluída no rollup diário.
+    Chamado em /study/end.
+
+    Sem o rollup pronto, só sessões finalizadas depois do início do backfill
+    são somadas, no campo "pending" (que o backfill não sobrescreve); as
+    anteriores ficam para o aggregate do backfill.
+
+    Args:
+        user_id: ID do usuário
+        start_iso: Início da sessão (ISO, UTC)
+        end_iso: Fim da sessão (ISO, UTC), como gravado em end_time
+        minutes: Minutos contados da sessão
+    """
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, ROLLUP_FLAG: 1, ROLLUP_SINCE: 1}) or {}
+    since = user.get(ROLLUP_SINCE)
+    if since and end_iso < since:
+        return
+    if user.get(ROLLUP_FLAG):
+        field = "minutes"
+    elif since:
+        field = "pending"
+    else:
+        return
+
+    day = start_iso[:10]
+    await db.study_daily.update_one(
+        {"user_id": user_id, "date": day},
+        {"$inc": {field: int(minutes)}},
+        upsert=True
+    )
+    invalidate_heatmap(user_id, int(day[:4]))
+
+
+async def _ensure_rollup(user_id: str):
+    """
+    Preenche study_daily a partir das sessões na primeira consulta do usuário.
+    Marca antes o início do backfill (ROLLUP_SINCE) e só agrega as sessões
+    finalizadas antes dele; as demais chegam por record_study_minutes.
+
+    Args:
+        user_id: ID do usuário
+    """
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, ROLLUP_FLAG: 1, ROLLUP_SINCE: 1})
+    if user is None or user.get(ROLLUP_FLAG):
+        return
+
+    since = user.get(ROLLUP_SINCE)
+    if not since:
+        # Outro request pode marcar ao mesmo tempo: vale o valor gravado
+        user = await db.users.find_one_and_update(
+            {"id": user_id, ROLLUP_SINCE: {"$exists": False}},
+            {"$set": {ROLLUP_SINCE: datetime.now(timezone.utc).isoformat()}},
+            projection={"_id": 0, ROLLUP_SINCE: 1},
+            return_document=ReturnDocument.AFTER
+        ) or await db.users.find_one({"id": user_id}, {"_id": 0, ROLLUP_SINCE: 1})
+        since = user[ROLLUP_SINCE]
+
+    rows = await db.study_sessions.aggregate([
+        {"$match": {"user_id": user_id, "completed": True, "end_time": {"$not": {"$gte": since}}}},
+        {"$group": {
+            "_id": {"$substrBytes": ["$start_time", 0, 10]},
+            "minutes": {"$sum": {"$toInt": {"$ifNull": ["$duration", 0]}}}
+        }},
+    ]).to_list(None)
+
+    # $set só em "minutes": o que chegou depois de 'since' está em "pending"
+    ops = [
+        UpdateOne(
+            {"user_id": user_id, "date": r["_id"]},
+            {"$set": {"minutes": int(r["minutes"])}},
+            upsert=True
+        )
+        for r in rows if r["_id"]
+    ]
+    if ops:
+        await db.study_daily.bulk_write(ops, ordered=False)
+
+    await db.users.update_one({"id": user_id}, {"$set": {ROLLUP_FLAG: True}})
+
+
+async def get_year_heatmap(user_id: str, year: int) -> dict:
+    """
+    Retorna o heatmap anual em formato compacto.
+    minutes[i] = minutos estudados no dia (1º de janeiro + i).
+    Anos passados ficam no cache sem expiração (são imutáveis).
+
+    Args:
+        user_id: ID do usuário
+        year: Ano
+
+    Returns:
+        dict: {"year", "start", "minutes": List[int], "total_days_active"}
+    """
+    key = (user_id, year)
+    hit = heatmap_cache.get(key)
+    if hit:
+        if hit[1] is None or hit[1] > time.monotonic():
+            return hit[0]
+        heatmap_cache.miss()
+
+    await _ensure_rollup(user_id)
+
+    start = date(year, 1, 1)
+    n_days = (date(year + 1, 1, 1) - start).days
+    minutes = [0] * n_days
+
+    async for doc in db.study_daily.find(
+        {"user_id": user_id, "date": {"$gte": f"{year}-01-01", "$lte": f"{year}-12-31"}},
+        {"_id": 0, "date": 1, "minutes": 1, "pending": 1}
+    ):
+        try:
+            idx = (date.fromisoformat(doc["date"]) - start).days
+            minutes[idx] = int(doc.get("minutes", 0)) + int(doc.get("pending", 0))
+        except Exception:
+            pass
+
+    payload = {
+        "year": year,
+        "start": start.isoformat(),
+        "minutes": minutes,
+        "total_days_active": sum(1 for m in minutes if m > 0)
+    }
+
+    current_year = datetime.now(timezone.utc).year
+    if year < current_year:
+        expires = None
+    else:
+        expires = time.monotonic() + CURRENT_YEAR_TTL_SECONDS
+
+    heatmap_cache.set(key, (payload, expires))
+
+    return payload
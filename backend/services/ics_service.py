@@ -0,0 +1,599 @@
+"""
+Serviço de exportação/importação da agenda em iCalendar (.ics, RFC 5545).
+Exporta calendar_events em streaming (séries viram RRULE + EXDATE) e importa
+arquivos .ics em lote: deduplica por UID e grava com insert_many em blocos.
+"""
+from datetime import datetime, timezone, timedelta, date
+from typing import AsyncIterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import re
+import logging
+
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+from database import db
+from models.calendar import CalendarEvent
+from services.calendar_recurrence import build_rule, series_end, find_window_series
+from utils.datetime_utils import to_aware
+
+logger = logging.getLogger("pomociclo")
+
+# Limites da importação
+MAX_IMPORT_BYTES = 2 * 1024 * 1024
+MAX_IMPORT_EVENTS = 5000
+
+# Documentos por insert_many
+IMPORT_CHUNK_SIZE = 500
+
+# Eventos lidos por lote na exportação
+EXPORT_BATCH_SIZE = 500
+
+_PRODID = "-//Pomociclo//Agenda//PT-BR"
+
+_WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+_FREQ_TO_TYPE = {"DAILY": "daily", "WEEKLY": "weekly", "MONTHLY": "monthly", "YEARLY": "yearly"}
+
+
+# ================== EXPORTAÇÃO ==================
+
+def _escape(text: str) -> str:
+    """Escapa texto conforme RFC 5545 (barra, ponto e vírgula, vírgula, quebras)."""
+    return (
+        str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Quebra a linha em pedaços de até 75 octetos (continuação começa com espaço)."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts, chunk, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > (75 if not parts else 74):
+            parts.append(chunk)
+            chunk, size = "", 0
+        chunk += ch
+        size += n
+    parts.append(chunk)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _fmt_utc(value) -> str:
+    """Data/hora ISO (ou datetime) no formato UTC do iCalendar (YYYYMMDDTHHMMSSZ)."""
+    return to_aware(value).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _rrule(rule: dict) -> str:
+    """Converte a regra de recorrência da série para RRULE."""
+    if rule["type"] == "every_x_days":
+        parts = ["FREQ=DAILY", f"INTERVAL={rule.get('interval') or 1}"]
+    else:
+        parts = [f"FREQ={rule['type'].upper()}"]
+    if rule.get("count"):
+        parts.append(f"COUNT={rule['count']}")
+    elif rule.get("until"):
+        parts.append(f"UNTIL={_fmt_utc(rule['until'])}")
+    return ";".join(parts)
+
+
+def _vevent(ev: dict, stamp: str) -> str:
+    """
+    Monta o bloco VEVENT de um evento ou série.
+
+    Args:
+        ev: Documento de calendar_events
+        stamp: DTSTAMP (UTC)
+
+    Returns:
+        str: Linhas do VEVENT (já dobradas, com CRLF)
+    """
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{ev.get('ics_uid') or ev['id'] + '@pomociclo'}",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{_fmt_utc(ev['start'])}",
+        f"DTEND:{_fmt_utc(ev['end'])}",
+        f"SUMMARY:{_escape(ev.get('title', ''))}",
+    ]
+    if ev.get("description"):
+        lines.append(f"DESCRIPTION:{_escape(ev['description'])}")
+    if ev.get("event_type"):
+        lines.append(f"X-POMOCICLO-TYPE:{_escape(ev['event_type'])}")
+    if ev.get("completed"):
+        lines.append("STATUS:COMPLETED")
+    if ev.get("recurrence"):
+        lines.append(f"RRULE:{_rrule(ev['recurrence'])}")
+        for ex in ev.get("exdates") or []:
+            lines.append(f"EXDATE:{_fmt_utc(ex)}")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+async def iter_calendar_ics(
+    user_id: str,
+    start: datetime,
+    end: datetime
+) -> AsyncIterator[bytes]:
+    """
+    Gera o .ics da agenda em streaming: eventos que tocam [start, end) e
+    séries com ocorrências no período (exportadas com RRULE/EXDATE).
+
+    Args:
+        user_id: ID do usuário
+        start: Início do período (UTC)
+        end: Fim do período (UTC)
+
+    Yields:
+        bytes: Pedaços do arquivo
+    """
+    stamp = _fmt_utc(datetime.now(timezone.utc))
+    yield "".join(_fold(line) for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{_PRODID}",
+        "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:Pomociclo",
+    ]).encode("utf-8")
+
+    cursor = db.calendar_events.find(
+        {
+            "user_id": user_id,
+            "recurrence": {"$exists": False},
+            "start": {"$lt": end.isoformat()},
+            "end": {"$gt": start.isoformat()}
+        },
+        {"_id": 0}
+    ).sort("start", 1).batch_size(EXPORT_BATCH_SIZE)
+
+    buf = []
+    async for ev in cursor:
+        try:
+            buf.append(_vevent(ev, stamp))
+        except Exception as e:
+            logger.warning(f"ics export: evento {ev.get('id')} ignorado: {e}")
+        if len(buf) >= EXPORT_BATCH_SIZE:
+            yield "".join(buf).encode("utf-8")
+            buf = []
+
+    for series in await find_window_series(user_id, start, end, limit=10000):
+        try:
+            buf.append(_vevent(series, stamp))
+        except Exception as e:
+            logger.warning(f"ics export: série {series.get('id')} ignorada: {e}")
+
+    buf.append(_fold("END:VCALENDAR"))
+    yield "".join(buf).encode("utf-8")
+
+
+# ================== IMPORTAÇÃO ==================
+
+def _unescape(text: str) -> str:
+    """Desfaz o escape de texto do iCalendar."""
+    return re.sub(
+        r"\\([\\;,nN])",
+        lambda m: "\n" if m.group(1) in "nN" else m.group(1),
+        text
+    )
+
+
+def _unfold(text: str) -> List[str]:
+    """Junta as linhas de continuação (iniciadas por espaço ou tab)."""
+    lines: List[str] = []
+    for raw in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        if raw[:1] in (" ", "\t") and lines:
+            lines[-1] += raw[1:]
+        elif raw:
+            lines.append(raw)
+    return lines
+
+
+def _split_property(line: str) -> Tuple[str, dict, str]:
+    """
+    Separa "NOME;PARAM=X:valor" em (NOME, {PARAM: X}, valor).
+    Respeita ":" e ";" dentro de parâmetros entre aspas.
+    """
+    in_quotes = False
+    for i, ch in enumerate(line):
+        if ch == '"':
+            in_quotes = not in_quotes
+        elif ch == ":" and not in_quotes:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        return line.upper(), {}, ""
+
+    name, *raw_params = head.split(";")
+    params = {}
+    for p in raw_params:
+        key, _, val = p.partition("=")
+        params[key.upper()] = val.strip('"')
+    return name.upper(), params, value
+
+
+def parse_ics(text: str) -> List[dict]:
+    """
+    Extrai os VEVENTs de um arquivo .ics.
+
+    Args:
+        text: Conteúdo do arquivo
+
+    Returns:
+        List[dict]: Um dict por VEVENT {NOME: [(params, valor), ...]}
+    """
+    events: List[dict] = []
+    current: Optional[dict] = None
+    depth = 0  # componentes aninhados (VALARM etc.)
+    for line in _unfold(text):
+        name, params, value = _split_property(line)
+        if name == "BEGIN":
+            if value.upper() == "VEVENT" and current is None:
+                current = {}
+            elif current is not None:
+                depth += 1
+        elif name == "END":
+            if current is not None and depth:
+                depth -= 1
+            elif current is not None and value.upper() == "VEVENT":
+                events.append(current)
+                current = None
+        elif current is not None and not depth:
+            current.setdefault(name, []).append((params, value))
+    return events
+
+
+def _zone(tzid: Optional[str], default_tz: ZoneInfo):
+    """Fuso do TZID (ou o padrão, se ausente/desconhecido)."""
+    if not tzid:
+        return default_tz
+    try:
+        return ZoneInfo(tzid)
+    except (ZoneInfoNotFoundError, ValueError):
+        return default_tz
+
+
+def _parse_dt(params: dict, value: str, default_tz: ZoneInfo) -> Tuple[datetime, bool]:
+    """
+    Converte DTSTART/DTEND/EXDATE para datetime UTC.
+
+    Args:
+        params: Parâmetros da propriedade (TZID, VALUE)
+        value: Valor (YYYYMMDD, YYYYMMDDTHHMMSS[Z])
+        default_tz: Fuso para horários "flutuantes" e datas
+
+    Returns:
+        Tuple[datetime, bool]: (data/hora UTC, se é dia inteiro)
+    """
+    value = value.strip()
+    if params.get("VALUE", "").upper() == "DATE" or len(value) == 8:
+        d = datetime.strptime(value[:8], "%Y%m%d")
+        return d.replace(tzinfo=_zone(params.get("TZID"), default_tz)).astimezone(timezone.utc), True
+    if value.endswith("Z"):
+        return datetime.strptime(value[:15], "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc), False
+    local = datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+    return local.replace(tzinfo=_zone(params.get("TZID"), default_tz)).astimezone(timezone.utc), False
+
+
+_DURATION_RE = re.compile(
+    r"^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$"
+)
+
+
+def _parse_duration(value: str) -> Optional[timedelta]:
+    """Converte DURATION (ex.: PT1H30M, P1D) para timedelta."""
+    m = _DURATION_RE.match(value.strip().upper())
+    if not m:
+        return None
+    sign, w, d, h, mi, s = m.groups()
+    delta = timedelta(
+        weeks=int(w or 0), days=int(d or 0),
+        hours=int(h or 0), minutes=int(mi or 0), seconds=int(s or 0)
+    )
+    return -delta if sign == "-" else delta
+
+
+def _first(ev: dict, name: str) -> Tuple[dict, str]:
+    """Primeira ocorrência de uma propriedade do VEVENT ({} , "" se ausente)."""
+    values = ev.get(name)
+    return values[0] if values else ({}, "")
+
+
+def _rules_from_rrule(
+    rrule: str,
+    start: datetime,
+    default_tz: ZoneInfo
+) -> Tuple[Optional[List[Tuple[datetime, dict, str]]], Optional[str]]:
+    """
+    Converte uma RRULE nas regras suportadas pela agenda.
+    WEEKLY com vários BYDAY vira uma série semanal por dia da semana.
+
+    Args:
+        rrule: Valor da RRULE
+        start: Início (UTC) do evento
+        default_tz: Fuso padrão (UNTIL sem fuso)
+
+    Returns:
+        Tuple: ([(início, regra, sufixo do UID)], None) ou (None, motivo)
+    """
+    parts = dict(p.split("=", 1) for p in rrule.upper().split(";") if "=" in p)
+    freq = parts.pop("FREQ", "")
+    interval = int(parts.pop("INTERVAL", "1") or 1)
+    count = int(parts.pop("COUNT")) if parts.get("COUNT") else None
+    until = None
+    if parts.get("UNTIL"):
+        until = _parse_dt({}, parts.pop("UNTIL"), default_tz)[0]
+    parts.pop("WKST", None)
+    byday = [d[-2:] for d in parts.pop("BYDAY", "").split(",") if d]
+    # BYMONTHDAY/BYMONTH iguais ao próprio início não mudam a regra
+    if parts.get("BYMONTHDAY") == str(start.day):
+        parts.pop("BYMONTHDAY")
+    if parts.get("BYMONTH") == str(start.month):
+        parts.pop("BYMONTH")
+    if parts:
+        return None, f"RRULE não suportada ({', '.join(sorted(parts))})"
+
+    if freq == "WEEKLY":
+        rtype, rint = ("weekly", 1) if interval == 1 else ("every_x_days", 7 * interval)
+    elif freq == "DAILY":
+        if byday:
+            return None, "RRULE não suportada (DAILY com BYDAY)"
+        rtype, rint = ("daily", 1) if interval == 1 else ("every_x_days", interval)
+    elif freq in ("MONTHLY", "YEARLY") and interval == 1 and not byday:
+        rtype, rint = _FREQ_TO_TYPE[freq], 1
+    else:
+        return None, f"RRULE não suportada (FREQ={freq}, INTERVAL={interval})"
+
+    if freq != "WEEKLY" or not byday or byday == [_WEEKDAYS[start.weekday()]]:
+        rule = build_rule(rtype, rint, until, count)
+        return [(start, rule, "")] if rule else [], None
+
+    # Uma série por dia da semana, começando no primeiro dia >= início
+    firsts = []
+    for day in dict.fromkeys(byday):
+        if day not in _WEEKDAYS:
+            return None, f"BYDAY inválido ({day})"
+        shift = (_WEEKDAYS.index(day) - start.weekday()) % 7
+        firsts.append((start + timedelta(days=shift), day))
+    firsts.sort()
+
+    out = []
+    for i, (first, day) in enumerate(firsts):
+        # COUNT total dividido na ordem em que as ocorrências se alternam
+        day_count = None
+        if count is not None:
+            day_count = count // len(firsts) + (1 if i < count % len(firsts) else 0)
+            if day_count == 0:
+                continue
+        if until and first > until:
+            continue
+        rule = build_rule(rtype, rint, until, day_count)
+        out.append((first, rule, f"#{day}"))
+    return out, None
+
+
+def _event_docs(
+    user_id: str,
+    ev: dict,
+    default_tz: ZoneInfo,
+    event_type: str
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Converte um VEVENT em documentos de calendar_events.
+
+    Args:
+        user_id: ID do usuário
+        ev: VEVENT (parse_ics)
+        default_tz: Fuso para horários sem fuso
+        event_type: Tipo padrão dos eventos importados
+
+    Returns:
+        Tuple[List[dict], Optional[str]]: (documentos, motivo se ignorado)
+    """
+    uid = _first(ev, "UID")[1].strip()
+    params, value = _first(ev, "DTSTART")
+    if not value:
+        return [], "sem DTSTART"
+    start, all_day = _parse_dt(params, value, default_tz)
+
+    end_params, end_value = _first(ev, "DTEND")
+    if end_value:
+        end = _parse_dt(end_params, end_value, default_tz)[0]
+    elif _first(ev, "DURATION")[1]:
+        duration = _parse_duration(_first(ev, "DURATION")[1])
+        if duration is None:
+            return [], "DURATION inválida"
+        end = start + duration
+    else:
+        end = start + (timedelta(days=1) if all_day else timedelta(0))
+    if end <= start:
+        return [], "evento sem duração"
+
+    rec_params, rec_value = _first(ev, "RECURRENCE-ID")
+    if rec_value:
+        uid = f"{uid}#{_fmt_utc(_parse_dt(rec_params, rec_value, default_tz)[0])}"
+
+    title = _unescape(_first(ev, "SUMMARY")[1]) or "(sem título)"
+    description = _unescape(_first(ev, "DESCRIPTION")[1]) or None
+    ev_type = _unescape(_first(ev, "X-POMOCICLO-TYPE")[1]) or event_type
+
+    targets: List[Tuple[datetime, Optional[dict], str]] = [(start, None, "")]
+    rrule = _first(ev, "RRULE")[1]
+    if rrule and not rec_value:
+        rules, reason = _rules_from_rrule(rrule, start, default_tz)
+        if reason:
+            return [], reason
+        if rules:
+            targets = rules
+
+    exdates = []
+    for ex_params, ex_value in ev.get("EXDATE", []):
+        for v in ex_value.split(","):
+            if v.strip():
+                exdates.append(_parse_dt(ex_params, v, default_tz)[0].isoformat())
+
+    start = start.replace(microsecond=0)
+    duration = end.replace(microsecond=0) - start
+    docs = []
+    for first, rule, suffix in targets:
+        doc = CalendarEvent(
+            user_id=user_id,
+            title=title,
+            start=first,
+            end=first + duration,
+            event_type=ev_type,
+            description=description,
+            completed=_first(ev, "STATUS")[1].upper() == "COMPLETED",
+        ).model_dump()
+        doc["start"] = first.isoformat()
+        doc["end"] = (first + duration).isoformat()
+        doc["created_at"] = doc["created_at"].isoformat()
+        doc["ics_uid"] = f"{uid}{suffix}" if uid else None
+        if rule:
+            doc["recurrence"] = rule
+            doc["series_end"] = series_end(first, first + duration, rule)
+            doc["exdates"] = exdates
+        docs.append(doc)
+    return docs, None
+
+
+async def import_ics(
+    user_id: str,
+    text: str,
+    default_tz: str = "UTC",
+    event_type: str = "other"
+) -> dict:
+    """
+    Importa um .ics: deduplica por UID (no arquivo e na agenda) e grava
+    com insert_many em blocos.
+
+    Args:
+        user_id: ID do usuário
+        text: Conteúdo do arquivo
+        default_tz: Fuso IANA para horários sem fuso e eventos de dia inteiro
+        event_type: Tipo dos eventos importados (se o arquivo não informar)
+
+    Returns:
+        dict: {"created", "duplicates", "skipped", "events": [relatório por evento]}
+
+    Raises:
+        ValueError: Arquivo sem eventos, com eventos demais ou fuso inválido
+    """
+    try:
+        tz = ZoneInfo(default_tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Fuso horário inválido: {default_tz}")
+
+    vevents = parse_ics(text)
+    if not vevents:
+        raise ValueError("Nenhum VEVENT encontrado no arquivo")
+    if len(vevents) > MAX_IMPORT_EVENTS:
+        raise ValueError(f"Arquivo com mais de {MAX_IMPORT_EVENTS} eventos")
+
+    report: List[dict] = []
+    pending: List[Tuple[dict, dict]] = []  # (documento, linha do relatório)
+    seen_uids = set()
+    overrides = {}  # UID da série -> inícios substituídos (RECURRENCE-ID)
+    for ev in vevents:
+        uid = _first(ev, "UID")[1].strip() or None
+        title = _unescape(_first(ev, "SUMMARY")[1])
+        rec_params, rec_value = _first(ev, "RECURRENCE-ID")
+        if uid and rec_value:
+            try:
+                overrides.setdefault(uid, []).append(_parse_dt(rec_params, rec_value, tz)[0].isoformat())
+            except ValueError:
+                pass
+        try:
+            docs, reason = _event_docs(user_id, ev, tz, event_type)
+        except Exception as e:
+            docs, reason = [], f"evento inválido ({e})"
+        if reason:
+            report.append({"uid": uid, "title": title, "status": "skipped", "reason": reason})
+            continue
+        for doc in docs:
+            row = {"uid": doc["ics_uid"], "title": doc["title"], "start": doc["start"]}
+            if doc["ics_uid"] and doc["ics_uid"] in seen_uids:
+                report.append({**row, "status": "duplicate"})
+                continue
+            if doc["ics_uid"]:
+                seen_uids.add(doc["ics_uid"])
+            else:
+                doc.pop("ics_uid")
+            pending.append((doc, row))
+
+    # Ocorrências substituídas viram exceções da série
+    for doc, _ in pending:
+        if doc.get("recurrence") and doc.get("ics_uid"):
+            doc["exdates"] = doc["exdates"] + overrides.get(doc["ics_uid"].split("#")[0], [])
+
+    # UIDs já presentes na agenda (uma consulta por bloco)
+    existing = set()
+    uids = list(seen_uids)
+    for i in range(0, len(uids), IMPORT_CHUNK_SIZE):
+        existing.update(await db.calendar_events.distinct(
+            "ics_uid",
+            {"user_id": user_id, "ics_uid": {"$in": uids[i:i + IMPORT_CHUNK_SIZE]}}
+        ))
+
+    to_insert: List[Tuple[dict, dict]] = []
+    for doc, row in pending:
+        if doc.get("ics_uid") in existing:
+            report.append({**row, "status": "duplicate"})
+        else:
+            to_insert.append((doc, row))
+
+    for i in range(0, len(to_insert), IMPORT_CHUNK_SIZE):
+        chunk = to_insert[i:i + IMPORT_CHUNK_SIZE]
+        failed = {}
+        try:
+            await db.calendar_events.insert_many([dict(doc) for doc, _ in chunk], ordered=False)
+        except BulkWriteError as e:
+            # Import concorrente do mesmo UID (índice único) conta como duplicado
+            for err in e.details.get("writeErrors", []):
+                failed[err["index"]] = "duplicate" if err.get("code") == 11000 else err.get("errmsg", "erro")
+        for j, (doc, row) in enumerate(chunk):
+            if j not in failed:
+                report.append({**row, "status": "created", "id": doc["id"]})
+            elif failed[j] == "duplicate":
+                report.append({**row, "status": "duplicate"})
+            else:
+                report.append({**row, "status": "skipped", "reason": failed[j]})
+
+    return {
+        "created": sum(1 for r in report if r["status"] == "created"),
+        "duplicates": sum(1 for r in report if r["status"] == "duplicate"),
+        "skipped": sum(1 for r in report if r["status"] == "skipped"),
+        "events": report,
+    }
+
+
+def ics_range(start: Optional[str], end: Optional[str]) -> Tuple[datetime, datetime]:
+    """
+    Período da exportação a partir de datas YYYY-MM-DD (fim inclusivo).
+    Sem datas, exporta a agenda inteira.
+
+    Args:
+        start: Data inicial
+        end: Data final
+
+    Returns:
+        Tuple[datetime, datetime]: (início, fim exclusivo) em UTC
+
+    Raises:
+        HTTPException: 400 se a data não existir (ex.: 2025-02-30) ou estourar o calendário
+    """
+    lo = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    hi = datetime(9999, 1, 1, tzinfo=timezone.utc)
+    try:
+        if start:
+            d = date.fromisoformat(start)
+            lo = datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+        if end:
+            d = date.fromisoformat(end) + timedelta(days=1)
+            hi = datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+    except (ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="Período inválido")
+    return lo, hi
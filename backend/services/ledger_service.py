@@ -0,0 +1,353 @@
+"""
+Serviço do ledger de recompensas.
+Registra cada crédito/débito de coins e XP uma única vez (append-only) e
+mantém os saldos materializados no usuário via $inc.
+
+Coleções:
+- reward_ledger: um documento por lançamento, com chave de idempotência única
+- reward_balances: checkpoint por usuário com os lançamentos já compactados
+"""
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+import uuid
+import logging
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from services.reward_service import _xp_curve_per_level
+from utils.helpers import ensure_unique_index
+
+logger = logging.getLogger("pomociclo")
+
+# Lançamentos mais antigos que isso são dobrados no checkpoint do usuário.
+# A idempotência de uma chave vale enquanto o lançamento não for compactado.
+LEDGER_RETENTION_DAYS = 90
+
+# Usuários com lançamentos mais recentes que isso são ignorados na verificação
+# (o $inc do saldo pode ainda estar em andamento).
+LEDGER_GRACE_SECONDS = 60
+
+# Tentativas de normalização de level sob concorrência
+_SETTLE_ATTEMPTS = 5
+
+
+async def ensure_ledger_indexes():
+    """
+    Cria os índices do ledger.
+    Chamado no startup do servidor.
+    """
+    await ensure_unique_index(db.reward_ledger, "key")
+    await db.reward_ledger.create_index([("user_id", 1), ("created_at", 1)])
+    await ensure_unique_index(db.reward_balances, "user_id")
+
+
+async def record_ledger_entry(
+    user_id: str,
+    coins: int,
+    xp: int,
+    reason: str,
+    key: Optional[str] = None,
+    extra: Optional[dict] = None
+) -> bool:
+    """
+    Insere um lançamento no ledger.
+
+    Args:
+        user_id: ID do usuário
+        coins: Coins (positivo = crédito, negativo = débito)
+        xp: XP (positivo = crédito)
+        reason: Origem do lançamento (ex: "study_session", "quest", "shop_purchase")
+        key: Chave de idempotência (padrão: aleatória)
+        extra: Campos adicionais do lançamento (ex: detalhes de auditoria)
+
+    Returns:
+        bool: True se inserido, False se a chave já existia
+    """
+    try:
+        await db.reward_ledger.insert_one({
+            "id": str(uuid.uuid4()),
+            "key": key or f"{reason}:{uuid.uuid4()}",
+            "user_id": user_id,
+            "coins": int(coins),
+            "xp": int(xp),
+            "reason": reason,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            **(extra or {}),
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def revert_ledger_entry(user_id: str, key: str) -> bool:
+    """
+    Remove um lançamento cujo efeito no saldo não chegou a ser aplicado
+    (ex.: compra recusada depois do registro no ledger).
+
+    Args:
+        user_id: ID do usuário
+        key: Chave de idempotência do lançamento
+
+    Returns:
+        bool: True se removido
+    """
+    res = await db.reward_ledger.delete_one({"key": key, "user_id": user_id})
+    return res.deleted_count > 0
+
+
+async def _settle_level(user_id: str, doc: Optional[dict]) -> Optional[dict]:
+    """
+    Converte XP acumulado em levels sem sobrescrever incrementos concorrentes.
+    Usa o level atual como guarda (compare-and-set) e ajusta xp/level com $inc.
+
+    Args:
+        user_id: ID do usuário
+        doc: Documento do usuário já com o XP incrementado
+
+    Returns:
+        Optional[dict]: Documento final do usuário
+    """
+    for _ in range(_SETTLE_ATTEMPTS):
+        if not doc:
+            return doc
+
+        level = doc.get("level")
+        xp = int(doc.get("xp", 0))
+        new_level = int(level or 1)
+        need = _xp_curve_per_level(new_level)
+
+        while xp >= need:
+            xp -= need
+            new_level += 1
+            need = _xp_curve_per_level(new_level)
+
+        if new_level == int(level or 1):
+            return doc
+
+        updated = await db.users.find_one_and_update(
+            {"id": user_id, "level": level},
+            {
+                "$inc": {"xp": xp - int(doc.get("xp", 0))},
+                "$set": {"level": new_level}
+            },
+            projection={"_id": 0, "coins": 1, "xp": 1, "level": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated:
+            # Pode ainda sobrar XP de incrementos concorrentes: repete o laço
+            doc = updated
+            continue
+
+        # Outro request subiu o level antes: relê e tenta de novo
+        doc = await db.users.find_one(
+            {"id": user_id},
+            {"_id": 0, "coins": 1, "xp": 1, "level": 1}
+        )
+
+    logger.warning(f"ledger: level settle gave up for user {user_id}")
+    return doc
+
+
+async def _apply_balance(user_id: str, coins: int, xp: int) -> Optional[dict]:
+    """
+    Aplica coins/XP ao saldo materializado do usuário com um único $inc.
+
+    Args:
+        user_id: ID do usuário
+        coins: Variação de coins
+        xp: Variação de XP
+
+    Returns:
+        Optional[dict]: Documento do usuário após a atualização
+        (coins, xp, level, levels_gained)
+    """
+    doc = await db.users.find_one_and_update(
+        {"id": user_id},
+        {"$inc": {"coins": int(coins), "xp": int(xp), "xp_total": int(xp)}},
+        projection={"_id": 0, "coins": 1, "xp": 1, "level": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not doc:
+        return None
+
+    level_before = int(doc.get("level") or 1)
+    if xp > 0:
+        doc = await _settle_level(user_id, doc) or doc
+    doc["levels_gained"] = max(0, int(doc.get("level") or 1) - level_before)
+    return doc
+
+
+async def apply_reward(
+    user_id: str,
+    coins: int,
+    xp: int,
+    reason: str,
+    key: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Registra o lançamento e, se for novo, atualiza o saldo materializado.
+
+    Args:
+        user_id: ID do usuário
+        coins: Coins (positivo = crédito, negativo = débito)
+        xp: XP a adicionar
+        reason: Origem do lançamento
+        key: Chave de idempotência
+
+    Returns:
+        Optional[dict]: Documento do usuário (coins, xp, level, levels_gained)
+        ou None se o lançamento já tinha sido aplicado
+    """
+    if not await record_ledger_entry(user_id, coins, xp, reason, key):
+        return None
+    return await _apply_balance(user_id, coins, xp)
+
+
+async def _compact_user(user_id: str, cutoff: str, grace: str, repair: bool) -> dict:
+    """
+    Verifica e compacta o ledger de um usuário.
+
+    Args:
+        user_id: ID do usuário
+        cutoff: Lançamentos anteriores a isso (ISO) são dobrados no checkpoint
+        grace: Lançamentos posteriores a isso (ISO) adiam a verificação
+        repair: Se True, corrige o saldo materializado quando houver divergência
+
+    Returns:
+        dict: {"drift_coins": int, "drift_xp": int, "folded": int, "skipped": bool}
+    """
+    cp = await db.reward_balances.find_one({"user_id": user_id}, {"_id": 0}) or {}
+    through = cp.get("through", "")
+
+    # Saldo lido antes do ledger: a soma fica limitada aos lançamentos até o
+    # instante da leitura, para os dois lados verem o mesmo conjunto
+    snapshot = datetime.now(timezone.utc).isoformat()
+    user = await db.users.find_one(
+        {"id": user_id},
+        {"_id": 0, "coins": 1, "xp_total": 1}
+    )
+    if not user:
+        return {"drift_coins": 0, "drift_xp": 0, "folded": 0, "skipped": True}
+
+    rows = await db.reward_ledger.aggregate([
+        {"$match": {"user_id": user_id, "created_at": {"$gte": through, "$lte": snapshot}}},
+        {"$group": {
+            "_id": None,
+            "coins": {"$sum": "$coins"},
+            "xp": {"$sum": "$xp"},
+            "old_coins": {"$sum": {"$cond": [{"$lt": ["$created_at", cutoff]}, "$coins", 0]}},
+            "old_xp": {"$sum": {"$cond": [{"$lt": ["$created_at", cutoff]}, "$xp", 0]}},
+            "old_count": {"$sum": {"$cond": [{"$lt": ["$created_at", cutoff]}, 1, 0]}},
+        }},
+    ]).to_list(1)
+    sums = rows[0] if rows else {"coins": 0, "xp": 0, "old_coins": 0, "old_xp": 0, "old_count": 0}
+
+    # Lançamento recente (inclusive depois da leitura): o $inc pode ter caído
+    # de qualquer lado do snapshot, então nada é reparado nem criado agora
+    recent = await db.reward_ledger.find_one(
+        {"user_id": user_id, "created_at": {"$gte": grace}},
+        {"_id": 1}
+    )
+    if recent:
+        return {"drift_coins": 0, "drift_xp": 0, "folded": 0, "skipped": True}
+
+    balance_coins = int(user.get("coins", 0))
+    balance_xp = int(user.get("xp_total", 0))
+
+    if not cp:
+        # Primeiro checkpoint: saldo anterior ao ledger vira o saldo de abertura
+        cp = {
+            "user_id": user_id,
+            "coins": balance_coins - sums["coins"],
+            "xp_total": balance_xp - sums["xp"],
+            "through": "",
+        }
+        await db.reward_balances.update_one(
+            {"user_id": user_id},
+            {"$setOnInsert": cp},
+            upsert=True
+        )
+
+    drift_coins = int(cp["coins"]) + sums["coins"] - balance_coins
+    drift_xp = int(cp["xp_total"]) + sums["xp"] - balance_xp
+
+    if (drift_coins or drift_xp):
+        logger.warning(
+            f"ledger drift for user {user_id}: coins={drift_coins} xp={drift_xp}"
+        )
+        if repair:
+            # Lançamento de auditoria com valor zero (o ledger já é a verdade);
+            # a correção aplicada ao saldo fica registrada em "applied"
+            await record_ledger_entry(
+                user_id, 0, 0, "ledger_repair",
+                extra={"applied": {"coins": drift_coins, "xp": drift_xp}, "snapshot": snapshot}
+            )
+            await _apply_balance(user_id, drift_coins, drift_xp)
+
+    folded = 0
+    if sums["old_count"]:
+        # Checkpoint avança antes de apagar: se cair no meio, os restos
+        # anteriores a 'through' são ignorados e removidos na próxima execução
+        await db.reward_balances.update_one(
+            {"user_id": user_id},
+            {
+                "$inc": {"coins": sums["old_coins"], "xp_total": sums["old_xp"]},
+                "$set": {"through": cutoff}
+            }
+        )
+        res = await db.reward_ledger.delete_many(
+            {"user_id": user_id, "created_at": {"$lt": cutoff}}
+        )
+        folded = res.deleted_count
+    elif through and through < cutoff:
+        await db.reward_ledger.delete_many(
+            {"user_id": user_id, "created_at": {"$lt": through}}
+        )
+
+    return {"drift_coins": drift_coins, "drift_xp": drift_xp, "folded": folded, "skipped": False}
+
+
+async def compact_reward_ledger(
+    retention_days: int = LEDGER_RETENTION_DAYS,
+    repair: bool = True
+) -> dict:
+    """
+    Job periódico: verifica os saldos contra o ledger e dobra lançamentos antigos.
+
+    Para cada usuário com lançamentos, o saldo esperado é
+    checkpoint + soma dos lançamentos não compactados. Divergências são logadas
+    e, com repair=True, corrigidas a favor do ledger.
+
+    Args:
+        retention_days: Dias de lançamentos mantidos individualmente
+        repair: Se True, corrige saldos divergentes
+
+    Returns:
+        dict: {"users": int, "drifted": int, "folded": int, "skipped": int}
+    """
+    now = datetime.now(timezone.utc)
+    cutoff = (now - timedelta(days=retention_days)).isoformat()
+    grace = (now - timedelta(seconds=LEDGER_GRACE_SECONDS)).isoformat()
+
+    summary = {"users": 0, "drifted": 0, "folded": 0, "skipped": 0}
+    # Usuários com lançamentos pendentes ou com checkpoint (já compactados)
+    user_ids = set(await db.reward_ledger.distinct("user_id"))
+    user_ids.update(await db.reward_balances.distinct("user_id"))
+
+    for user_id in user_ids:
+        try:
+            res = await _compact_user(user_id, cutoff, grace, repair)
+        except Exception as e:
+            logger.warning(f"ledger compaction failed for user {user_id}: {e}")
+            continue
+        summary["users"] += 1
+        summary["folded"] += res["folded"]
+        if res["skipped"]:
+            summary["skipped"] += 1
+        elif res["drift_coins"] or res["drift_xp"]:
+            summary["drifted"] += 1
+
+    logger.info(f"ledger compaction: {summary}")
+    return summary
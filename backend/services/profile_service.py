@@ -0,0 +1,175 @@
+"""
+Serviço de estatísticas de perfil.
+Calcula as estatísticas de sessões do perfil no servidor (aggregation pipeline)
+e as mantém num cache por (usuário, período).
+"""
+from datetime import datetime, timezone
+from typing import Optional
+import logging
+
+from database import db
+from utils.lru_cache import LRUCache
+
+logger = logging.getLogger("pomociclo")
+
+# Limite rígido de entradas do cache (cada entrada é um dict pequeno de tamanho fixo)
+PROFILE_STATS_CACHE_SIZE = 20000
+
+# (user_id, period) -> (stats_generation, dia UTC, stats)
+profile_stats_cache = LRUCache(PROFILE_STATS_CACHE_SIZE)
+
+
+def profile_stats_pipeline(user_id: str, start_iso: str) -> list:
+    """
+    Monta o pipeline de estatísticas de sessões de um usuário.
+
+    Um único $facet calcula:
+      - totais: minutos e blocos completos (sessões não puladas)
+      - dias: dias distintos com estudo (prefixo YYYY-MM-DD do start_time)
+      - top_subject: matéria com mais minutos, já com o nome via $lookup
+
+    Args:
+        user_id: ID do usuário
+        start_iso: Início do período (ISO)
+
+    Returns:
+        list: Estágios do pipeline
+    """
+    return [
+        {"$match": {
+            "user_id": user_id,
+            "completed": True,
+            "start_time": {"$gte": start_iso}
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": {"$substrBytes": ["$start_time", 0, 10]},
+            "duration": {"$toInt": {"$ifNull": ["$duration", 0]}},
+            "block": {"$cond": [{"$eq": ["$skipped", True]}, 0, 1]},
+            "subject_id": 1
+        }},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "minutes": {"$sum": "$duration"},
+                    "blocks": {"$sum": "$block"}
+                }}
+            ],
+            "days": [
+                {"$group": {"_id": "$day"}},
+                {"$count": "active_days"}
+            ],
+            "top_subject": [
+                {"$match": {"subject_id": {"$nin": [None, ""]}}},
+                {"$group": {"_id": "$subject_id", "minutes": {"$sum": "$duration"}}},
+                {"$sort": {"minutes": -1, "_id": 1}},
+                {"$limit": 1},
+                {"$lookup": {
+                    "from": "subjects",
+                    "localField": "_id",
+                    "foreignField": "id",
+                    "as": "subject"
+                }},
+                {"$project": {
+                    "minutes": 1,
+                    "subject": {"$filter": {
+                        "input": "$subject",
+                        "as": "s",
+                        "cond": {"$eq": ["$$s.user_id", user_id]}
+                    }}
+                }}
+            ]
+        }}
+    ]
+
+
+async def compute_profile_session_stats(user_id: str, start_iso: str) -> dict:
+    """
+    Executa o pipeline e devolve as estatísticas de sessões do período.
+
+    Args:
+        user_id: ID do usuário
+        start_iso: Início do período (ISO)
+
+    Returns:
+        dict: {"total_minutes", "blocks_completed", "active_days", "most_studied_subject"}
+    """
+    rows = await db.study_sessions.aggregate(
+        profile_stats_pipeline(user_id, start_iso)
+    ).to_list(1)
+    facet = rows[0] if rows else {}
+
+    totals = (facet.get("totals") or [{}])[0]
+    days = (facet.get("days") or [{}])[0]
+
+    most_studied: Optional[dict] = None
+    top = (facet.get("top_subject") or [None])[0]
+    if top and top.get("subject"):
+        most_studied = {
+            "name": top["subject"][0].get("name", "Desconhecida"),
+            "minutes": int(top.get("minutes", 0))
+        }
+
+    return {
+        "total_minutes": int(totals.get("minutes", 0)),
+        "blocks_completed": int(totals.get("blocks", 0)),
+        "active_days": int(days.get("active_days", 0)),
+        "most_studied_subject": most_studied,
+    }
+
+
+async def _count_completed_cycles(user_id: str, start_iso: str) -> int:
+    """
+    Conta ciclos concluídos no período que atingiram 100% da meta.
+
+    Args:
+        user_id: ID do usuário
+        start_iso: Início do período (ISO)
+
+    Returns:
+        int: Ciclos completos
+    """
+    return await db.cycles.count_documents({
+        "user_id": user_id,
+        "status": "completed",
+        "week_start": {"$gte": start_iso},
+        "total_time_goal": {"$gt": 0},
+        "$expr": {"$gte": ["$total_time_studied", "$total_time_goal"]}
+    })
+
+
+async def get_cached_profile_stats(
+    user_id: str,
+    period: str,
+    generation: int,
+    start_iso: str
+) -> dict:
+    """
+    Estatísticas do período com cache por (usuário, período).
+    A entrada vale enquanto a geração do usuário (users.stats_generation,
+    incrementada em /study/end) e o dia UTC forem os mesmos.
+
+    Args:
+        user_id: ID do usuário
+        period: Período (7d ... all)
+        generation: stats_generation atual do usuário
+        start_iso: Início do período (ISO)
+
+    Returns:
+        dict: Estatísticas de sessões + "cycles_completed"
+    """
+    today = datetime.now(timezone.utc).date().isoformat()
+    key = (user_id, period)
+
+    hit = profile_stats_cache.get(key)
+    if hit:
+        if hit[0] == generation and hit[1] == today:
+            return hit[2]
+        profile_stats_cache.miss()
+
+    stats = await compute_profile_session_stats(user_id, start_iso)
+    stats["cycles_completed"] = await _count_completed_cycles(user_id, start_iso)
+
+    profile_stats_cache.set(key, (generation, today, stats))
+    return stats
@@ -211,14 +211,20 @@ async def update_weekly_quests_after_study(
             q["progress"] = min(q["target"], q.get("progress", 0) + max(0, duration))
             if q["progress"] >= q["target"]:
                 q["done"] = True
-                await grant_reward(user_id, q["reward"]["coins"], q["reward"]["xp"])
+                await grant_reward(
+                    user_id, q["reward"]["coins"], q["reward"]["xp"],
+                    reason="quest", key=f"quest:{user_id}:{doc['week_id']}:{q['qid']}"
+                )
                 changed = True
 
         elif q["type"] == "study_sessions_subject" and q.get("subject_id") == subject_id and completed:
             q["progress"] = min(q["target"], q.get("progress", 0) + 1)
             if q["progress"] >= q["target"]:
                 q["done"] = True
-                await grant_reward(user_id, q["reward"]["coins"], q["reward"]["xp"])
+                await grant_reward(
+                    user_id, q["reward"]["coins"], q["reward"]["xp"],
+                    reason="quest", key=f"quest:{user_id}:{doc['week_id']}:{q['qid']}"
+                )
                 changed = True
 
         elif q["type"] == "study_minutes_week":
@@ -226,7 +232,10 @@ async def update_weekly_quests_after_study(
             q["progress"] = min(q["target"], week_minutes)
             if q["progress"] >= q["target"]:
                 q["done"] = True
-                await grant_reward(user_id, q["reward"]["coins"], q["reward"]["xp"])
+                await grant_reward(
+                    user_id, q["reward"]["coins"], q["reward"]["xp"],
+                    reason="quest", key=f"quest:{user_id}:{doc['week_id']}:{q['qid']}"
+                )
                 changed = True
 
         elif q["type"] == "complete_cycle":
@@ -234,7 +243,10 @@ async def update_weekly_quests_after_study(
             q["progress"] = 1 if cycle_progress >= 100.0 else 0
             if q["progress"] >= q["target"]:
                 q["done"] = True
-                await grant_reward(user_id, q["reward"]["coins"], q["reward"]["xp"])
+                await grant_reward(
+                    user_id, q["reward"]["coins"], q["reward"]["xp"],
+                    reason="quest", key=f"quest:{user_id}:{doc['week_id']}:{q['qid']}"
+                )
                 changed = True
 
     if changed:
@@ -0,0 +1,281 @@
+"""
+Agendador adaptativo de revisões (SM-2).
+A nota de recordação (0-5) de cada revisão atualiza o estado da matéria
+(facilidade, repetições, intervalo) e as sessões pendentes são reprojetadas a
+partir da data da revisão. O modo em lote reprojeta todas as matérias do
+usuário de uma vez (matriz NumPy) e aplica sessões e eventos com bulk_write.
+"""
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List
+import logging
+
+import numpy as np
+from pymongo import UpdateOne
+
+from database import db
+from services.calendar_service import invalidate_month_summaries
+from services.review_service import pick_review_slot, load_class_timeline, OPEN_REVIEW_STATUSES
+from utils.datetime_utils import to_aware
+
+logger = logging.getLogger("pomociclo")
+
+# Parâmetros do SM-2
+SRS_DEFAULT_EASE = 2.5
+SRS_MIN_EASE = 1.3
+SRS_MAX_INTERVAL = 365  # dias (mesmo teto do cronograma fixo)
+
+# Duração padrão do evento de revisão na agenda
+REVIEW_EVENT_DURATION = timedelta(hours=2)
+
+
+def sm2_update(ease: float, repetitions: int, interval: int, grade: int) -> tuple[float, int, int]:
+    """
+    Um passo do SM-2.
+
+    Args:
+        ease: Fator de facilidade atual
+        repetitions: Revisões bem-sucedidas seguidas
+        interval: Último intervalo (dias)
+        grade: Nota de recordação (0 = esqueci, 5 = perfeito)
+
+    Returns:
+        tuple[float, int, int]: (facilidade, repetições, próximo intervalo em dias)
+    """
+    if grade >= 3:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = round(interval * ease)
+        repetitions += 1
+    else:
+        # Esqueceu: recomeça a sequência
+        repetitions = 0
+        interval = 1
+
+    ease += 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02)
+    ease = max(SRS_MIN_EASE, ease)
+    return ease, repetitions, int(min(max(interval, 1), SRS_MAX_INTERVAL))
+
+
+def project_offsets(
+    intervals: np.ndarray,
+    eases: np.ndarray,
+    repetitions: np.ndarray,
+    counts: np.ndarray
+) -> np.ndarray:
+    """
+    Projeta, para várias matérias de uma vez, os dias das sessões pendentes
+    a partir da última revisão: a primeira fica a `interval` dias e as
+    seguintes seguem o SM-2 supondo recordação "boa" (nota 4, que mantém a
+    facilidade). Cada passo é calculado para todas as matérias juntas.
+
+    Args:
+        intervals: Próximo intervalo (dias) de cada matéria, shape (S,)
+        eases: Facilidade de cada matéria, shape (S,)
+        repetitions: Repetições bem-sucedidas de cada matéria, shape (S,)
+        counts: Sessões pendentes de cada matéria, shape (S,)
+
+    Returns:
+        np.ndarray: Dias desde a última revisão, shape (S, max(counts));
+            posições além de counts[i] valem -1
+    """
+    width = int(counts.max()) if counts.size else 0
+    if width == 0:
+        return np.zeros((counts.size, 0), dtype=np.int64)
+
+    gaps = np.empty((counts.size, width), dtype=np.float64)
+    gaps[:, 0] = intervals
+    reps = repetitions.astype(np.int64)
+    for k in range(1, width):
+        gaps[:, k] = np.where(
+            reps == 0, 1,
+            np.where(reps == 1, 6, np.rint(gaps[:, k - 1] * eases))
+        )
+        gaps[:, k] = np.minimum(gaps[:, k], SRS_MAX_INTERVAL)
+        reps = reps + 1
+    gaps = np.clip(gaps, 1, SRS_MAX_INTERVAL).astype(np.int64)
+
+    offsets = np.cumsum(gaps, axis=1)
+    k = np.arange(width)
+    return np.where(k[None, :] < counts[:, None], offsets, -1)
+
+
+def _exam_limits(subjects: List[dict], anchors: List[datetime]) -> np.ndarray:
+    """Último dia (desde a âncora) aceito antes da prova; inf sem prova futura."""
+    limits = np.full(len(subjects), np.inf)
+    for i, (subject, anchor) in enumerate(zip(subjects, anchors)):
+        exam = to_aware(subject.get("exam_date"))
+        if subject.get("mode") == "exam" and exam and exam > anchor:
+            limits[i] = max((exam.date() - anchor.date()).days - 1, 0)
+    return limits
+
+
+async def reschedule_reviews(user_id: str, subject_ids: Optional[List[str]] = None) -> dict:
+    """
+    Reprojeta as sessões em aberto (pendentes ou atrasadas) das matérias com estado adaptativo (srs)
+    e move os eventos da agenda correspondentes, evitando as aulas.
+    Matérias sem nota registrada mantêm o cronograma fixo.
+
+    Args:
+        user_id: ID do usuário
+        subject_ids: Matérias a reprojetar (None = todas)
+
+    Returns:
+        dict: {"subjects": int, "sessions_moved": int, "events_moved": int}
+    """
+    query = {"user_id": user_id, "srs": {"$exists": True}}
+    if subject_ids is not None:
+        query["id"] = {"$in": list(subject_ids)}
+    subjects = await db.review_subjects.find(
+        query, {"_id": 0, "id": 1, "mode": 1, "exam_date": 1, "srs": 1}
+    ).to_list(None)
+    if not subjects:
+        return {"subjects": 0, "sessions_moved": 0, "events_moved": 0}
+
+    pending = await db.review_sessions.find(
+        {
+            "user_id": user_id,
+            "review_subject_id": {"$in": [s["id"] for s in subjects]},
+            "status": {"$in": OPEN_REVIEW_STATUSES}
+        },
+        {"_id": 0, "id": 1, "review_subject_id": 1, "review_number": 1,
+         "scheduled_date": 1, "calendar_event_id": 1}
+    ).to_list(None)
+    by_subject = {s["id"]: [] for s in subjects}
+    for sess in pending:
+        by_subject[sess["review_subject_id"]].append(sess)
+    for sessions in by_subject.values():
+        sessions.sort(key=lambda s: s["review_number"])
+
+    anchors = [to_aware(s["srs"]["last_review"]) for s in subjects]
+    offsets = project_offsets(
+        np.array([s["srs"]["interval"] for s in subjects], dtype=np.float64),
+        np.array([s["srs"]["ease"] for s in subjects], dtype=np.float64),
+        np.array([s["srs"]["repetitions"] for s in subjects], dtype=np.int64),
+        np.array([len(by_subject[s["id"]]) for s in subjects], dtype=np.int64)
+    )
+
+    # Modo prova: sessões que eram antes da prova continuam até a véspera
+    limits = _exam_limits(subjects, anchors)
+    if np.isfinite(limits).any() and offsets.size:
+        was_before = np.zeros(offsets.shape, dtype=bool)
+        for i, subject in enumerate(subjects):
+            exam = to_aware(subject.get("exam_date"))
+            if np.isfinite(limits[i]):
+                for j, sess in enumerate(by_subject[subject["id"]]):
+                    was_before[i, j] = to_aware(sess["scheduled_date"]) < exam
+        clamped = np.minimum(offsets, limits[:, None]).astype(np.int64)
+        offsets = np.where(was_before & (offsets >= 0), clamped, offsets)
+
+    # Sessões que mudaram de dia
+    moved = []
+    for i, subject in enumerate(subjects):
+        for j, sess in enumerate(by_subject[subject["id"]]):
+            new_date = anchors[i] + timedelta(days=int(offsets[i, j]))
+            if to_aware(sess["scheduled_date"]).date() != new_date.date():
+                moved.append((sess, new_date))
+    if not moved:
+        return {"subjects": len(subjects), "sessions_moved": 0, "events_moved": 0}
+
+    # Sessão movida para o futuro volta a ser pendente
+    now = datetime.now(timezone.utc)
+    session_ops = [
+        UpdateOne({"id": sess["id"], "user_id": user_id},
+                  {"$set": {
+                      "scheduled_date": new_date.isoformat(),
+                      "status": "pending" if new_date >= now else "overdue"
+                  }})
+        for sess, new_date in moved
+    ]
+    await db.review_sessions.bulk_write(session_ops, ordered=False)
+
+    # Eventos: uma consulta, aulas do horizonte numa só timeline, um bulk_write
+    event_ids = [sess["calendar_event_id"] for sess, _ in moved if sess.get("calendar_event_id")]
+    events = {}
+    if event_ids:
+        async for ev in db.calendar_events.find(
+            {"id": {"$in": event_ids}, "user_id": user_id},
+            {"_id": 0, "id": 1, "start": 1, "end": 1}
+        ):
+            events[ev["id"]] = ev
+
+    event_ops = []
+    if events:
+        dates = [new_date for _, new_date in moved]
+        horizon_start = min(dates).replace(hour=0, minute=0, second=0, microsecond=0)
+        horizon_end = max(dates).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        timeline = await load_class_timeline(user_id, horizon_start, horizon_end)
+        for sess, new_date in moved:
+            ev = events.get(sess.get("calendar_event_id"))
+            if not ev:
+                continue
+            start, end = to_aware(ev.get("start")), to_aware(ev.get("end"))
+            duration = end - start if start and end and end > start else REVIEW_EVENT_DURATION
+            event_start, event_end = pick_review_slot(timeline, new_date, duration)
+            event_ops.append(UpdateOne(
+                {"id": ev["id"], "user_id": user_id},
+                {"$set": {"start": event_start.isoformat(), "end": event_end.isoformat()}}
+            ))
+    if event_ops:
+        await db.calendar_events.bulk_write(event_ops, ordered=False)
+        await invalidate_month_summaries(user_id)
+
+    logger.info(
+        f"[Review] Reagendamento {user_id}: {len(subjects)} matérias, "
+        f"{len(session_ops)} sessões, {len(event_ops)} eventos"
+    )
+    return {
+        "subjects": len(subjects),
+        "sessions_moved": len(session_ops),
+        "events_moved": len(event_ops)
+    }
+
+
+async def grade_review(user_id: str, subject: dict, session: dict, grade: int, now: datetime) -> dict:
+    """
+    Registra a nota de uma revisão concluída, atualiza o estado SM-2 da
+    matéria e reprojeta as sessões pendentes dela.
+    Na primeira nota, o estado parte do cronograma fixo: repetições = revisões
+    anteriores e intervalo = distância até a sessão anterior (ou primeiro estudo).
+
+    Args:
+        user_id: ID do usuário
+        subject: Matéria da revisão
+        session: Sessão concluída
+        grade: Nota de recordação (0-5)
+        now: Momento da conclusão (UTC)
+
+    Returns:
+        dict: {"srs": dict, "sessions_moved": int, "events_moved": int}
+    """
+    state = subject.get("srs")
+    if state:
+        ease, repetitions, interval = state["ease"], state["repetitions"], state["interval"]
+    else:
+        previous = await db.review_sessions.find_one(
+            {"review_subject_id": subject["id"], "user_id": user_id,
+             "review_number": session["review_number"] - 1},
+            {"_id": 0, "scheduled_date": 1}
+        )
+        previous_date = to_aware((previous or {}).get("scheduled_date") or subject.get("first_study_date"))
+        scheduled = to_aware(session["scheduled_date"])
+        ease = SRS_DEFAULT_EASE
+        repetitions = session["review_number"] - 1
+        interval = max((scheduled.date() - previous_date.date()).days, 1) if previous_date else 1
+
+    ease, repetitions, interval = sm2_update(ease, repetitions, interval, grade)
+    srs = {
+        "ease": round(ease, 4),
+        "repetitions": repetitions,
+        "interval": interval,
+        "last_grade": grade,
+        "last_review": now.isoformat()
+    }
+    await db.review_subjects.update_one(
+        {"id": subject["id"], "user_id": user_id},
+        {"$set": {"srs": srs}}
+    )
+    result = await reschedule_reviews(user_id, [subject["id"]])
+    return {"srs": srs, "sessions_moved": result["sessions_moved"], "events_moved": result["events_moved"]}
@@ -0,0 +1,291 @@
+"""
+Serviço de revisões.
+Próximas e atrasadas saem de um aggregate com $lookup da matéria (uma ida ao
+banco), paginadas por cursor (scheduled_date, id). O status "overdue" é
+mantido por um job periódico, então atrasadas são uma igualdade indexada.
+Também escolhe o horário das revisões na agenda, evitando as aulas.
+"""
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+import base64
+import logging
+
+from database import db
+from services.calendar_recurrence import list_window_events
+from utils.datetime_utils import to_aware
+from utils.intervals import BusyTimeline
+
+logger = logging.getLogger("pomociclo")
+
+# Tamanho padrão e máximo de página
+REVIEW_PAGE_SIZE = 50
+REVIEW_PAGE_MAX = 500
+
+# Status de sessões ainda não concluídas
+OPEN_REVIEW_STATUSES = ["pending", "overdue"]
+
+
+# Horários preferidos para revisões (na ordem de preferência)
+REVIEW_PREFERRED_HOURS = [14, 16, 18, 10, 20, 8, 12]
+
+
+def pick_review_slot(
+    timeline: BusyTimeline,
+    target_date: datetime,
+    duration: timedelta
+) -> tuple[datetime, datetime]:
+    """
+    Escolhe o horário da revisão no dia de target_date, evitando as aulas da timeline.
+    
+    Args:
+        timeline: Horários ocupados (aulas) que cobrem o dia
+        target_date: Dia da revisão
+        duration: Duração da revisão
+    
+    Returns:
+        tuple[datetime, datetime]: (início, fim)
+    """
+    # Tenta horários preferenciais
+    for hour in REVIEW_PREFERRED_HOURS:
+        candidate_start = target_date.replace(hour=hour, minute=0, second=0, microsecond=0)
+        candidate_start_utc = to_aware(candidate_start)
+        if timeline.is_free(candidate_start_utc, candidate_start_utc + duration):
+            return candidate_start, candidate_start + duration
+    
+    # Primeiro horário livre do dia (grade de 30 min, a partir das 8h)
+    day_end = target_date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    first_hour = target_date.replace(hour=8, minute=0, second=0, microsecond=0)
+    first_hour_utc = to_aware(first_hour)
+    slot = timeline.first_free_slot(
+        first_hour_utc,
+        duration,
+        to_aware(day_end) - duration,
+        step=timedelta(minutes=30)
+    )
+    if slot:
+        candidate_start = first_hour + (slot - first_hour_utc)
+        return candidate_start, candidate_start + duration
+    
+    # Fallback: 14h
+    fallback_start = target_date.replace(hour=14, minute=0, second=0, microsecond=0)
+    return fallback_start, fallback_start + duration
+
+
+async def load_class_timeline(user_id: str, start: datetime, end: datetime) -> BusyTimeline:
+    """
+    Carrega (uma consulta) as aulas do período como horários ocupados.
+    
+    Args:
+        user_id: ID do usuário
+        start: Início do período
+        end: Fim do período
+    
+    Returns:
+        BusyTimeline: Aulas do período
+    """
+    events = await list_window_events(
+        user_id, to_aware(start), to_aware(end), {"event_type": "class"}, limit=10000
+    )
+    return BusyTimeline.from_events(events, {"class"})
+
+
+def encode_cursor(session: dict) -> str:
+    """Cursor opaco a partir da última sessão da página."""
+    raw = f"{session['scheduled_date']}|{session['id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """
+    Decodifica o cursor de paginação.
+
+    Args:
+        cursor: Cursor recebido
+
+    Returns:
+        tuple[str, str]: (scheduled_date, id)
+
+    Raises:
+        ValueError: Cursor inválido
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        scheduled_date, session_id = raw.rsplit("|", 1)
+    except Exception:
+        raise ValueError("Cursor inválido")
+    return scheduled_date, session_id
+
+
+def _list_filter(kind: str, now: datetime, days_ahead: int) -> dict:
+    """
+    Filtro de próximas (upcoming) ou atrasadas (overdue).
+    Pendentes já vencidas que o job ainda não marcou continuam em próximas.
+    """
+    if kind == "overdue":
+        return {"status": "overdue"}
+    return {
+        "status": "pending",
+        "scheduled_date": {"$lte": (now + timedelta(days=days_ahead)).isoformat()}
+    }
+
+
+def _page_stages(limit: int, cursor: Optional[str] = None) -> list:
+    """
+    Estágios de uma página: keyset (cursor), ordenação, limite (+1 para saber
+    se há próxima) e $lookup da matéria.
+
+    Args:
+        limit: Itens por página
+        cursor: Cursor da página anterior
+
+    Returns:
+        list: Estágios do pipeline
+    """
+    stages = []
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        stages.append({"$match": {"$or": [
+            {"scheduled_date": {"$gt": after_date}},
+            {"scheduled_date": after_date, "id": {"$gt": after_id}},
+        ]}})
+    stages += [
+        {"$sort": {"scheduled_date": 1, "id": 1}},
+        {"$limit": limit + 1},
+        {"$lookup": {
+            "from": "review_subjects",
+            "localField": "review_subject_id",
+            "foreignField": "id",
+            "as": "subject"
+        }},
+        {"$project": {"_id": 0, "subject._id": 0}},
+    ]
+    return stages
+
+
+def _build_page(kind: str, rows: list, limit: int, now: datetime) -> dict:
+    """
+    Formata a página (mesmos campos das listagens antigas) e calcula o próximo cursor.
+
+    Args:
+        kind: upcoming ou overdue
+        rows: Resultado do pipeline (até limit + 1)
+        limit: Itens por página
+        now: Agora (UTC)
+
+    Returns:
+        dict: {"items": List[dict], "next_cursor": Optional[str]}
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]) if has_more and rows else None
+
+    items = []
+    for row in rows:
+        subjects = row.pop("subject", None) or []
+        if not subjects:
+            # Sessão órfã (matéria removida): fora da listagem, como antes
+            continue
+        subject = subjects[0]
+        item = {
+            **row,
+            "subject_name": subject.get("name"),
+            "subject_area": subject.get("area"),
+        }
+        if kind == "overdue":
+            scheduled = datetime.fromisoformat(row["scheduled_date"])
+            item["days_late"] = (now.date() - scheduled.date()).days
+        else:
+            item["subject_mode"] = subject.get("mode")
+        items.append(item)
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def list_reviews(
+    user_id: str,
+    kind: str,
+    limit: int = REVIEW_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    days_ahead: int = 30
+) -> dict:
+    """
+    Página de revisões pendentes próximas (upcoming) ou atrasadas (overdue).
+
+    Args:
+        user_id: ID do usuário
+        kind: upcoming ou overdue
+        limit: Itens por página
+        cursor: Cursor da página anterior
+        days_ahead: Dias à frente (upcoming)
+
+    Returns:
+        dict: {"items": List[dict], "next_cursor": Optional[str]}
+    """
+    now = datetime.now(timezone.utc)
+    rows = await db.review_sessions.aggregate([
+        {"$match": {"user_id": user_id, **_list_filter(kind, now, days_ahead)}},
+        *_page_stages(limit, cursor),
+    ]).to_list(None)
+    return _build_page(kind, rows, limit, now)
+
+
+async def review_dashboard(
+    user_id: str,
+    days_ahead: int = 30,
+    limit: int = REVIEW_PAGE_SIZE
+) -> dict:
+    """
+    Contagens e primeira página de próximas e atrasadas num único aggregate ($facet).
+
+    Args:
+        user_id: ID do usuário
+        days_ahead: Dias à frente (upcoming)
+        limit: Itens por página
+
+    Returns:
+        dict: {"counts": {"upcoming", "overdue"}, "upcoming": página, "overdue": página}
+    """
+    now = datetime.now(timezone.utc)
+    upcoming_filter = _list_filter("upcoming", now, days_ahead)
+    overdue_filter = _list_filter("overdue", now, days_ahead)
+
+    rows = await db.review_sessions.aggregate([
+        {"$match": {"user_id": user_id, "status": {"$in": OPEN_REVIEW_STATUSES}}},
+        {"$facet": {
+            "upcoming_count": [{"$match": upcoming_filter}, {"$count": "n"}],
+            "overdue_count": [{"$match": overdue_filter}, {"$count": "n"}],
+            "upcoming": [{"$match": upcoming_filter}, *_page_stages(limit)],
+            "overdue": [{"$match": overdue_filter}, *_page_stages(limit)],
+        }},
+    ]).to_list(1)
+    facet = rows[0] if rows else {}
+
+    def _count(name: str) -> int:
+        return int(((facet.get(name) or [{}])[0]).get("n", 0))
+
+    return {
+        "counts": {
+            "upcoming": _count("upcoming_count"),
+            "overdue": _count("overdue_count"),
+        },
+        "upcoming": _build_page("upcoming", facet.get("upcoming", []), limit, now),
+        "overdue": _build_page("overdue", facet.get("overdue", []), limit, now),
+    }
+
+
+async def sweep_overdue_reviews() -> dict:
+    """
+    Job periódico: marca como "overdue" as sessões pendentes já vencidas
+    (um update_many sobre o índice status + scheduled_date).
+
+    Returns:
+        dict: {"marked": int}
+    """
+    now = datetime.now(timezone.utc)
+    res = await db.review_sessions.update_many(
+        {"status": "pending", "scheduled_date": {"$lt": now.isoformat()}},
+        {"$set": {"status": "overdue"}}
+    )
+    summary = {"marked": res.modified_count}
+    logger.info(f"review overdue sweep: {summary}")
+    return summary
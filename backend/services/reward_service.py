@@ -150,55 +150,43 @@ def xp_required_for_next_level(current_level: int) -> int:
 async def update_user_rewards(
     user_id: str,
     minutes_studied: int,
-    studied_minutes_today: int
+    studied_minutes_today: int,
+    key: Optional[str] = None
 ) -> dict:
     """
     Atualiza recompensas do usuário após sessão de estudo.
+    Lança o crédito no ledger e aplica no saldo com $inc (sem leitura prévia).
     
     Args:
         user_id: ID do usuário
         minutes_studied: Minutos estudados nesta sessão
         studied_minutes_today: Total de minutos estudados hoje
+        key: Chave de idempotência do lançamento (ex: ID da sessão)
     
     Returns:
         dict: Informações sobre recompensas (coins, xp, level_up, new_level)
     """
+    from services.ledger_service import apply_reward
+
     # Atualiza e obtém streak
     streak = await _update_and_get_streak(user_id, studied_minutes_today)
     
     # Calcula recompensas
     coins, xp = calculate_coins_and_xp(minutes_studied, streak)
     
-    # Busca usuário atual
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    user = await apply_reward(user_id, coins, xp, "study_rewards", key)
     if not user:
         return {"coins": 0, "xp": 0, "level_up": False, "new_level": 1}
     
-    # Calcula novos valores
-    new_coins = user.get("coins", 0) + coins
-    new_xp = user.get("xp", 0) + xp
-    old_level = user.get("level", 1)
-    new_level = calculate_level_from_xp(new_xp)
-    
-    level_up = new_level > old_level
-    
-    # Atualiza no banco
-    await db.users.update_one(
-        {"id": user_id},
-        {"$set": {
-            "coins": new_coins,
-            "xp": new_xp,
-            "level": new_level
-        }}
-    )
+    new_level = int(user.get("level", 1))
     
     return {
         "coins": coins,
         "xp": xp,
-        "level_up": level_up,
+        "level_up": user.get("levels_gained", 0) > 0,
         "new_level": new_level,
-        "total_coins": new_coins,
-        "total_xp": new_xp,
+        "total_coins": int(user.get("coins", 0)),
+        "total_xp": int(user.get("xp", 0)),
         "streak": streak
     }
 
@@ -380,36 +368,27 @@ def _xp_curve_per_level(level: int) -> int:
     return int(base_xp * (1.25 ** (level - 1)) + 0.999)
 
 
-async def grant_reward(user_id: str, coins: int, xp: int):
+async def grant_reward(
+    user_id: str,
+    coins: int,
+    xp: int,
+    reason: str = "reward",
+    key: Optional[str] = None
+):
     """
     Concede recompensas ao usuário e atualiza level.
+    O crédito passa pelo ledger: com a mesma chave, é aplicado uma única vez.
     
     Args:
         user_id: ID do usuário
         coins: Coins a adicionar
         xp: XP a adicionar
+        reason: Origem da recompensa
+        key: Chave de idempotência
     """
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
-    if not user:
-        return
-    
-    new_xp = user.get("xp", 0) + max(0, xp)
-    new_level = user.get("level", 1)
-    need = _xp_curve_per_level(new_level)
-    
-    while new_xp >= need:
-        new_xp -= need
-        new_level += 1
-        need = _xp_curve_per_level(new_level)
-    
-    await db.users.update_one(
-        {"id": user_id},
-        {
-            "$inc": {"coins": max(0, coins)},
-            "$set": {"xp": int(new_xp), "level": int(new_level)}
-        },
-        upsert=True
-    )
+    from services.ledger_service import apply_reward
+
+    await apply_reward(user_id, max(0, coins), max(0, xp), reason, key)
 
 
 def get_week_bounds(now: datetime) -> Tuple[datetime, datetime, str]:
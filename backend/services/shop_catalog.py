@@ -0,0 +1,189 @@
+"""
+Catálogo da loja em memória.
+Mantém os itens indexados por ID e a resposta da listagem já serializada,
+identificados por um número de versão que as rotas de seed incrementam.
+Também contém o seed incremental da coleção shop_items.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import time
+import logging
+
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument, InsertOne, ReplaceOne, DeleteMany
+
+from database import db
+from config import FREE_SHOP
+
+logger = logging.getLogger("pomociclo")
+
+# Documento com a versão atual do catálogo (compartilhado entre workers)
+_META_ID = "shop_catalog"
+
+# Intervalo mínimo entre consultas da versão no banco (outros workers podem ter semeado)
+VERSION_CHECK_SECONDS = 30
+
+
+class ShopCatalog:
+    """Snapshot imutável do catálogo numa versão."""
+    def __init__(self, version: int, items: List[dict]):
+        self.version: int = version
+        self.items: List[dict] = items
+        self.by_id: Dict[str, dict] = {x["id"]: x for x in items}
+        # Corpo de /shop já serializado (mesmo formato do JSONResponse do FastAPI)
+        self.body: bytes = json.dumps(
+            jsonable_encoder({"items": items, "free_shop": FREE_SHOP}),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        digest = hashlib.sha1(self.body).hexdigest()[:16]
+        self.etag: str = f'"v{version}-{digest}"'
+
+
+_catalog: Optional[ShopCatalog] = None
+_checked_at: float = 0.0
+_lock = asyncio.Lock()
+
+
+async def _stored_version() -> int:
+    """Lê a versão atual do catálogo no banco."""
+    meta = await db.app_meta.find_one({"id": _META_ID}, {"_id": 0, "version": 1})
+    return int(meta.get("version", 0)) if meta else 0
+
+
+async def get_catalog() -> ShopCatalog:
+    """
+    Retorna o catálogo em memória, recarregando se a versão mudou.
+    A versão no banco é consultada no máximo a cada VERSION_CHECK_SECONDS.
+
+    Returns:
+        ShopCatalog: Catálogo atual
+    """
+    global _catalog, _checked_at
+
+    if _catalog is not None and time.monotonic() - _checked_at < VERSION_CHECK_SECONDS:
+        return _catalog
+
+    async with _lock:
+        if _catalog is not None and time.monotonic() - _checked_at < VERSION_CHECK_SECONDS:
+            return _catalog
+
+        version = await _stored_version()
+        if _catalog is None or _catalog.version != version:
+            items = await db.shop_items.find({}, {"_id": 0, "content_hash": 0}).to_list(None)
+            _catalog = ShopCatalog(version, items)
+            logger.info(f"shop catalog loaded: version={version} items={len(items)}")
+        _checked_at = time.monotonic()
+        return _catalog
+
+
+async def get_shop_item(item_id: str) -> Optional[dict]:
+    """
+    Busca um item do catálogo por ID em O(1).
+
+    Args:
+        item_id: ID do item
+
+    Returns:
+        Optional[dict]: Item ou None se não existir
+    """
+    return (await get_catalog()).by_id.get(item_id)
+
+
+async def bump_catalog_version() -> int:
+    """
+    Incrementa a versão do catálogo após um seed e descarta o cache local.
+    Os demais workers recarregam na próxima verificação de versão.
+
+    Returns:
+        int: Nova versão
+    """
+    global _catalog, _checked_at
+
+    meta = await db.app_meta.find_one_and_update(
+        {"id": _META_ID},
+        {
+            "$inc": {"version": 1},
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+        },
+        projection={"_id": 0, "version": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    _catalog = None
+    _checked_at = 0.0
+    return int(meta.get("version", 0)) if meta else 0
+
+
+def content_hash(item: dict) -> str:
+    """
+    Hash estável do conteúdo de um item (ignora _id e o próprio hash).
+
+    Args:
+        item: Item da loja
+
+    Returns:
+        str: SHA-1 hexadecimal do JSON canônico
+    """
+    data = {k: v for k, v in item.items() if k not in ("_id", "content_hash")}
+    raw = json.dumps(jsonable_encoder(data), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+async def seed_shop_items(items: List[dict]) -> dict:
+    """
+    Sincroniza shop_items com a lista gerada pelo seed.
+    Compara por ID e hash de conteúdo e aplica só inserções, atualizações e
+    remoções num único bulk_write (a loja nunca fica vazia).
+
+    Args:
+        items: Itens desejados (ex: shop_seed.build_items())
+
+    Returns:
+        dict: {"inserted", "updated", "deleted", "unchanged", "catalog_version"}
+    """
+    desired: Dict[str, dict] = {}
+    for item in items:
+        doc = item.model_dump() if hasattr(item, "model_dump") else dict(item)
+        doc.pop("_id", None)
+        doc["content_hash"] = content_hash(doc)
+        desired[doc["id"]] = doc
+
+    stored: Dict[str, str] = {}
+    async for doc in db.shop_items.find({}, {"_id": 0}):
+        stored[doc["id"]] = doc.get("content_hash") or content_hash(doc)
+
+    ops = []
+    inserted = updated = unchanged = 0
+    for item_id, doc in desired.items():
+        if item_id not in stored:
+            ops.append(InsertOne(doc))
+            inserted += 1
+        elif stored[item_id] != doc["content_hash"]:
+            ops.append(ReplaceOne({"id": item_id}, doc))
+            updated += 1
+        else:
+            unchanged += 1
+
+    removed = [item_id for item_id in stored if item_id not in desired]
+    if removed:
+        ops.append(DeleteMany({"id": {"$in": removed}}))
+
+    version = await _stored_version()
+    if ops:
+        await db.shop_items.bulk_write(ops, ordered=False)
+        version = await bump_catalog_version()
+
+    summary = {
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": len(removed),
+        "unchanged": unchanged,
+        "catalog_version": version,
+    }
+    logger.info(f"shop seed: {summary}")
+    return summary
@@ -0,0 +1,248 @@
+"""
+Serviço de estatísticas gerais do usuário.
+Mantém contadores vitalícios materializados em user_stats (minutos totais,
+sessões concluídas e streak de dias com estudo), atualizados em /study/end.
+"""
+from datetime import datetime, timezone, timedelta, date
+from typing import Optional
+import logging
+
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger("pomociclo")
+
+# Tentativas de juntar o backfill com sessões concorrentes
+_MERGE_ATTEMPTS = 5
+
+
+def _streak_run(dates_desc: list) -> int:
+    """
+    Tamanho da sequência de dias consecutivos que termina na data mais recente.
+
+    Args:
+        dates_desc: Datas únicas em ordem decrescente
+
+    Returns:
+        int: Dias consecutivos
+    """
+    if not dates_desc:
+        return 0
+    streak = 1
+    expected = dates_desc[0] - timedelta(days=1)
+    for d in dates_desc[1:]:
+        if d != expected:
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    return streak
+
+
+def _merge_streak(base: dict, pending: dict) -> tuple[int, str]:
+    """
+    Junta o streak do backfill com o das sessões contadas no documento pendente.
+
+    Args:
+        base: Streak calculado das sessões (streak_current, streak_last_date)
+        pending: Documento pendente com os incrementos
+
+    Returns:
+        tuple[int, str]: (streak_current, streak_last_date)
+    """
+    base_cur = int(base.get("streak_current", 0))
+    base_last = base.get("streak_last_date") or ""
+    p_cur = int(pending.get("streak_current", 0))
+    p_last = pending.get("streak_last_date") or ""
+
+    # Dias pendentes até o último do backfill já estão no conjunto de datas
+    if not p_last or p_last <= base_last or p_cur <= 0:
+        return base_cur, base_last
+
+    last = date.fromisoformat(p_last)
+    first = last - timedelta(days=p_cur - 1)
+    if base_last and base_cur > 0:
+        base_end = date.fromisoformat(base_last)
+        if first <= base_end + timedelta(days=1):
+            # Sequências encostadas/sobrepostas: vira uma só
+            base_start = base_end - timedelta(days=base_cur - 1)
+            return max(p_cur, (last - base_start).days + 1), p_last
+    return p_cur, p_last
+
+
+async def _backfill_user_stats(user_id: str) -> dict:
+    """
+    Calcula os contadores a partir das sessões (primeiro acesso do usuário).
+
+    Primeiro reserva o documento (pendente, com "since"): sessões finalizadas
+    a partir daí são somadas nele por record_session_stats, e o backfill só
+    agrega as finalizadas antes, juntando as duas partes no fim.
+
+    Args:
+        user_id: ID do usuário
+
+    Returns:
+        dict: Documento de user_stats
+    """
+    try:
+        await db.user_stats.update_one(
+            {"user_id": user_id},
+            {"$setOnInsert": {
+                "user_id": user_id,
+                "ready": False,
+                "since": datetime.now(timezone.utc).isoformat(),
+                "total_minutes": 0,
+                "sessions_completed": 0,
+                "streak_current": 0,
+                "streak_last_date": "",
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        pass  # Outro request criou o documento ao mesmo tempo
+
+    pending = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0})
+    if not pending or pending.get("ready"):
+        return pending or {}
+    since = pending.get("since") or datetime.now(timezone.utc).isoformat()
+
+    totals = await db.study_sessions.aggregate([
+        {"$match": {"user_id": user_id, "end_time": {"$not": {"$gte": since}}}},
+        {"$group": {
+            "_id": None,
+            "total_minutes": {"$sum": {"$ifNull": ["$duration", 0]}},
+            "sessions_completed": {"$sum": {"$cond": [{"$eq": ["$completed", True]}, 1, 0]}}
+        }},
+    ]).to_list(1)
+    t = totals[0] if totals else {}
+
+    # Dias com estudo no último ano (para o streak)
+    one_year_ago = (datetime.now(timezone.utc) - timedelta(days=365)).isoformat()
+    days = await db.study_sessions.aggregate([
+        {"$match": {"user_id": user_id, "start_time": {"$gte": one_year_ago}}},
+        {"$group": {"_id": {"$substrBytes": ["$start_time", 0, 10]}}},
+        {"$sort": {"_id": -1}},
+    ]).to_list(None)
+    dates_desc = []
+    for d in days:
+        try:
+            dates_desc.append(date.fromisoformat(d["_id"]))
+        except Exception:
+            pass
+
+    base = {
+        "total_minutes": int(t.get("total_minutes", 0)),
+        "sessions_completed": int(t.get("sessions_completed", 0)),
+        "streak_current": _streak_run(dates_desc),
+        "streak_last_date": dates_desc[0].isoformat() if dates_desc else "",
+    }
+
+    # Junta com os incrementos do documento pendente (compare-and-set)
+    for _ in range(_MERGE_ATTEMPTS):
+        streak, last = _merge_streak(base, pending)
+        doc = {
+            "user_id": user_id,
+            "total_minutes": base["total_minutes"] + int(pending.get("total_minutes", 0)),
+            "sessions_completed": base["sessions_completed"] + int(pending.get("sessions_completed", 0)),
+            "streak_current": streak,
+            "streak_last_date": last,
+            "ready": True,
+        }
+        res = await db.user_stats.update_one(
+            {
+                "user_id": user_id,
+                "ready": False,
+                "total_minutes": pending.get("total_minutes", 0),
+                "sessions_completed": pending.get("sessions_completed", 0),
+                "streak_last_date": pending.get("streak_last_date", ""),
+                "streak_current": pending.get("streak_current", 0),
+            },
+            {"$set": doc, "$unset": {"since": ""}}
+        )
+        if res.matched_count:
+            return doc
+
+        # Outra sessão terminou (ou outro backfill concluiu): relê
+        pending = await db.user_stats.find_one({"user_id": user_id}, {"_id": 0})
+        if not pending or pending.get("ready"):
+            return pending or doc
+
+    logger.warning(f"stats: backfill merge gave up for user {user_id}")
+    return doc
+
+
+async def record_session_stats(
+    user_id: str,
+    start_iso: str,
+    end_iso: str,
+    minutes: int,
+    completed: bool
+):
+    """
+    Atualiza atomicamente os contadores após uma sessão (um único update, sem leitura).
+    Usuários ainda sem contadores são ignorados: o backfill os calcula das
+    sessões. Com o backfill em andamento, a sessão entra no documento
+    pendente se terminou depois da reserva ("since").
+
+    Args:
+        user_id: ID do usuário
+        start_iso: Início da sessão (ISO, UTC)
+        end_iso: Fim da sessão (ISO, UTC), como gravado em end_time
+        minutes: Minutos contados da sessão
+        completed: Se a sessão foi concluída
+    """
+    day = start_iso[:10]
+    try:
+        prev_day = (date.fromisoformat(day) - timedelta(days=1)).isoformat()
+    except ValueError:
+        return
+
+    last = {"$ifNull": ["$streak_last_date", ""]}
+    current = {"$ifNull": ["$streak_current", 0]}
+
+    await db.user_stats.update_one(
+        {"user_id": user_id, "$or": [{"ready": True}, {"since": {"$lte": end_iso}}]},
+        [{"$set": {
+            "total_minutes": {"$add": [{"$ifNull": ["$total_minutes", 0]}, int(minutes)]},
+            "sessions_completed": {"$add": [
+                {"$ifNull": ["$sessions_completed", 0]}, 1 if completed else 0
+            ]},
+            "streak_current": {"$switch": {
+                "branches": [
+                    {"case": {"$gte": [last, day]}, "then": current},
+                    {"case": {"$eq": [last, prev_day]}, "then": {"$add": [current, 1]}},
+                ],
+                "default": 1
+            }},
+            "streak_last_date": {"$max": [last, day]},
+        }}]
+    )
+
+
+async def get_lifetime_stats(user_id: str) -> dict:
+    """
+    Lê os contadores do usuário (uma leitura pontual).
+
+    Args:
+        user_id: ID do usuário
+
+    Returns:
+        dict: {"total_minutes", "sessions_completed", "current_streak"}
+    """
+    doc: Optional[dict] = await db.user_stats.find_one(
+        {"user_id": user_id, "ready": True},
+        {"_id": 0}
+    )
+    if not doc:
+        doc = await _backfill_user_stats(user_id)
+
+    # Streak só vale se o último dia de estudo foi hoje ou ontem
+    today = datetime.now(timezone.utc).date()
+    alive = {today.isoformat(), (today - timedelta(days=1)).isoformat()}
+    streak = int(doc.get("streak_current", 0)) if doc.get("streak_last_date") in alive else 0
+
+    return {
+        "total_minutes": int(doc.get("total_minutes", 0)),
+        "sessions_completed": int(doc.get("sessions_completed", 0)),
+        "current_streak": streak,
+    }
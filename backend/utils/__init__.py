@@ -12,7 +12,7 @@ from .reward_calculator import (
     apply_mults, xp_curve_per_level
 )
 from .auth_utils import make_cookie, current_user_id
-from .helpers import presence_from_fields, new_invite, sec, sec_left_from_timer
+from .helpers import presence_from_fields, new_invite, sec, sec_left_from_timer, run_periodic
 
 __all__ = [
     # DateTime utils
@@ -26,5 +26,5 @@ __all__ = [
     # Auth utils
     "make_cookie", "current_user_id",
     # Helpers
-    "presence_from_fields", "new_invite", "sec", "sec_left_from_timer",
+    "presence_from_fields", "new_invite", "sec", "sec_left_from_timer", "run_periodic",
 ]
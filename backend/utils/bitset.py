@@ -0,0 +1,174 @@
+"""
+Utilitários de bitsets de dias guardados no MongoDB.
+Um bitset de N bits vira campos inteiros w0, w1, ... (64 bits cada), para
+que marcar/desmarcar um dia seja um $bit atômico (or/and) sem ler antes.
+Para leitura, os campos são juntados num int do Python.
+Updates com pipeline (sem operadores bit a bit antes do MongoDB 6.3) usam
+palavras de 32 bits, em que a aritmética em double é exata.
+"""
+from typing import Tuple
+
+from bson.int64 import Int64
+
+WORD_BITS = 64
+_WORD_MASK = (1 << WORD_BITS) - 1
+
+
+def words_for(n_bits: int, word_bits: int = WORD_BITS) -> int:
+    """Quantidade de palavras de word_bits bits para n_bits."""
+    return (n_bits + word_bits - 1) // word_bits
+
+
+def _to_int64(value: int) -> Int64:
+    """Converte 64 bits sem sinal para o Int64 (com sinal) do BSON."""
+    value &= _WORD_MASK
+    if value >= 1 << (WORD_BITS - 1):
+        value -= 1 << WORD_BITS
+    return Int64(value)
+
+
+def bit_field(index: int, prefix: str = "") -> Tuple[str, int]:
+    """
+    Campo e máscara (sem sinal) do bit `index`.
+
+    Args:
+        index: Posição do bit
+        prefix: Prefixo do campo (ex.: "bits.")
+
+    Returns:
+        Tuple[str, int]: (nome do campo, máscara)
+    """
+    return f"{prefix}w{index // WORD_BITS}", 1 << (index % WORD_BITS)
+
+
+def set_bit_op(index: int, value: bool, prefix: str = "") -> dict:
+    """
+    Operação $bit que liga (or) ou desliga (and) um bit.
+
+    Args:
+        index: Posição do bit
+        value: True para ligar, False para desligar
+        prefix: Prefixo do campo
+
+    Returns:
+        dict: {"campo": {"or"|"and": Int64}}
+    """
+    field, mask = bit_field(index, prefix)
+    if value:
+        return {field: {"or": _to_int64(mask)}}
+    return {field: {"and": _to_int64(~mask)}}
+
+
+def words_to_int(doc: dict, n_bits: int, word_bits: int = WORD_BITS) -> int:
+    """
+    Junta os campos w0, w1, ... de um documento num int.
+
+    Args:
+        doc: Documento (ou subdocumento) com os campos
+        n_bits: Tamanho do bitset
+        word_bits: Bits por palavra
+
+    Returns:
+        int: Bitset (bit i = dia i)
+    """
+    word_mask = (1 << word_bits) - 1
+    value = 0
+    for k in range(words_for(n_bits, word_bits)):
+        value |= (int(doc.get(f"w{k}", 0)) & word_mask) << (k * word_bits)
+    return value & ((1 << n_bits) - 1)
+
+
+def int_to_words(value: int, n_bits: int, word_bits: int = WORD_BITS) -> dict:
+    """Separa um bitset nos campos w0, w1, ... para gravar de uma vez."""
+    word_mask = (1 << word_bits) - 1
+    words = {}
+    for k in range(words_for(n_bits, word_bits)):
+        word = value >> (k * word_bits) & word_mask
+        words[f"w{k}"] = _to_int64(word) if word_bits == WORD_BITS else word
+    return words
+
+
+def to_bytes(value: int, n_bits: int) -> bytes:
+    """Bitset compacto em bytes (little-endian, bit i = dia i)."""
+    return value.to_bytes((n_bits + 7) // 8, "little")
+
+
+def popcount(value: int) -> int:
+    """Quantidade de bits ligados."""
+    return bin(value).count("1")
+
+
+def run_ending_at(value: int, index: int) -> int:
+    """
+    Tamanho da sequência de bits ligados que termina em `index` (inclusive).
+
+    Args:
+        value: Bitset
+        index: Último bit da sequência
+
+    Returns:
+        int: Bits ligados seguidos até index (0 se index está desligado)
+    """
+    if index < 0:
+        return 0
+    # Inverte e isola os bits até index: a sequência acaba no primeiro zero
+    window = ~value & ((1 << (index + 1)) - 1)
+    if window == 0:
+        return index + 1
+    return index - window.bit_length() + 1
+
+
+def longest_run(value: int) -> int:
+    """Maior sequência de bits ligados."""
+    best = 0
+    while value:
+        value &= value << 1
+        best += 1
+    return best
+
+
+# ---------- Expressões para updates com pipeline (palavras de 32 bits) ----------
+
+PIPELINE_WORD_BITS = 32
+
+
+def pipeline_word(prefix: str, index: int) -> Tuple[str, int]:
+    """
+    Campo (com prefixo, ex.: "bits.done.") e posição do bit `index` numa
+    palavra de 32 bits.
+
+    Returns:
+        Tuple[str, int]: (campo, bit dentro da palavra)
+    """
+    return f"{prefix}w{index // PIPELINE_WORD_BITS}", index % PIPELINE_WORD_BITS
+
+
+def pipeline_bit(prefix: str, index: int) -> dict:
+    """Expressão que vale 1 se o bit está ligado e 0 se não (campo ausente = 0)."""
+    field, bit = pipeline_word(prefix, index)
+    return {"$mod": [
+        {"$floor": {"$divide": [{"$ifNull": [f"${field}", 0]}, 1 << bit]}},
+        2
+    ]}
+
+
+def pipeline_set_bit(prefix: str, index: int, value: bool) -> Tuple[str, dict]:
+    """
+    Campo e expressão da palavra com o bit `index` ligado ou desligado.
+
+    Args:
+        prefix: Prefixo dos campos do bitset
+        index: Posição do bit
+        value: True para ligar, False para desligar
+
+    Returns:
+        Tuple[str, dict]: (campo, expressão do novo valor)
+    """
+    field, bit = pipeline_word(prefix, index)
+    current = {"$ifNull": [f"${field}", 0]}
+    state = pipeline_bit(prefix, index)
+    if value:
+        delta = {"$multiply": [{"$subtract": [1, state]}, 1 << bit]}
+    else:
+        delta = {"$multiply": [-1, state, 1 << bit]}
+    return field, {"$toLong": {"$add": [current, delta]}}
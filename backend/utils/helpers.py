@@ -2,10 +2,14 @@
 Funções auxiliares gerais.
 Utilitários diversos usados em várias partes da aplicação.
 """
+import asyncio
+import logging
 import secrets
 import string
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger("pomociclo")
 
 # Constantes de presença
 OFFLINE_AFTER_SECS = 120  # 2 minutos sem heartbeat = offline
@@ -77,6 +81,33 @@ def sec(mins: int) -> int:
     return mins * 60
 
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Verifica se o header If-None-Match cobre o ETag atual (RFC 9110).
+    Aceita lista separada por vírgulas, "*" e comparação fraca (prefixo W/).
+
+    Args:
+        if_none_match: Valor do header If-None-Match (ou None)
+        etag: ETag atual do recurso, com aspas
+
+    Returns:
+        True se o cliente já tem essa versão (responder 304)
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    current = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == current:
+            return True
+    return False
+
+
 def sec_left_from_timer(t: Optional[dict]) -> Optional[int]:
     """
     Calcula segundos restantes de um timer baseado em seu estado.
@@ -120,3 +151,63 @@ def sec_left_from_timer(t: Optional[dict]) -> Optional[int]:
         return max(0, int(duration_secs - elapsed))
     
     return None
+
+
+async def run_periodic(job: Callable[[], Awaitable], interval_seconds: int, name: str = "job"):
+    """
+    Executa um job assíncrono em loop, a cada intervalo.
+    Erros são logados e não interrompem o loop.
+    
+    Args:
+        job: Corrotina sem argumentos a executar
+        interval_seconds: Segundos entre execuções
+        name: Nome do job (para logs)
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"periodic job '{name}' failed: {e}")
+
+
+async def ensure_unique_index(collection, keys, dedupe: bool = False, **kwargs) -> bool:
+    """
+    Cria um índice único isolado: uma falha (ex.: duplicatas antigas) é
+    logada com o nome da coleção e não impede os demais índices.
+    
+    Args:
+        collection: Coleção do Motor
+        keys: Campo ou lista de (campo, direção), como no create_index
+        dedupe: Se True, remove antes as duplicatas das chaves, mantendo o
+            documento mais antigo (_id) de cada grupo
+        **kwargs: Opções extras do create_index
+    
+    Returns:
+        bool: True se o índice existe ao final
+    """
+    fields = [keys] if isinstance(keys, str) else [k for k, _ in keys]
+    try:
+        if dedupe:
+            removed = 0
+            groups = collection.aggregate([
+                {"$sort": {"_id": 1}},
+                {"$group": {
+                    "_id": {f.replace(".", "_"): f"${f}" for f in fields},
+                    "ids": {"$push": "$_id"},
+                    "count": {"$sum": 1}
+                }},
+                {"$match": {"count": {"$gt": 1}}},
+            ], allowDiskUse=True)
+            async for group in groups:
+                res = await collection.delete_many({"_id": {"$in": group["ids"][1:]}})
+                removed += res.deleted_count
+            if removed:
+                logger.warning(f"⚠️ {collection.name}: {removed} duplicatas de {fields} removidas")
+        await collection.create_index(keys, unique=True, **kwargs)
+        return True
+    except Exception as e:
+        logger.error(f"⚠️ Erro ao criar índice único {collection.name} {fields}: {e}")
+        return False
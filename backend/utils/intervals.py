@@ -0,0 +1,131 @@
+"""
+Utilitários de intervalos de tempo da agenda.
+Converte os eventos de um dia (uma única vez) numa linha do tempo de
+horários ocupados, ordenada e mesclada, usada para detectar conflitos e
+encontrar o primeiro horário livre com uma única varredura.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from .datetime_utils import to_aware
+
+Interval = Tuple[datetime, datetime]
+
+
+def event_interval(ev: dict) -> Optional[Interval]:
+    """
+    Converte start/end de um evento (ISO ou datetime) para datetimes UTC.
+
+    Args:
+        ev: Documento do evento
+
+    Returns:
+        Optional[Interval]: (início, fim) ou None se inválido/vazio
+    """
+    start = to_aware(ev.get("start"))
+    end = to_aware(ev.get("end"))
+    if start is None or end is None or end <= start:
+        return None
+    return start, end
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """
+    Ordena e mescla intervalos sobrepostos ou encostados.
+
+    Args:
+        intervals: Intervalos (início, fim)
+
+    Returns:
+        List[Interval]: Intervalos disjuntos em ordem crescente
+    """
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class BusyTimeline:
+    """Horários ocupados (ordenados e mesclados) com consultas por busca binária."""
+    def __init__(self, intervals: Iterable[Interval]):
+        self.busy = merge_intervals(intervals)
+        self._starts = [s for s, _ in self.busy]
+        self._ends = [e for _, e in self.busy]
+
+    @classmethod
+    def from_events(cls, events: Iterable[dict], event_types: Optional[set] = None) -> "BusyTimeline":
+        """
+        Monta a linha do tempo a partir de eventos da agenda.
+
+        Args:
+            events: Documentos de calendar_events
+            event_types: Se informado, só esses tipos ocupam horário
+
+        Returns:
+            BusyTimeline: Linha do tempo
+        """
+        intervals = []
+        for ev in events:
+            if event_types is not None and ev.get("event_type", "other") not in event_types:
+                continue
+            iv = event_interval(ev)
+            if iv:
+                intervals.append(iv)
+        return cls(intervals)
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """
+        Verifica se [start, end) não cruza nenhum horário ocupado.
+
+        Args:
+            start: Início (timezone-aware)
+            end: Fim (timezone-aware)
+
+        Returns:
+            bool: True se livre
+        """
+        # Último intervalo que começa antes de `end` é o de maior fim entre eles
+        idx = bisect_left(self._starts, end)
+        return idx == 0 or self._ends[idx - 1] <= start
+
+    def first_free_slot(
+        self,
+        earliest: datetime,
+        duration: timedelta,
+        latest: datetime,
+        step: Optional[timedelta] = None
+    ) -> Optional[datetime]:
+        """
+        Primeiro início t em [earliest, latest] com [t, t + duration) livre.
+        Com `step`, os candidatos ficam na grade earliest + k * step.
+
+        Args:
+            earliest: Primeiro início aceito (timezone-aware)
+            duration: Duração necessária
+            latest: Último início aceito
+            step: Passo da grade (None = qualquer instante)
+
+        Returns:
+            Optional[datetime]: Início encontrado ou None
+        """
+        t = earliest
+        i = bisect_right(self._ends, t)
+        n = len(self.busy)
+        while t <= latest:
+            # Descarta ocupados que terminam até t
+            while i < n and self._ends[i] <= t:
+                i += 1
+            if i == n or self._starts[i] >= t + duration:
+                return t
+            # Conflito: pula para o fim do ocupado (alinhado à grade)
+            t = self._ends[i]
+            if step:
+                k = -((earliest - t) // step)
+                t = earliest + k * step
+            i += 1
+        return None
@@ -0,0 +1,62 @@
+"""
+Cache LRU em memória com limite de entradas e métricas.
+Usado pelos caches por processo (perfil, heatmap).
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """Cache LRU com limite rígido de entradas e contadores de hit/miss."""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Busca um valor e o marca como usado recentemente.
+        Conta como miss quando não existe (use miss() para invalidar um hit).
+        """
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        return None
+
+    def miss(self):
+        """Reclassifica o último get() como miss (valor encontrado mas obsoleto)."""
+        self.hits -= 1
+        self.misses += 1
+
+    def set(self, key: Hashable, value: Any):
+        """Grava um valor, descartando os menos usados acima do limite."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        """Remove um valor, se existir."""
+        self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        """
+        Métricas do cache.
+
+        Returns:
+            dict: {"size", "max_entries", "hits", "misses", "evictions", "hit_rate"}
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
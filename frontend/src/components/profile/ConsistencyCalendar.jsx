@@ -2,14 +2,23 @@ import { useState, useEffect } from "react";
 import { ChevronLeft, ChevronRight } from "lucide-react";
 import { Button } from "@/components/ui/button";
 
-export default function ConsistencyCalendar({ days = [], year }) {
+export default function ConsistencyCalendar({ days = [], minutes = null, year }) {
   const [currentYear, setCurrentYear] = useState(year || new Date().getFullYear());
   
   // Converte array de dias em objeto para lookup rápido
   const daysMap = {};
-  days.forEach(day => {
-    daysMap[day.date] = day.minutes;
-  });
+  if (Array.isArray(minutes)) {
+    // Formato compacto: minutes[i] = minutos do i-ésimo dia do ano
+    minutes.forEach((value, i) => {
+      if (!value) return;
+      const d = new Date(Date.UTC(year || currentYear, 0, 1 + i));
+      daysMap[d.toISOString().slice(0, 10)] = value;
+    });
+  } else {
+    days.forEach(day => {
+      daysMap[day.date] = day.minutes;
+    });
+  }
 
   // Determina cor baseado em minutos estudados
   const getColor = (minutes) => {
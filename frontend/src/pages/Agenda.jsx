@@ -523,13 +523,19 @@ export default function Agenda() {
   }
 
   /**
-   * Remove evento por ID
-   * @param {string} id - ID do evento
+   * Remove evento (em séries, pergunta se remove a série inteira)
+   * @param {Object} ev - Objeto do evento
    */
-  async function handleDelete(id) {
+  async function handleDelete(ev) {
+    const id = ev.id;
+    const wholeSeries = !!ev.series_id && window.confirm("Remover todas as ocorrências desta série?");
     try {
-      await api.delete(`/calendar/event/${id}`);
-      setEvents((prev) => prev.filter((e) => e.id !== id));
+      await api.delete(`/calendar/event/${id}`, { params: { scope: wholeSeries ? "series" : "occurrence" } });
+      if (wholeSeries) {
+        fetchDay();
+      } else {
+        setEvents((prev) => prev.filter((e) => e.id !== id));
+      }
       fetchMonthSummary(selectedDate);
       toast.success("Evento removido");
     } catch {
@@ -921,7 +927,7 @@ export default function Agenda() {
                                 <Button
                                   size="sm"
                                   className="bg-gradient-to-r from-rose-600 to-red-600 hover:from-rose-500 hover:to-red-500 text-white font-bold shadow-lg"
-                                  onClick={() => handleDelete(ev.id)}
+                                  onClick={() => handleDelete(ev)}
                                 >
                                   <Trash2 className="w-4 h-4 mr-2" /> Excluir
                                 </Button>
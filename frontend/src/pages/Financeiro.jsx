@@ -189,6 +189,7 @@ export default function Financeiro() {
   const [selectedMonth, setSelectedMonth] = useState(new Date().getMonth());
   const [selectedYear, setSelectedYear] = useState(new Date().getFullYear());
   const [financialData, setFinancialData] = useState({});
+  const [summary, setSummary] = useState({ months: {}, categories: {} });
   const [loading, setLoading] = useState(true);
   
   // Estados de edição
@@ -203,7 +204,6 @@ export default function Financeiro() {
       try {
         const me = await api.get('/auth/me');
         setUser(me.data);
-        await loadFinancialData();
       } catch (e) {
         if (e?.response?.status === 401) {
           navigate('/', { replace: true });
@@ -214,16 +214,27 @@ export default function Financeiro() {
     })();
   }, [navigate]);
 
+  /**
+   * Recarrega os dados quando o ano selecionado muda (só os meses do ano)
+   */
+  useEffect(() => {
+    if (user) {
+      loadFinancialData(selectedYear);
+      loadSummary(selectedYear);
+    }
+  }, [user, selectedYear]);
+
   // ========================================
   // FUNÇÕES DE DADOS
   // ========================================
 
   /**
-   * Carrega dados financeiros do backend
+   * Carrega dados financeiros do backend (meses do ano informado)
+   * @param {number} year - Ano
    */
-  async function loadFinancialData() {
+  async function loadFinancialData(year) {
     try {
-      const res = await api.get('/financeiro/data');
+      const res = await api.get('/financeiro/data', { params: { year } });
       setFinancialData(res.data || {});
     } catch (e) {
       // Se não existir ainda, inicializa vazio
@@ -231,6 +242,19 @@ export default function Financeiro() {
     }
   }
 
+  /**
+   * Carrega os totais do ano calculados no servidor (por mês e categoria)
+   * @param {number} year - Ano
+   */
+  async function loadSummary(year) {
+    try {
+      const res = await api.get('/financeiro/summary', { params: { year } });
+      setSummary(res.data || { months: {}, categories: {} });
+    } catch (e) {
+      setSummary({ months: {}, categories: {} });
+    }
+  }
+
   /**
    * Salva valor de uma categoria/item em um mês específico
    * @param {string} category - Categoria financeira
@@ -255,6 +279,7 @@ export default function Financeiro() {
       });
       
       setFinancialData(newData);
+      loadSummary(selectedYear);
       toast.success('Valor salvo!');
     } catch (e) {
       toast.error('Erro ao salvar');
@@ -271,13 +296,11 @@ export default function Financeiro() {
   }
 
   /**
-   * Calcula total de uma categoria em um mês
+   * Total de uma categoria em um mês (vindo de /financeiro/summary)
    * @returns {number} Soma de todos os itens da categoria
    */
   function getTotalByCategory(category, month) {
-    const key = `${selectedYear}-${month}`;
-    const categoryData = financialData?.[key]?.[category] || {};
-    return Object.values(categoryData).reduce((sum, val) => sum + (parseFloat(val) || 0), 0);
+    return summary.months?.[month]?.[category] || 0;
   }
 
   /**
@@ -321,7 +344,7 @@ export default function Financeiro() {
       saldo: getSaldo(idx),
     }));
     return stats;
-  }, [financialData, selectedYear]);
+  }, [summary]);
 
   const totals = useMemo(() => {
     return monthlyStats.reduce((acc, stat) => ({
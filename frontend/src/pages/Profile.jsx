@@ -17,7 +17,7 @@ export default function Profile() {
   
   const [loading, setLoading] = useState(true);
   const [stats, setStats] = useState(null);
-  const [calendarData, setCalendarData] = useState({ days: [], year: new Date().getFullYear() });
+  const [calendarData, setCalendarData] = useState({ minutes: [], year: new Date().getFullYear() });
   const [selectedPeriod, setSelectedPeriod] = useState("30d");
   const [currentUser, setCurrentUser] = useState(null);
   const [exporting, setExporting] = useState(false);
@@ -131,7 +131,7 @@ export default function Profile() {
           
           {isOwnProfile && (
             <Button
-              onClick={() => handleExport("json")}
+              onClick={() => handleExport("zip")}
               disabled={exporting}
               variant="outline"
               className="gap-2"
@@ -205,7 +205,7 @@ export default function Profile() {
         </div>
 
         {/* Consistency Calendar */}
-        <ConsistencyCalendar days={calendarData.days} year={calendarData.year} />
+        <ConsistencyCalendar minutes={calendarData.minutes} year={calendarData.year} />
       </div>
       
       <Footer />
@@ -20,6 +20,14 @@ import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { Card } from "@/components/ui/card";
+import {
+  Dialog,
+  DialogContent,
+  DialogDescription,
+  DialogFooter,
+  DialogHeader,
+  DialogTitle,
+} from "@/components/ui/dialog";
 import { toast } from "sonner";
 import {
   Brain,
@@ -37,6 +45,16 @@ import {
 } from "lucide-react";
 import Footer from '../components/Footer';
 
+// Notas de recordação (SM-2) mostradas no seletor
+const GRADE_OPTIONS = [
+  { value: 0, label: "Esqueci tudo" },
+  { value: 1, label: "Quase nada" },
+  { value: 2, label: "Lembrei com muita dificuldade" },
+  { value: 3, label: "Lembrei com esforço" },
+  { value: 4, label: "Lembrei com alguma hesitação" },
+  { value: 5, label: "Lembrei perfeitamente" },
+];
+
 /**
  * Componente principal de Revisão
  * Gerencia estado e coordena CRUD de matérias de revisão
@@ -70,6 +88,9 @@ export default function Revisao() {
   const [editMode, setEditMode] = useState("normal");
   const [editExamDate, setEditExamDate] = useState("");
 
+  // Nota da revisão (agendamento adaptativo): sessão aguardando a nota
+  const [gradingSessionId, setGradingSessionId] = useState(null);
+
   // ========================================
   // FUNÇÕES DE CARREGAMENTO
   // ========================================
@@ -122,12 +143,9 @@ async function loadSubjectSessions(subjectId) {
 
   async function loadReviews() {
     try {
-      const [upcomingRes, overdueRes] = await Promise.all([
-        api.get("/review/upcoming", { params: { days_ahead: 30 } }),
-        api.get("/review/overdue"),
-      ]);
-      setUpcoming(upcomingRes.data || []);
-      setOverdue(overdueRes.data || []);
+      const res = await api.get("/review/dashboard", { params: { days_ahead: 30 } });
+      setUpcoming(res.data?.upcoming?.items || []);
+      setOverdue(res.data?.overdue?.items || []);
     } catch (e) {
       console.error("Erro ao carregar revisões:", e);
     }
@@ -242,11 +260,33 @@ async function loadSubjectSessions(subjectId) {
     }
   }
 
-  // Marcar revisão como completa
-  async function handleCompleteReview(sessionId) {
+  // Marcar revisão como completa: abre o seletor de nota
+  function handleCompleteReview(sessionId) {
+    setGradingSessionId(sessionId);
+  }
+
+  // Fechar o seletor sem escolher
+  function handleCancelGrade() {
+    setGradingSessionId(null);
+    toast.info("Revisão não marcada");
+  }
+
+  // Enviar a nota (0-5) ou null para marcar sem nota
+  async function submitReviewGrade(grade) {
+    const sessionId = gradingSessionId;
+    if (!sessionId) return;
+    if (grade !== null && (!Number.isInteger(grade) || grade < 0 || grade > 5)) {
+      toast.error("Nota inválida (use 0 a 5)");
+      return;
+    }
+    setGradingSessionId(null);
     try {
-      const res = await api.post(`/review/sessions/${sessionId}/complete`);
-      if (res.data.penalty_applied) {
+      const res = await api.post(`/review/sessions/${sessionId}/complete`, { grade });
+      if (res.data.rescheduled > 0) {
+        toast.success(
+          `Revisão completa! ${res.data.rescheduled} revisões reagendadas (próxima em ${res.data.srs.interval} dias)`
+        );
+      } else if (res.data.penalty_applied) {
         toast.warning(
           `Revisão marcada! Próxima revisão ajustada (+${res.data.days_late} dias de atraso)`
         );
@@ -738,6 +778,44 @@ async function loadSubjectSessions(subjectId) {
           </div>
         </div>
       </div>
+      {/* Seletor de nota da revisão */}
+      <Dialog
+        open={gradingSessionId !== null}
+        onOpenChange={(open) => {
+          if (!open) handleCancelGrade();
+        }}
+      >
+        <DialogContent className="bg-slate-900 border-slate-700 text-white">
+          <DialogHeader>
+            <DialogTitle>Como foi a revisão?</DialogTitle>
+            <DialogDescription className="text-gray-400">
+              0 = esqueci tudo, 5 = lembrei perfeitamente
+            </DialogDescription>
+          </DialogHeader>
+          <div className="grid grid-cols-6 gap-2 mt-2">
+            {GRADE_OPTIONS.map((opt) => (
+              <Button
+                key={opt.value}
+                variant="outline"
+                title={opt.label}
+                onClick={() => submitReviewGrade(opt.value)}
+                className="h-12 text-lg font-bold border-slate-600 bg-slate-800 hover:bg-purple-600 hover:text-white"
+              >
+                {opt.value}
+              </Button>
+            ))}
+          </div>
+          <DialogFooter className="mt-2">
+            <Button
+              variant="ghost"
+              onClick={() => submitReviewGrade(null)}
+              className="text-gray-300 hover:text-white"
+            >
+              Marcar sem nota
+            </Button>
+          </DialogFooter>
+        </DialogContent>
+      </Dialog>
       <Footer />
     </div>
   );
@@ -0,0 +1,123 @@
+"""
+Testes de propriedade de utils/intervals (BusyTimeline).
+Compara mesclagem, verificação de horário livre e primeiro horário livre
+com implementações ingênuas, em intervalos aleatórios (sementes fixas).
+"""
+import random
+import sys
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from utils.intervals import BusyTimeline, merge_intervals, event_interval  # noqa: E402
+
+DAY = datetime(2025, 3, 10, tzinfo=timezone.utc)
+SEEDS = range(200)
+
+
+def _minute(m: int) -> datetime:
+    return DAY + timedelta(minutes=m)
+
+
+def _random_intervals(rng: random.Random, n: int, span: int = 48 * 60) -> list:
+    """Intervalos aleatórios (com sobreposições e encostados) em minutos."""
+    intervals = []
+    for _ in range(n):
+        start = rng.randrange(0, span, rng.choice([1, 5, 15]))
+        length = rng.choice([1, 5, 15, 30, 45, 60, 90, 240])
+        intervals.append((_minute(start), _minute(start + length)))
+    return intervals
+
+
+def _covered_minutes(intervals) -> set:
+    """União ingênua: conjunto de minutos ocupados."""
+    covered = set()
+    for start, end in intervals:
+        first = int((start - DAY).total_seconds() // 60)
+        last = int((end - DAY).total_seconds() // 60)
+        covered.update(range(first, last))
+    return covered
+
+
+def _naive_is_free(intervals, start: datetime, end: datetime) -> bool:
+    return all(end <= s or start >= e for s, e in intervals)
+
+
+def _naive_first_free(intervals, earliest, duration, latest, step):
+    t = earliest
+    while t <= latest:
+        if _naive_is_free(intervals, t, t + duration):
+            return t
+        t += step
+    return None
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_merge_matches_naive_union(seed):
+    rng = random.Random(seed)
+    intervals = _random_intervals(rng, rng.randrange(0, 40))
+    merged = merge_intervals(intervals)
+
+    # Disjuntos, ordenados e sem intervalos encostados
+    for (s1, e1), (s2, e2) in zip(merged, merged[1:]):
+        assert s1 < e1 < s2 < e2
+    assert _covered_minutes(merged) == _covered_minutes(intervals)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_is_free_matches_naive_overlap(seed):
+    rng = random.Random(seed)
+    intervals = _random_intervals(rng, rng.randrange(0, 40))
+    timeline = BusyTimeline(intervals)
+
+    for _ in range(50):
+        start = _minute(rng.randrange(-60, 49 * 60))
+        end = start + timedelta(minutes=rng.choice([1, 15, 30, 60, 180]))
+        assert timeline.is_free(start, end) == _naive_is_free(intervals, start, end)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_first_free_slot_matches_naive_scan(seed):
+    rng = random.Random(seed)
+    intervals = _random_intervals(rng, rng.randrange(0, 60))
+    timeline = BusyTimeline(intervals)
+
+    earliest = _minute(rng.randrange(0, 24 * 60))
+    duration = timedelta(minutes=rng.choice([15, 30, 60, 120]))
+    latest = earliest + timedelta(hours=24)
+    step = timedelta(minutes=rng.choice([5, 15, 30]))
+
+    assert timeline.first_free_slot(earliest, duration, latest, step=step) == \
+        _naive_first_free(intervals, earliest, duration, latest, step)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_first_free_slot_without_step_is_earliest_free_instant(seed):
+    rng = random.Random(seed)
+    intervals = _random_intervals(rng, rng.randrange(0, 40))
+    timeline = BusyTimeline(intervals)
+
+    earliest = _minute(rng.randrange(0, 24 * 60))
+    duration = timedelta(minutes=rng.choice([15, 30, 60]))
+    latest = earliest + timedelta(hours=24)
+
+    # Intervalos em minutos inteiros: a busca minuto a minuto é exata
+    expected = _naive_first_free(intervals, earliest, duration, latest, timedelta(minutes=1))
+    assert timeline.first_free_slot(earliest, duration, latest) == expected
+
+
+def test_from_events_skips_invalid_and_filtered_types():
+    events = [
+        {"start": "2025-03-10T10:00:00Z", "end": "2025-03-10T11:00:00Z", "event_type": "study"},
+        {"start": "2025-03-10T12:00:00+00:00", "end": "2025-03-10T12:00:00+00:00"},
+        {"start": "invalido", "end": "2025-03-10T13:00:00+00:00"},
+        {"start": "2025-03-10T14:00:00+00:00", "end": "2025-03-10T15:00:00+00:00", "event_type": "other"},
+    ]
+    assert event_interval(events[1]) is None
+
+    timeline = BusyTimeline.from_events(events, event_types={"study"})
+    assert timeline.busy == [(_minute(10 * 60), _minute(11 * 60))]
+    assert timeline.is_free(_minute(14 * 60), _minute(15 * 60))